@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+from datetime import timedelta
 from pathlib import Path
 
+from .database import database_from_env, replicas_from_env
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,8 +45,12 @@ INSTALLED_APPS = [
     'scp',
 ]
 
+# All async-capable, so async views (scp/async_views.py) stay on the event loop
+# under ASGI; the opt-in RequestMetricsMiddleware is the exception.
 MIDDLEWARE = [
+    'scp.middleware.RequestMetricsMiddleware',
     'scp.middleware.PrintRequestMiddleware',
+    'scp.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -51,6 +58,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'scp.middleware.RateLimitHeadersMiddleware',
+    'scp.middleware.ReplicaStickinessMiddleware',
 ]
 
 ROOT_URLCONF = 'djangoproj.urls'
@@ -73,11 +82,101 @@ TEMPLATES = [
 WSGI_APPLICATION = 'djangoproj.wsgi.application'
 
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'scp.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'scp.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'scp.authentication.CachedTokenAuthentication',
+        'scp.authentication.SignedAccessTokenAuthentication',
+    ],
+    # token buckets per user (or IP) and scope; views pick scopes via `throttle_scopes`
+    'DEFAULT_THROTTLE_CLASSES': [
+        'scp.throttling.TokenBucketThrottle',
     ],
+    'DEFAULT_THROTTLE_RATES': {
+        'auth': '10/min',
+        'catalog': '600/min',
+        'order_write': '60/min',
+        'chat': '120/min',
+    },
 }
 
+# Response compression (see scp.middleware.CompressionMiddleware); brotli needs the `brotli` package
+COMPRESSION_MIN_SIZE = 1024       # bytes
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5    # 0-11; higher levels are too slow for per-request use
+
+# Throttle bucket store: "memory" (per worker process) or "cache" (shared via CACHES)
+THROTTLE_STORE = 'memory'
+THROTTLE_CACHE_ALIAS = 'default'
+THROTTLE_MEMORY_MAX_BUCKETS = 10000  # per process; least recently used buckets are dropped beyond this
+THROTTLE_ENABLED = True  # tests that log in repeatedly from one IP turn it off with override_settings
+
+# API tokens (see scp/authentication.py)
+TOKEN_TTL = timedelta(days=7)                   # sliding; None = tokens never expire
+TOKEN_REFRESH_INTERVAL = timedelta(hours=1)     # at most one expiry bump per token per interval
+TOKEN_CACHE_TTL = 60                            # seconds in the shared cache
+TOKEN_LOCAL_CACHE_TTL = 5                       # seconds in the per-process LRU
+TOKEN_LOCAL_CACHE_SIZE = 1024
+
+# Failed-login limiting: refuse logins (no password hashing) once a username or an IP
+# reaches its limit of failures within the window
+LOGIN_FAILURE_LIMIT = 5
+LOGIN_FAILURE_IP_LIMIT = 50
+LOGIN_FAILURE_WINDOW = 15 * 60  # seconds
+
+# Bulk staff invites (SupplierViewSet.invite_staff); every entry with a password is hashed in the request
+STAFF_INVITE_MAX = 100
+
+# Optional stateless access tokens (`Authorization: Bearer ...`) issued next to the API token
+SIGNED_TOKENS_ENABLED = False
+SIGNED_ACCESS_TOKEN_TTL = timedelta(minutes=5)  # refresh tokens live as long as the API token
+
+# Delta sync (see scp/sync.py)
+SYNC_TOMBSTONE_TTL = timedelta(days=30)         # older watermarks get a full resync
+SYNC_WATERMARK_LAG = timedelta(seconds=5)       # re-send rows from transactions still open at sync time
+
+# Request instrumentation (see scp/metrics.py); scp.middleware.RequestMetricsMiddleware
+# is a no-op unless one of these is set
+REQUEST_METRICS_ENABLED = False     # per-view histograms at GET /api/metrics/ (platform admins)
+REQUEST_PROFILE_SECRET = None       # `X-Profile: <secret>` runs the request under cProfile
+REQUEST_PROFILE_SAMPLE_RATE = 1.0   # fraction of X-Profile requests actually profiled
+REQUEST_PROFILE_DIR = BASE_DIR / 'profiles'
+
+# Long-polling on the async chat endpoints (see scp/async_views.py)
+LONG_POLL_MAX_WAIT = 25     # seconds; keep below proxy / load balancer idle timeouts
+LONG_POLL_INTERVAL = 2.0    # re-check while waiting, for writes in other processes without LISTEN/NOTIFY
+LONG_POLL_CURSOR_OVERLAP = 5    # seconds; ?after= answers repeat rows this recent, which may have committed late
+# wake long-polls in other processes with PostgreSQL LISTEN/NOTIFY (scp/realtime.py);
+# tests that long-poll turn it off, the listener's connection would outlive the test database
+REALTIME_PG_NOTIFY = True
+REALTIME_PG_CHANNEL = 'scp_events'
+
+# Chunked, resumable uploads (see scp/uploads.py)
+CHUNKED_UPLOAD_MAX_SIZE = 100 * 1024 * 1024     # bytes per file, also applied to single-request uploads
+CHUNKED_UPLOAD_MAX_CHUNK_SIZE = 8 * 1024 * 1024 # bytes per PATCH
+CHUNKED_UPLOAD_TTL = timedelta(hours=24)        # unfinished uploads are purged after this
+CHUNKED_UPLOAD_DIR = None                       # staging files; shared by all workers. None: <tmp>/scp-uploads
+
+# Deduplicated file storage (see scp/storage.py, scp/blobs.py)
+BLOB_GC_GRACE = timedelta(hours=24)     # gc_blobs keeps unreferenced blobs written or reused more recently
+
+# Message search (see scp/search.py)
+MESSAGE_SEARCH_MAX_OFFSET = 500     # deepest page offset; every match is ranked before paging
+
+# Slow-query log (see scp/slow_queries.py), listed at /admin/slow-queries/
+SLOW_QUERY_THRESHOLD_MS = None      # e.g. 100; None turns the log off
+SLOW_QUERY_EXPLAIN = True           # capture EXPLAIN the first time a query shape is slow
+SLOW_QUERY_EXPLAIN_ANALYZE = False  # PostgreSQL: EXPLAIN ANALYZE (runs the query again)
+SLOW_QUERY_BUFFER_SIZE = 200        # distinct query shapes kept per process
+SLOW_QUERY_CAPTURE_PARAMS = False   # keep sample SQL and parameters verbatim; they can hold secrets
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -90,22 +189,34 @@ REST_FRAMEWORK = {
 #         },
 #     }
 # }
+# Read from DATABASE_URL / DB_* environment variables; defaults are the local
+# scp_db database with a new connection per request. See djangoproj/database.py
+# for DB_POOL (psycopg connection pool; use it under ASGI) and DB_CONN_MAX_AGE.
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'scp_db',
-        'USER': 'postgres',
-        'PASSWORD': 'postgres',
-        'HOST': 'localhost',
-        'PORT': '5432',
-    }
+    'default': database_from_env(),
 }
+# read replicas (DB_REPLICA_URLS); list/retrieve on opted-in ViewSets read from them
+DATABASES.update(replicas_from_env(primary=DATABASES['default']))
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+REPLICA_STICKY_SECONDS = 10     # a user who wrote reads from the primary for this long
+DATABASE_ROUTERS = ['scp.replicas.ReplicaRouter']
 
 AUTH_USER_MODEL = 'scp.User'
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
+# First entry hashes new passwords; the rest can still verify (and upgrade) stored ones.
+# Argon2 (pip install django[argon2]) is cheaper per login at comparable strength:
+# put 'django.contrib.auth.hashers.Argon2PasswordHasher' first to switch.
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
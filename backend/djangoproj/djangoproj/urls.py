@@ -17,7 +17,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from scp.admin import slow_queries_view
+
 urlpatterns = [
+    path('admin/slow-queries/', admin.site.admin_view(slow_queries_view), name='admin-slow-queries'),
     path('admin/', admin.site.urls),
     path('', include('scp.urls')),   # include scp API
 ]
\ No newline at end of file
@@ -1,4 +1,10 @@
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+
+from . import slow_queries
 from .models import Supplier, SupplierKYBDocument
 
 
@@ -91,3 +97,24 @@ class SupplierAdmin(admin.ModelAdmin):
             )
         }),
     )
+
+
+# ------------------------------
+# SLOW QUERY LOG (scp/slow_queries.py)
+# ------------------------------
+def slow_queries_view(request):
+    """The slow-query entries of the process serving the page; POST clears them."""
+    if not request.user.is_superuser:
+        raise PermissionDenied
+    if request.method == "POST":
+        slow_queries.buffer.clear()
+        messages.success(request, "Slow-query log cleared.")
+        return redirect(request.path)
+    context = {
+        **admin.site.each_context(request),
+        "title": "Slow queries",
+        "entries": slow_queries.buffer.snapshot(),
+        "threshold_ms": getattr(settings, "SLOW_QUERY_THRESHOLD_MS", None),
+        "buffer_size": slow_queries.buffer.size,
+    }
+    return TemplateResponse(request, "admin/scp/slow_queries.html", context)
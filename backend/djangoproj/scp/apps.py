@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ScpConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'scp'
+
+    def ready(self):
+        from . import authentication  # noqa: F401  (connects token cache signals)
+        from . import sync  # noqa: F401  (tombstones and updated_at touches)
+        from . import realtime  # noqa: F401  (long-poll wakeups on new messages / notifications)
@@ -0,0 +1,338 @@
+# scp/async_views.py
+"""
+Async endpoints for chat and notifications.
+
+Chat is the most concurrent part of the API and spends most of its time
+waiting on the database or, with long-polling, on nothing at all. These views
+are plain Django async views on the ASGI stack (djangoproj/asgi.py) using the
+async ORM, so a waiting client costs a coroutine rather than a worker thread.
+
+  GET  /api/conversations/<id>/messages/   history, newest page first
+       ?before=<id>  older page          ?limit=  page size (max MAX_LIMIT)
+       ?after=<id>   newer messages, oldest first
+       ?after=<id>&wait=<s>  long-poll: hold the request until a message newer
+                             than <id> arrives or <s> (max LONG_POLL_MAX_WAIT)
+                             seconds pass
+  POST /api/conversations/<id>/messages/   send a message (as send_message)
+  GET  /api/notifications/inbox/           own notifications, newest first
+       ?before=<id>  ?limit=  ?unread=1
+  GET  /api/events/                        new messages in any of the user's
+       ?messages_after=<id>                conversations and new notifications,
+       &notifications_after=<id>&wait=<s>  long-polled; without either cursor it
+                                           answers at once with the current ones;
+                                           a missing one starts from now
+
+Ids are allocated when a row is inserted but become visible when it commits,
+so on PostgreSQL a row can appear below a cursor the client already holds.
+Answers to ?after= / ?*_after= therefore also repeat the rows at or below
+the cursor created within the last LONG_POLL_CURSOR_OVERLAP seconds; clients
+upsert by id. Only rows the request has not seen yet end a long-poll.
+
+A waiting long-poll sleeps until scp/realtime.py publishes to one of its
+channels (in-process, or from other processes through PostgreSQL
+LISTEN/NOTIFY). Without LISTEN/NOTIFY it also re-checks every
+LONG_POLL_INTERVAL seconds, to see rows written by other processes.
+
+They authenticate and throttle like the DRF viewsets (REST_FRAMEWORK
+authentication classes, TokenBucketThrottle with `throttle_scopes`) and
+answer with the same JSON. Every middleware in MIDDLEWARE is async-capable,
+except RequestMetricsMiddleware, which is opt-in.
+
+Under WSGI the same views still work; Django runs each one in an event loop
+on the request's thread, so long-polls then hold a worker for their wait.
+"""
+import math
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from . import realtime
+from .models import Conversation, Message, Notification
+from .permissions import participant_filter
+from .renderers import FastJSONParser, dumps
+from .serializers import MessageSerializer, NotificationSerializer
+from .throttling import TokenBucketThrottle
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def get_max_wait():
+    return getattr(settings, "LONG_POLL_MAX_WAIT", 25)
+
+
+def get_poll_interval():
+    return getattr(settings, "LONG_POLL_INTERVAL", 1.0)
+
+
+def get_cursor_overlap():
+    return getattr(settings, "LONG_POLL_CURSOR_OVERLAP", 5)
+
+
+def json_response(data, status_code=status.HTTP_200_OK, headers=None):
+    return HttpResponse(dumps(data), status=status_code, content_type="application/json", headers=headers)
+
+
+def _int_param(request, name, default=None, minimum=0, maximum=None):
+    value = request.query_params.get(name)
+    if value in (None, ""):
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise exceptions.ValidationError({name: "A whole number is required."})
+    if number < minimum:
+        raise exceptions.ValidationError({name: f"Must be at least {minimum}."})
+    return number if maximum is None else min(number, maximum)
+
+
+def _release_connection():
+    # a waiting long-poll should not keep a database connection open; inside a
+    # transaction (tests, ATOMIC_REQUESTS) the connection has to stay
+    if not connection.in_atomic_block:
+        connection.close()
+
+
+async def long_poll(fetch, channels, wait, ready=bool):
+    """
+    Await `fetch()` until `ready(result)` or `wait` seconds have passed,
+    sleeping in between until one of `channels` is published to. Returns the
+    last result.
+    """
+    deadline = time.monotonic() + wait
+    # subscribe before the first fetch, so a row committed in between still wakes us
+    with realtime.subscribe(channels) as subscription:
+        while True:
+            result = await fetch()
+            remaining = deadline - time.monotonic()
+            if ready(result) or remaining <= 0:
+                return result
+            await sync_to_async(_release_connection)()
+            recheck = remaining if realtime.pg_notify_enabled() else min(remaining, get_poll_interval())
+            await subscription.wait(recheck)
+
+
+class AfterCursor:
+    """
+    Rows of `queryset` after the id a client last saw, oldest first: up to
+    `limit` with a higher id, preceded by those at or below it created within
+    LONG_POLL_CURSOR_OVERLAP seconds (see the module docstring). A cursor
+    the server picked (`overlap=False`) needs no overlap.
+    """
+
+    def __init__(self, queryset, after, limit, overlap=True):
+        self.after = after
+        self.newer = queryset.filter(id__gt=after).order_by("id")[:limit]
+        if overlap:
+            since = timezone.now() - timedelta(seconds=get_cursor_overlap())
+            self.recent = queryset.filter(id__lte=after, created_at__gte=since).order_by("id")[:limit]
+        else:
+            self.recent = queryset.none()
+        self.seen = set()
+
+    async def start(self):
+        """Note the overlap rows there already are; only later ones count as news."""
+        self.seen = {pk async for pk in self.recent.values_list("pk", flat=True)}
+
+    async def fetch(self):
+        # .all(): a fresh queryset each time, iterating caches the results
+        return [row async for row in self.recent.all()] + [row async for row in self.newer.all()]
+
+    def has_news(self, rows):
+        return any(row.pk not in self.seen for row in rows)
+
+    def latest(self, rows):
+        """The cursor for the next request."""
+        return max(self.after, rows[-1].pk) if rows else self.after
+
+
+class AsyncAPIView(View):
+    """
+    Async counterpart of a DRF APIView: authentication, IsAuthenticated,
+    throttling and APIException handling, with handlers that return data.
+    Handlers are `async def get(self, request, ...)` taking a DRF Request and
+    returning (data, status) or data; `self.action` is the handler name.
+    """
+    throttle_scopes = {}
+    parser_classes = (FastJSONParser, FormParser, MultiPartParser)
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # token authentication only, as in DRF's APIView
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        handler = getattr(self, request.method.lower(), None)
+        if request.method.lower() not in self.http_method_names or handler is None:
+            return json_response({"detail": f'Method "{request.method}" not allowed.'},
+                                 status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.action = request.method.lower()
+        drf_request = Request(
+            request,
+            parsers=[parser() for parser in self.parser_classes],
+            authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+        )
+        try:
+            await sync_to_async(self.initial)(drf_request)
+            result = await handler(drf_request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return self.handle_exception(exc)
+        data, status_code = result if isinstance(result, tuple) else (result, status.HTTP_200_OK)
+        return json_response(data, status_code)
+
+    def initial(self, request):
+        # authentication may hit the database and the throttle store the cache
+        if not request.user or not request.user.is_authenticated:
+            raise exceptions.NotAuthenticated()
+        throttle = TokenBucketThrottle()
+        if not throttle.allow_request(request, self):
+            raise exceptions.Throttled(throttle.wait())
+
+    def handle_exception(self, exc):
+        headers = {}
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            exc.status_code = status.HTTP_401_UNAUTHORIZED
+            headers["WWW-Authenticate"] = "Token"
+        if getattr(exc, "wait", None):
+            headers["Retry-After"] = str(math.ceil(exc.wait))
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+        return json_response(data, exc.status_code, headers)
+
+
+class ConversationMessagesView(AsyncAPIView):
+    http_method_names = ["get", "post"]
+    throttle_scopes = {"read": "chat", "write": "chat"}
+
+    async def get_conversation_id(self, user, pk):
+        """`pk` if `user` takes part in the conversation; 404 otherwise, as the viewset does."""
+        if not await Conversation.objects.filter(participant_filter(user), pk=pk).aexists():
+            raise exceptions.NotFound()
+        return pk
+
+    async def get(self, request, pk):
+        conversation_id = await self.get_conversation_id(request.user, pk)
+        limit = _int_param(request, "limit", DEFAULT_LIMIT, minimum=1, maximum=MAX_LIMIT)
+        after = _int_param(request, "after")
+        before = _int_param(request, "before")
+        wait = _int_param(request, "wait", 0, maximum=get_max_wait())
+
+        messages = Message.objects.filter(conversation_id=conversation_id).select_related("sender")
+        if after is not None:
+            cursor = AfterCursor(messages, after, limit)
+            await cursor.start()
+            channels = [realtime.conversation_channel(conversation_id)]
+            page = await long_poll(cursor.fetch, channels, wait, ready=cursor.has_news)
+            latest = cursor.latest(page)
+        else:
+            if before is not None:
+                messages = messages.filter(id__lt=before)
+            page = [message async for message in messages.order_by("-id")[:limit]][::-1]
+            latest = page[-1].id if page else None
+
+        return {
+            "results": MessageSerializer(page, many=True).data,
+            # poll with ?after=<latest>; page back with ?before=<earliest>
+            "latest": latest,
+            "earliest": page[0].id if page else None,
+        }
+
+    async def post(self, request, pk):
+        conversation_id = await self.get_conversation_id(request.user, pk)
+        serializer = MessageSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        message = await Message.objects.acreate(
+            conversation_id=conversation_id, sender=request.user, **serializer.validated_data
+        )
+        return MessageSerializer(message).data, status.HTTP_201_CREATED
+
+
+class NotificationInboxView(AsyncAPIView):
+    http_method_names = ["get"]
+
+    async def get(self, request):
+        limit = _int_param(request, "limit", DEFAULT_LIMIT, minimum=1, maximum=MAX_LIMIT)
+        before = _int_param(request, "before")
+        notifications = Notification.objects.filter(user_id=request.user.pk)
+        unread = notifications.filter(is_read=False)
+        if request.query_params.get("unread") in ("1", "true"):
+            notifications = unread
+        if before is not None:
+            notifications = notifications.filter(id__lt=before)
+        page = [notification async for notification in notifications.order_by("-id")[:limit]]
+        return {
+            "results": NotificationSerializer(page, many=True).data,
+            "unread_count": await unread.acount(),
+            "earliest": page[-1].id if page else None,
+        }
+
+
+class EventsView(AsyncAPIView):
+    """One long-poll for everything new for the user, instead of polling each conversation."""
+    http_method_names = ["get"]
+    throttle_scopes = {"read": "chat"}
+
+    async def get(self, request):
+        user = request.user
+        limit = _int_param(request, "limit", DEFAULT_LIMIT, minimum=1, maximum=MAX_LIMIT)
+        messages_after = _int_param(request, "messages_after")
+        notifications_after = _int_param(request, "notifications_after")
+        wait = _int_param(request, "wait", 0, maximum=get_max_wait())
+
+        # conversations started after this point are picked up by the next poll
+        conversation_ids = [
+            pk async for pk in Conversation.objects.filter(participant_filter(user)).values_list("pk", flat=True)
+        ]
+        messages = Message.objects.filter(conversation_id__in=conversation_ids)
+        notifications = Notification.objects.filter(user_id=user.pk)
+
+        # a missing cursor starts from what exists now; the first call sends neither
+        sent = (messages_after is not None, notifications_after is not None)
+        if messages_after is None:
+            messages_after = (await messages.aaggregate(latest=Max("id")))["latest"] or 0
+        if notifications_after is None:
+            notifications_after = (await notifications.aaggregate(latest=Max("id")))["latest"] or 0
+        if not any(sent):
+            return self.payload([], [], messages_after, notifications_after)
+
+        message_cursor = AfterCursor(messages.select_related("sender"), messages_after, limit, overlap=sent[0])
+        notification_cursor = AfterCursor(notifications, notifications_after, limit, overlap=sent[1])
+        await message_cursor.start()
+        await notification_cursor.start()
+
+        async def fetch():
+            return await message_cursor.fetch(), await notification_cursor.fetch()
+
+        def ready(found):
+            return message_cursor.has_news(found[0]) or notification_cursor.has_news(found[1])
+
+        channels = [realtime.user_channel(user.pk), *map(realtime.conversation_channel, conversation_ids)]
+        found_messages, found_notifications = await long_poll(fetch, channels, wait, ready)
+        return self.payload(
+            found_messages, found_notifications,
+            message_cursor.latest(found_messages), notification_cursor.latest(found_notifications),
+        )
+
+    def payload(self, messages, notifications, messages_after, notifications_after):
+        return {
+            "messages": [
+                {**data, "conversation": message.conversation_id}
+                for message, data in zip(messages, MessageSerializer(messages, many=True).data)
+            ],
+            "notifications": NotificationSerializer(notifications, many=True).data,
+            # send these back as the cursors of the next poll
+            "messages_after": messages_after,
+            "notifications_after": notifications_after,
+        }
@@ -0,0 +1,361 @@
+# scp/authentication.py
+"""
+Token authentication with caching and expiry.
+
+DRF's TokenAuthentication joins authtoken_token and auth_user on every request.
+CachedTokenAuthentication resolves the key from a small in-process LRU first, then
+from the shared Django cache, and only then from the database, so a token in
+steady use costs no queries.
+
+Tokens expire TOKEN_TTL after `Token.created`. Expiry is sliding: `created` is
+moved forward at most once per TOKEN_REFRESH_INTERVAL while the token is in use.
+
+Deleting a token (revocation, rotation, expiry) drops it from the shared cache
+immediately. Other processes may keep a copy in their local LRU for at most
+TOKEN_LOCAL_CACHE_TTL seconds.
+
+With SIGNED_TOKENS_ENABLED, login also returns a short-lived signed access token
+(`Authorization: Bearer ...`) carrying the user's id, role and active supplier /
+consumer ids, plus a refresh token. SignedAccessTokenAuthentication verifies the
+signature only; permissions read the claims instead of querying memberships.
+Claims can be up to SIGNED_ACCESS_TOKEN_TTL old.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+
+from .models import ClaimsUser, ConsumerContact, SupplierStaffMembership
+
+CACHE_PREFIX = "scp:auth:token"
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def get_token_ttl():
+    return _setting("TOKEN_TTL", timedelta(days=7))
+
+
+def get_refresh_interval():
+    return _setting("TOKEN_REFRESH_INTERVAL", timedelta(hours=1))
+
+
+def _shared_cache():
+    return caches[_setting("TOKEN_CACHE_ALIAS", "default")]
+
+
+class LRUCache:
+    """Thread-safe LRU with a per-entry time-to-live (seconds)."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+local_cache = LRUCache(
+    maxsize=_setting("TOKEN_LOCAL_CACHE_SIZE", 1024),
+    ttl=_setting("TOKEN_LOCAL_CACHE_TTL", 5),
+)
+
+
+def _cache_key(key):
+    return f"{CACHE_PREFIX}:{key}"
+
+
+def _remember(key, user, created):
+    entry = (user, created)
+    local_cache.set(key, entry)
+    _shared_cache().set(_cache_key(key), entry, _setting("TOKEN_CACHE_TTL", 60))
+
+
+def invalidate_token(key):
+    local_cache.delete(key)
+    _shared_cache().delete(_cache_key(key))
+
+
+def is_expired(created, now=None):
+    ttl = get_token_ttl()
+    if ttl is None:
+        return False
+    return created + ttl <= (now or timezone.now())
+
+
+def rotate_token(user):
+    """Replace the user's token with a fresh one (used on login)."""
+    Token.objects.filter(user=user).delete()
+    return Token.objects.create(user=user)
+
+
+def revoke_tokens(users=None):
+    """
+    Delete tokens for `users` (a queryset or iterable of users), or every token
+    when `users` is None. Returns the number of tokens revoked.
+    """
+    tokens = Token.objects.all() if users is None else Token.objects.filter(user__in=users)
+    count, _ = tokens.delete()
+    return count
+
+
+def purge_expired_tokens():
+    ttl = get_token_ttl()
+    if ttl is None:
+        return 0
+    count, _ = Token.objects.filter(created__lte=timezone.now() - ttl).delete()
+    return count
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Drop-in replacement for rest_framework.authentication.TokenAuthentication."""
+
+    def authenticate_credentials(self, key):
+        entry = local_cache.get(key)
+        if entry is None:
+            entry = _shared_cache().get(_cache_key(key))
+            if entry is None:
+                try:
+                    token = self.get_model().objects.select_related("user").get(key=key)
+                except self.get_model().DoesNotExist:
+                    raise exceptions.AuthenticationFailed("Invalid token.")
+                entry = (token.user, token.created)
+                _remember(key, *entry)
+            else:
+                local_cache.set(key, entry)
+
+        user, created = entry
+        now = timezone.now()
+        if is_expired(created, now):
+            Token.objects.filter(key=key).delete()
+            invalidate_token(key)
+            raise exceptions.AuthenticationFailed("Token has expired.")
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed("User inactive or deleted.")
+
+        if now - created >= get_refresh_interval():
+            # sliding expiry: one UPDATE per refresh interval, not per request
+            if Token.objects.filter(key=key, created=created).update(created=now):
+                created = now
+                _remember(key, user, created)
+
+        # the cached instance is shared by every request in this process; each gets its own copy
+        user = copy.copy(user)
+        return (user, Token(key=key, user=user, created=created))
+
+
+# -------------------------------
+# Signed access / refresh tokens
+# -------------------------------
+
+ACCESS_SALT = "scp.auth.access"
+REFRESH_SALT = "scp.auth.refresh"
+
+
+def signed_tokens_enabled():
+    return _setting("SIGNED_TOKENS_ENABLED", False)
+
+
+def get_access_ttl():
+    return _setting("SIGNED_ACCESS_TOKEN_TTL", timedelta(minutes=5))
+
+
+def _fingerprint(value):
+    return salted_hmac(REFRESH_SALT, value).hexdigest()[:20]
+
+
+def build_claims(user):
+    memberships = SupplierStaffMembership.objects.filter(user=user, is_active=True).values_list("supplier_id", "role")
+    consumer_ids = ConsumerContact.objects.filter(user=user).values_list("consumer_id", flat=True)
+    return {
+        "uid": str(user.pk),
+        "usr": user.username,
+        "role": user.role,
+        "st": user.is_staff,
+        "su": user.is_superuser,
+        "sup": {str(supplier_id): role for supplier_id, role in memberships},
+        "con": [str(consumer_id) for consumer_id in consumer_ids],
+    }
+
+
+def issue_signed_tokens(user, token):
+    """
+    Access + refresh pair for `user`. The refresh token is bound to the user's
+    API token, so rotating or revoking that token also kills the refresh token.
+    """
+    access = signing.dumps(build_claims(user), salt=ACCESS_SALT, compress=True)
+    refresh = signing.dumps(
+        {"uid": str(user.pk), "tk": _fingerprint(token.key)}, salt=REFRESH_SALT, compress=True
+    )
+    return {
+        "access": access,
+        "refresh": refresh,
+        "access_expires_in": int(get_access_ttl().total_seconds()),
+    }
+
+
+def refresh_signed_tokens(refresh):
+    """Validate a refresh token and issue a new pair with freshly loaded claims."""
+    try:
+        payload = signing.loads(refresh, salt=REFRESH_SALT, max_age=get_token_ttl())
+    except signing.BadSignature:  # includes SignatureExpired
+        raise exceptions.AuthenticationFailed("Invalid refresh token.")
+
+    token = Token.objects.select_related("user").filter(user_id=payload.get("uid")).first()
+    if (
+        token is None
+        or not constant_time_compare(_fingerprint(token.key), payload.get("tk", ""))
+        or is_expired(token.created)
+        or not token.user.is_active
+    ):
+        raise exceptions.AuthenticationFailed("Invalid refresh token.")
+    return issue_signed_tokens(token.user, token)
+
+
+def user_from_claims(claims):
+    user = ClaimsUser(
+        id=claims["uid"],
+        username=claims["usr"],
+        role=claims["role"],
+        is_staff=claims["st"],
+        is_superuser=claims["su"],
+        is_active=True,
+    )
+    user._state.adding = False
+    user.token_claims = claims
+    return user
+
+
+class SignedAccessTokenAuthentication(BaseAuthentication):
+    """
+    `Authorization: Bearer <access token>`; no database access.
+    Lives next to CachedTokenAuthentication and ignores `Token ...` headers.
+    """
+    keyword = "Bearer"
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode() or not signed_tokens_enabled():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed("Invalid bearer header.")
+
+        try:
+            claims = signing.loads(auth[1].decode(), salt=ACCESS_SALT, max_age=get_access_ttl())
+        except signing.SignatureExpired:
+            raise exceptions.AuthenticationFailed("Access token has expired.")
+        except (signing.BadSignature, UnicodeError):
+            raise exceptions.AuthenticationFailed("Invalid access token.")
+
+        return (user_from_claims(claims), claims)
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+# -------------------------------
+# Failed-login limiting
+# -------------------------------
+# Every failed login costs a full password hash, so repeated failures are counted
+# in the shared cache per username and per client IP. Once a counter reaches its
+# limit, login is refused without calling authenticate() for LOGIN_FAILURE_WINDOW.
+
+def _login_failure_keys(username, ip):
+    # usernames are user input; hash them into safe cache keys
+    user_key = "scp:login:user:" + hashlib.sha256(str(username or "").lower().encode()).hexdigest()
+    return user_key, f"scp:login:ip:{ip}"
+
+
+def _login_window():
+    return _setting("LOGIN_FAILURE_WINDOW", 15 * 60)
+
+
+def login_blocked(username, ip):
+    """Seconds the client should wait before trying again, or 0 if allowed."""
+    user_key, ip_key = _login_failure_keys(username, ip)
+    counts = _shared_cache().get_many([user_key, ip_key])
+    if (
+        counts.get(user_key, 0) >= _setting("LOGIN_FAILURE_LIMIT", 5)
+        or counts.get(ip_key, 0) >= _setting("LOGIN_FAILURE_IP_LIMIT", 50)
+    ):
+        return _login_window()
+    return 0
+
+
+def record_login_failure(username, ip):
+    cache = _shared_cache()
+    for key in _login_failure_keys(username, ip):
+        # add() starts the window; incr() is atomic on real cache backends
+        cache.add(key, 0, _login_window())
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, _login_window())
+
+
+def reset_login_failures(username):
+    user_key, _ = _login_failure_keys(username, None)
+    _shared_cache().delete(user_key)
+
+
+# -------------------------------
+# Cache coherence
+# -------------------------------
+
+@receiver(post_delete, sender=Token)
+def _token_deleted(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def _user_saved(sender, instance, created, **kwargs):
+    # cached entries carry the user object; drop them when it changes
+    if not created:
+        for key in Token.objects.filter(user=instance).values_list("key", flat=True):
+            invalidate_token(key)
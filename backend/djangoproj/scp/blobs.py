@@ -0,0 +1,111 @@
+# scp/blobs.py
+"""
+Reference counts and garbage collection for the blobs of
+ContentAddressedStorage (scp/storage.py).
+
+Saves do no bookkeeping: gc_blobs counts the rows using each blob from the
+tables (recount() keeps the result in Blob for reporting), so writes that
+skip the model signals cannot make it delete a blob that is still used.
+
+collect_garbage() deletes blob files no row refers to that have not been
+written or reused for BLOB_GC_GRACE. The grace period protects a blob
+stored by a request whose row has not been committed yet: storing a blob
+always replaces its file, so the mtime is fresh. A save can land between
+the mtime check and the delete, so a blob is first moved aside and its
+mtime checked again; one stored meanwhile is put back.
+"""
+import os
+import time
+import uuid
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Attachment, Blob, ProductAttachment, SupplierKYBDocument
+from .storage import BLOB_PREFIX, STAGING_DIR, blob_storage
+
+# every file field stored in blob_storage
+FILE_FIELDS = {SupplierKYBDocument: "document", ProductAttachment: "file", Attachment: "file"}
+
+
+def get_gc_grace():
+    return getattr(settings, "BLOB_GC_GRACE", timedelta(hours=24))
+
+
+def recount(using="default"):
+    """Set every Blob.ref_count from the tables; returns the counts by name."""
+    counts = Counter()
+    for model, attname in FILE_FIELDS.items():
+        rows = (
+            model.objects.using(using).filter(**{f"{attname}__startswith": BLOB_PREFIX})
+            .values(attname).annotate(references=Count("pk"))
+        )
+        for row in rows:
+            counts[row[attname]] += row["references"]
+
+    with transaction.atomic(using):
+        stored = dict(Blob.objects.using(using).values_list("name", "ref_count"))
+        storage = blob_storage()
+        Blob.objects.using(using).bulk_create(
+            [
+                Blob(name=name, ref_count=count, size=storage.size(name) if storage.exists(name) else 0)
+                for name, count in counts.items() if name not in stored
+            ],
+            ignore_conflicts=True,
+        )
+        for name, ref_count in stored.items():
+            if ref_count != counts.get(name, 0):
+                Blob.objects.using(using).filter(name=name).update(ref_count=counts.get(name, 0))
+    return counts
+
+
+def _remove_if_stale(path, cutoff, staging_dir):
+    """Delete the file at `path` unless it was stored again since `cutoff`; returns whether it went."""
+    graveyard = os.path.join(staging_dir, f"gc-{uuid.uuid4().hex}")
+    try:
+        os.rename(path, graveyard)
+    except FileNotFoundError:
+        return False
+    # the moved file is whatever was at `path` when it moved: a save after that leaves a new file behind
+    if os.stat(graveyard).st_mtime > cutoff:
+        os.replace(graveyard, path)
+        return False
+    os.remove(graveyard)
+    return True
+
+
+def collect_garbage(grace=None, dry_run=False, using="default"):
+    """
+    Delete unreferenced blobs untouched for `grace` (default BLOB_GC_GRACE),
+    and Blob rows left without a file. Returns (names, bytes) reclaimed.
+    """
+    grace = get_gc_grace() if grace is None else grace
+    cutoff = time.time() - grace.total_seconds()
+    counts = recount(using)
+    storage = blob_storage()
+
+    reclaimed, freed = [], 0
+    # temp files of interrupted saves (blobs/tmp/) are reclaimed the same way
+    for directory, _, filenames in os.walk(storage.path(BLOB_PREFIX)):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, storage.location).replace(os.sep, "/")
+            if counts.get(name):
+                continue
+            stat = os.stat(path)
+            if stat.st_mtime > cutoff:
+                continue
+            if not dry_run and not _remove_if_stale(path, cutoff, storage.path(STAGING_DIR)):
+                continue
+            reclaimed.append(name)
+            freed += stat.st_size
+
+    if not dry_run:
+        unreferenced = Blob.objects.using(using).filter(ref_count__lte=0)
+        missing = [name for name in unreferenced.values_list("name", flat=True) if not storage.exists(name)]
+        for start in range(0, len(missing), 1000):
+            unreferenced.filter(name__in=missing[start:start + 1000]).delete()
+    return reclaimed, freed
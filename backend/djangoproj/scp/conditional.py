@@ -0,0 +1,111 @@
+# scp/conditional.py
+"""
+HTTP conditional GET (ETag / Last-Modified) for ViewSets whose model has `updated_at`.
+
+Validators come from row metadata, not from the rendered body:
+  - detail: the object's pk and updated_at
+  - list:   COUNT(*) and MAX(updated_at) of the filtered queryset (one aggregate query)
+  - `?expand=`: the updated_at of each expanded relation as well (MAX over the
+    list, in the same query); a relation without one skips the conditional path
+plus the path, query string and negotiated media type of the request,
+so a matching If-None-Match / If-Modified-Since returns 304 before anything is
+serialized. ETags are weak (W/"...") because they describe the data, not the bytes.
+"""
+import hashlib
+from urllib.parse import urlencode
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Count, Max
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+class ConditionalGetMixin:
+    last_modified_field = "updated_at"
+
+    def make_etag(self, *parts):
+        # fields / expand / filters / page change the body, so the query string is
+        # part of the tag, in a canonical order so reordered parameters still match
+        params = self.request.query_params
+        query = sorted((key, value) for key in params for value in params.getlist(key))
+        raw = "|".join(str(part) for part in (
+            self.__class__.__name__, self.request.path, urlencode(query),
+            getattr(self.request, "accepted_media_type", ""), *parts
+        ))
+        return "W/" + quote_etag(hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest())
+
+    def expanded_lookups(self):
+        """`<relation>__updated_at` of each expanded relation; None if one cannot be validated."""
+        expand = self.request.query_params.get("expand")
+        names = [name.strip() for name in expand.split(",") if name.strip()] if expand else []
+        lookups = []
+        for name in names:
+            try:
+                related = self.get_queryset().model._meta.get_field(name).related_model
+                related._meta.get_field(self.last_modified_field)
+            except (FieldDoesNotExist, AttributeError):
+                return None
+            lookups.append(f"{name}__{self.last_modified_field}")
+        return lookups
+
+    def is_not_modified(self, request, etag, last_modified):
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match:
+            # weak comparison: W/"x" matches "x"
+            strip = lambda tag: tag[2:] if tag.startswith("W/") else tag
+            tags = parse_etags(if_none_match)
+            return tags == ["*"] or strip(etag) in {strip(tag) for tag in tags}
+
+        since = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+        return bool(since and last_modified and int(last_modified.timestamp()) <= since)
+
+    def conditional_response(self, request, etag, last_modified, build):
+        """Return 304 if the client copy is current, otherwise `build()` with validators set."""
+        if self.is_not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = build()
+        response["ETag"] = etag
+        if last_modified:
+            response["Last-Modified"] = http_date(last_modified.timestamp())
+        response["Cache-Control"] = "private, no-cache"
+        patch_vary_headers(response, ("Authorization",))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        lookups = self.expanded_lookups()
+        if lookups is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        stats = queryset.aggregate(
+            count=Count("pk"), last_modified=Max(self.last_modified_field),
+            **{f"expanded_{i}": Max(lookup) for i, lookup in enumerate(lookups)},
+        )
+        modified = [stats[f"expanded_{i}"] for i in range(len(lookups))]
+        etag = self.make_etag(stats["count"], stats["last_modified"], *modified)
+        last_modified = max(filter(None, [stats["last_modified"], *modified]), default=None)
+
+        def build():
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                return self.get_paginated_response(self.get_serializer(page, many=True).data)
+            return Response(self.get_serializer(queryset, many=True).data)
+
+        return self.conditional_response(request, etag, last_modified, build)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookups = self.expanded_lookups()
+        if lookups is None:
+            return super().retrieve(request, *args, **kwargs)
+        instance = self.get_object()
+        modified = [getattr(instance, self.last_modified_field)]
+        for lookup in lookups:
+            related = getattr(instance, lookup.split("__")[0])
+            modified.append(getattr(related, self.last_modified_field) if related is not None else None)
+        etag = self.make_etag(instance.pk, *modified)
+        last_modified = max(filter(None, modified), default=None)
+        return self.conditional_response(
+            request, etag, last_modified, lambda: Response(self.get_serializer(instance).data)
+        )
@@ -0,0 +1,219 @@
+# scp/fast_serializers.py
+"""
+Read-only fast path for large list responses.
+
+`ValuesSerializer(ProductSerializer, queryset)` produces the same `.data` as
+`ProductSerializer(queryset, many=True)` without building model instances or
+going through DRF's per-field get_attribute machinery: it reads `.values()` rows
+and applies one converter per field. Converters are compiled once per serializer
+class from its declared fields, so output follows the serializer when fields change.
+Nested `many=True` serializers over reverse foreign keys (OrderSerializer.items)
+are loaded with one extra `.values()` query, like prefetch_related.
+
+Only fields backed by concrete model columns are supported; anything else
+(SerializerMethodField, dotted sources, many-to-many) raises ImproperlyConfigured
+the first time the serializer is compiled.
+
+FastListMixin switches a ViewSet's unpaginated list action to this path.
+"""
+import decimal
+from collections import defaultdict
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db.models import ForeignKey, ManyToOneRel, QuerySet
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.fields import ISO_8601
+from rest_framework.settings import api_settings
+
+from .fieldsets import check_names
+
+
+def _identity(value):
+    return value
+
+
+def _decimal_converter(field):
+    if field.localize or field.normalize_output or field.decimal_places is None:
+        return field.to_representation
+    if not getattr(field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING):
+        return field.to_representation
+
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    exponent = decimal.Decimal(".1") ** field.decimal_places
+    rounding = field.rounding
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return f"{value.quantize(exponent, rounding=rounding, context=context):f}"
+    return convert
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601 or hasattr(field, "timezone"):
+        return field.to_representation
+    tz = field.default_timezone()
+    if tz is None:
+        return field.to_representation
+
+    def convert(value):
+        value = value.astimezone(tz) if timezone.is_aware(value) else timezone.make_aware(value, tz)
+        value = value.isoformat()
+        return value[:-6] + "Z" if value.endswith("+00:00") else value
+    return convert
+
+
+def _file_converter(field, model_field, request):
+    if not getattr(field, "use_url", api_settings.UPLOADED_FILES_USE_URL):
+        return _identity
+    storage = model_field.storage
+
+    def convert(name):
+        if not name:
+            return None
+        url = storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+    return convert
+
+
+class _Plan:
+    """Field layout of one serializer class, independent of the request."""
+
+    def __init__(self, serializer_class):
+        serializer = serializer_class()
+        self.model = serializer_class.Meta.model
+        self.fields = []   # (output name, values() key, serializer field, model field)
+        self.nested = []   # (output name, child serializer class, child fk name)
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                self.nested.append((name, type(field.child), self._reverse_fk(name, field.source)))
+                continue
+            if isinstance(field, (serializers.ManyRelatedField, serializers.BaseSerializer)) or "." in field.source:
+                raise ImproperlyConfigured(f"{serializer_class.__name__}.{name} is not supported by ValuesSerializer.")
+            try:
+                model_field = self.model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                raise ImproperlyConfigured(
+                    f"{serializer_class.__name__}.{name} is not a model column; ValuesSerializer cannot read it."
+                )
+            if not model_field.concrete or model_field.many_to_many:
+                raise ImproperlyConfigured(f"{serializer_class.__name__}.{name} is not a model column.")
+            if isinstance(model_field, ForeignKey) and not isinstance(field, serializers.PrimaryKeyRelatedField):
+                raise ImproperlyConfigured(f"{serializer_class.__name__}.{name}: only primary keys of related objects are supported.")
+            self.fields.append((name, model_field.name, field, model_field))
+
+    def _reverse_fk(self, name, source):
+        try:
+            relation = self.model._meta.get_field(source)
+        except FieldDoesNotExist:
+            relation = None
+        if not isinstance(relation, ManyToOneRel):
+            raise ImproperlyConfigured(f"Nested field {name} must be a reverse foreign key.")
+        return relation.field.name
+
+    def converters(self, request):
+        result = []
+        for name, key, field, model_field in self.fields:
+            if isinstance(field, serializers.UUIDField) and field.uuid_format == "hex_verbose":
+                convert = str
+            elif isinstance(field, serializers.DecimalField):
+                convert = _decimal_converter(field)
+            elif isinstance(field, serializers.DateTimeField):
+                convert = _datetime_converter(field)
+            elif isinstance(field, serializers.FileField):
+                convert = _file_converter(field, model_field, request)
+            elif isinstance(field, (
+                serializers.CharField, serializers.IntegerField, serializers.BooleanField, serializers.ChoiceField,
+            )) or (isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None):
+                # database values already have the representation DRF would produce
+                convert = _identity
+            else:
+                convert = field.to_representation
+            result.append((name, key, convert))
+        return result
+
+
+_plans = {}
+
+
+def get_plan(serializer_class):
+    plan = _plans.get(serializer_class)
+    if plan is None:
+        plan = _plans[serializer_class] = _Plan(serializer_class)
+    return plan
+
+
+class ValuesSerializer:
+    """Read-only stand-in for `serializer_class(queryset, many=True)`."""
+
+    def __init__(self, serializer_class, queryset, context=None):
+        self.serializer_class = serializer_class
+        self.queryset = queryset
+        self.context = context or {}
+
+    @property
+    def data(self):
+        return self.serialize(self.serializer_class, self.queryset)
+
+    def serialize(self, serializer_class, queryset, parent_key=None):
+        plan = get_plan(serializer_class)
+        converters = plan.converters(self.context.get("request"))
+        nested = plan.nested
+        pk_name = plan.model._meta.pk.name
+
+        requested = self.context.get("fields") if parent_key is None else None
+        if requested:
+            # ?fields= (see scp/fieldsets.py) applies to the top level only
+            check_names("fields", requested, [c[0] for c in converters] + [n[0] for n in nested])
+            converters = [c for c in converters if c[0] in requested]
+            nested = [n for n in nested if n[0] in requested]
+
+        keys = {key for _, key, _ in converters} | {pk_name}
+        if parent_key:
+            keys.add(parent_key)
+        # values() cannot be combined with prefetching; nested data is loaded below
+        rows = list(queryset.prefetch_related(None).values(*keys))
+
+        children = {}
+        for name, child_class, fk_name in nested:
+            grouped = defaultdict(list)
+            child_model = get_plan(child_class).model
+            child_qs = child_model._default_manager.filter(**{f"{fk_name}__in": [row[pk_name] for row in rows]})
+            if not child_model._meta.ordering:
+                child_qs = child_qs.order_by("pk")
+            for parent_id, item in self.serialize(child_class, child_qs, parent_key=fk_name):
+                grouped[parent_id].append(item)
+            children[name] = grouped
+
+        output = []
+        for row in rows:
+            item = {}
+            for name, key, convert in converters:
+                value = row[key]
+                item[name] = None if value is None else convert(value)
+            for name, _, _ in nested:
+                item[name] = children[name].get(row[pk_name], [])
+            output.append((row[parent_key], item) if parent_key else item)
+        return output
+
+
+class FastListMixin:
+    """
+    ViewSet mixin: the list action serializes querysets with ValuesSerializer.
+    Paginated pages (lists of instances) and `?expand=` requests still use the
+    regular serializer.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action == "list" and kwargs.get("many") and args and isinstance(args[0], QuerySet):
+            context = self.get_serializer_context()
+            if not context.get("expand"):
+                return ValuesSerializer(self.get_serializer_class(), args[0], context=context)
+        return super().get_serializer(*args, **kwargs)
@@ -0,0 +1,125 @@
+# scp/fieldsets.py
+"""
+Sparse fieldsets and expandable relations for GET requests.
+
+    GET /api/products/?fields=id,name,price
+    GET /api/products/?fields=id,name,supplier&expand=supplier
+
+`fields` limits the output to the listed serializer fields; `expand` replaces a
+related id with the nested object for names in the serializer's
+`Meta.expandable_fields` ({name: SerializerClass}). Unknown names are a 400.
+
+SparseFieldsetMixin (views) parses both parameters into the serializer context
+and shapes the queryset to match: unrequested columns are deferred with
+`.only()`, expanded relations are joined with select_related / prefetch_related,
+and nested lists that were not requested are not prefetched.
+DynamicFieldsMixin (serializers) applies them to the top-level serializer only;
+nested and expanded serializers keep all their fields.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+
+def parse_names(value):
+    if not value:
+        return None
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    return names or None
+
+
+def check_names(param, requested, available):
+    unknown = [name for name in requested if name not in available]
+    if unknown:
+        raise ValidationError({param: f"Unknown field(s): {', '.join(unknown)}."})
+
+
+class DynamicFieldsMixin:
+    """ModelSerializer mixin honouring the `fields` / `expand` serializer context."""
+
+    def _is_top_level(self):
+        parent = self.parent
+        return parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.context.get("fields")
+        expand = self.context.get("expand")
+        if not (requested or expand) or not self._is_top_level():
+            return fields
+
+        if expand:
+            expandable = getattr(self.Meta, "expandable_fields", {})
+            check_names("expand", expand, expandable)
+            for name in expand:
+                fields[name] = expandable[name](read_only=True)
+        if requested:
+            check_names("fields", requested, fields)
+            fields = {name: field for name, field in fields.items() if name in requested}
+        return fields
+
+
+class SparseFieldsetMixin:
+    """ViewSet mixin: `?fields=` / `?expand=` for safe methods."""
+
+    def get_requested_fields(self):
+        if self.request.method not in SAFE_METHODS:
+            return None, None
+        params = self.request.query_params
+        return parse_names(params.get("fields")), parse_names(params.get("expand"))
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["fields"], context["expand"] = self.get_requested_fields()
+        return context
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        requested, expand = self.get_requested_fields()
+        if not (requested or expand):
+            return queryset
+
+        serializer_class = self.get_serializer_class()
+        declared = serializer_class().fields
+        model = queryset.model
+        expandable = getattr(serializer_class.Meta, "expandable_fields", {})
+        expand = [name for name in expand or () if name in expandable and (not requested or name in requested)]
+
+        if requested:
+            columns = self._columns(model, declared, requested)
+            if columns is not None:
+                # drop the view's own joins; only what was asked for is loaded
+                queryset = queryset.select_related(None).prefetch_related(None).only(*columns)
+                nested = [
+                    declared[name].source for name in requested
+                    if isinstance(declared.get(name), serializers.ListSerializer)
+                ]
+                queryset = queryset.prefetch_related(*nested)
+
+        for name in expand:
+            relation = model._meta.get_field(name)
+            if relation.many_to_one or (relation.one_to_one and relation.concrete):
+                queryset = queryset.select_related(name)
+            else:
+                queryset = queryset.prefetch_related(name)
+        return queryset
+
+    def _columns(self, model, declared, requested):
+        """Model fields to load for `requested`, or None if they cannot be worked out."""
+        columns = {model._meta.pk.name}
+        last_modified = getattr(self, "last_modified_field", None)
+        if last_modified:
+            columns.add(last_modified)
+        for name in requested:
+            field = declared.get(name)
+            if field is None or isinstance(field, serializers.ListSerializer):
+                continue  # unknown names are reported by the serializer
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                return None  # properties, methods, dotted sources
+            if not model_field.concrete or model_field.many_to_many:
+                return None
+            columns.add(model_field.name)
+        return columns
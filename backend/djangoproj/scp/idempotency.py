@@ -0,0 +1,156 @@
+# scp/idempotency.py
+"""
+`Idempotency-Key` support for unsafe API actions.
+
+Clients on flaky networks send the same key with every retry of a request.
+The first request claims the key by inserting an IdempotencyKey row (the unique
+(user, key) constraint is the lock); its response is stored on that row and
+replayed for later retries until the key expires. A duplicate that arrives while
+the first request is still running gets 409 and should retry shortly.
+The purge_idempotency_keys command deletes expired keys.
+"""
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+REPLAY_HEADER = "Idempotent-Replayed"
+
+# how long a stored response can be replayed
+DEFAULT_TTL = timedelta(hours=24)
+# how long an in-flight claim is honoured before another request may take it over
+# (covers workers that died between claiming a key and storing the response)
+DEFAULT_LOCK_TIMEOUT = timedelta(seconds=60)
+
+
+def get_ttl():
+    return getattr(settings, "IDEMPOTENCY_KEY_TTL", DEFAULT_TTL)
+
+
+def get_lock_timeout():
+    return getattr(settings, "IDEMPOTENCY_LOCK_TIMEOUT", DEFAULT_LOCK_TIMEOUT)
+
+
+def request_fingerprint(request):
+    """Hash of what makes two requests "the same": method, path and payload."""
+    payload = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder)
+    raw = f"{request.method}\n{request.path}\n{payload}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _claim(user, key, request, fingerprint):
+    """
+    Try to claim `key` for this request.
+    Returns (record, claimed). When claimed is False, record is the existing row.
+    """
+    now = timezone.now()
+    defaults = {
+        "method": request.method,
+        "path": request.path,
+        "request_hash": fingerprint,
+        "created_at": now,
+        "expires_at": now + get_ttl(),
+    }
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(user=user, key=key, **defaults), True
+    except IntegrityError:
+        pass
+
+    record = IdempotencyKey.objects.filter(user=user, key=key).first()
+    if record is None:
+        # the other holder gave the key up in the meantime
+        return _claim(user, key, request, fingerprint)
+
+    if record.expires_at <= now:
+        # expired responses are not replayed; take the key over
+        taken = IdempotencyKey.objects.filter(pk=record.pk, expires_at=record.expires_at).update(
+            response_status=None, response_body=None, **defaults
+        )
+        if taken:
+            record.refresh_from_db()
+            return record, True
+        return _claim(user, key, request, fingerprint)
+
+    if not record.is_complete and record.created_at <= now - get_lock_timeout():
+        # stale in-flight claim; conditional UPDATE so only one retry wins it
+        taken = IdempotencyKey.objects.filter(
+            pk=record.pk, response_status__isnull=True, created_at=record.created_at
+        ).update(**defaults)
+        if taken:
+            record.refresh_from_db()
+            return record, True
+
+    return record, False
+
+
+def _release(record):
+    IdempotencyKey.objects.filter(pk=record.pk, response_status__isnull=True).delete()
+
+
+def _replay(record):
+    response = Response(record.response_body, status=record.response_status)
+    response[REPLAY_HEADER] = "true"
+    return response
+
+
+def idempotent(view_method):
+    """
+    Decorator for ViewSet create/@action methods.
+    Requests without an `Idempotency-Key` header run unchanged. Server errors and
+    exceptions release the key, so the client can retry the same key later.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or not request.user or not request.user.is_authenticated:
+            return view_method(self, request, *args, **kwargs)
+
+        if len(key) > IdempotencyKey._meta.get_field("key").max_length:
+            return Response({"detail": f"{HEADER} is too long."}, status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = request_fingerprint(request)
+        record, claimed = _claim(request.user, key, request, fingerprint)
+
+        if not claimed:
+            if record.request_hash != fingerprint:
+                return Response(
+                    {"detail": f"{HEADER} was already used for a different request."},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if not record.is_complete:
+                response = Response(
+                    {"detail": "A request with this idempotency key is already in progress."},
+                    status=status.HTTP_409_CONFLICT,
+                )
+                response["Retry-After"] = "1"
+                return response
+            return _replay(record)
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            _release(record)
+            raise
+
+        if response.status_code >= 500:
+            _release(record)
+            return response
+
+        IdempotencyKey.objects.filter(pk=record.pk).update(
+            response_status=response.status_code,
+            response_body=response.data,
+        )
+        return response
+
+    return wrapper
@@ -0,0 +1,67 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure per-request database connection overhead with a new connection per request, "
+        "persistent connections (CONN_MAX_AGE, with and without health checks) and the psycopg pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--database", default="default")
+        parser.add_argument("--queries", type=int, default=1, help="Queries per simulated request")
+
+    def modes(self, base):
+        yield "new connection per request", {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False}
+        yield "persistent", {"CONN_MAX_AGE": 600, "CONN_HEALTH_CHECKS": False}
+        yield "persistent + health checks", {"CONN_MAX_AGE": 600, "CONN_HEALTH_CHECKS": True}
+        if base["ENGINE"] == "django.db.backends.postgresql":
+            options = {k: v for k, v in base.get("OPTIONS", {}).items() if k != "pool"}
+            pool = base.get("OPTIONS", {}).get("pool") or True
+            yield "psycopg pool", {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False, "OPTIONS": {**options, "pool": pool}}
+
+    def run_mode(self, alias, requests, queries):
+        connection = connections[alias]
+        timings = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            # the same signals Django sends around every request close or recycle connections
+            request_started.send(sender=self.__class__)
+            with connection.cursor() as cursor:
+                for _ in range(queries):
+                    cursor.execute("SELECT 1")
+                    cursor.fetchone()
+            request_finished.send(sender=self.__class__)
+            timings.append((time.perf_counter() - start) * 1000)
+        connection.close()
+        if hasattr(connection, "close_pool"):
+            connection.close_pool()
+        return timings
+
+    def handle(self, *args, **options):
+        base = connections[options["database"]].settings_dict
+        self.stdout.write(f"{base['ENGINE']} {base.get('HOST') or ''} {base['NAME']}, {options['requests']} requests\n")
+
+        for label, overrides in self.modes(base):
+            alias = f"__bench_{label.replace(' ', '_')}"
+            connections.settings[alias] = {**base, **overrides}
+            try:
+                timings = self.run_mode(alias, options["requests"], options["queries"])
+            except Exception as exc:  # e.g. psycopg_pool not installed
+                self.stdout.write(self.style.WARNING(f"{label:<28} skipped: {exc}"))
+                continue
+            finally:
+                del connections[alias]
+                del connections.settings[alias]
+
+            timings.sort()
+            self.stdout.write(
+                f"{label:<28} mean {statistics.fmean(timings):7.3f} ms  "
+                f"p50 {timings[len(timings) // 2]:7.3f} ms  p95 {timings[int(len(timings) * 0.95)]:7.3f} ms"
+            )
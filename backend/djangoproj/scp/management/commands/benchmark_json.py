@@ -0,0 +1,139 @@
+import io
+import random
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from scp.middleware import CompressionMiddleware
+from scp.renderers import FastJSONParser, FastJSONRenderer, orjson
+
+
+def _ts(now, minutes):
+    return (now - timedelta(minutes=minutes)).isoformat().replace("+00:00", "Z")
+
+
+def order_payload(count, items):
+    """Shaped like OrderSerializer output for a list of orders."""
+    now = timezone.now()
+    statuses = ["pending", "in_progress", "completed", "cancelled"]
+    supplier, consumer, user = str(uuid.uuid4()), str(uuid.uuid4()), str(uuid.uuid4())
+    orders = []
+    for i in range(count):
+        lines = [
+            {
+                "id": i * items + j,
+                "order": None,
+                "product": str(uuid.uuid4()),
+                "quantity": f"{random.randint(1, 50)}.000",
+                "unit_price": f"{random.randint(100, 99999) / 100:.2f}",
+                "line_total": f"{random.randint(100, 999999) / 100:.2f}",
+            }
+            for j in range(items)
+        ]
+        order_id = str(uuid.uuid4())
+        for line in lines:
+            line["order"] = order_id
+        orders.append({
+            "id": order_id,
+            "supplier": supplier,
+            "consumer": consumer,
+            "placed_by": user,
+            "status": random.choice(statuses),
+            "note": "Deliver to the back entrance before 10:00." if i % 3 == 0 else None,
+            "total_amount": f"{random.randint(1000, 9999999) / 100:.2f}",
+            "created_at": _ts(now, i * 7),
+            "accepted_at": _ts(now, i * 7 - 3),
+            "completed_at": None,
+            "tracking_code": None,
+            "estimated_delivery": None,
+            "version": random.randint(0, 3),
+            "items": lines,
+        })
+    return orders
+
+
+def conversation_payload(count, messages):
+    """Shaped like ConversationSerializer output."""
+    now = timezone.now()
+    words = "order delivery invoice price stock tomorrow please confirm thanks quantity pallet".split()
+    return [
+        {
+            "id": i,
+            "supplier_staff": [i * 2, i * 2 + 1],
+            "consumer_contact": i,
+            "consumer_name": "Green Grocer LLP",
+            "consumer_contact_name": f"contact_{i}",
+            "created_at": _ts(now, 10_000),
+            "updated_at": _ts(now, i),
+            "messages": [
+                {
+                    "id": i * messages + j,
+                    "sender": j % 2 + 1,
+                    "sender_name": "sales_1" if j % 2 else f"contact_{i}",
+                    "text": " ".join(random.choices(words, k=random.randint(4, 30))),
+                    "created_at": _ts(now, messages - j),
+                    "is_read": j < messages - 3,
+                }
+                for j in range(messages)
+            ],
+            "complaint": None,
+        }
+        for i in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = "Compare DRF's JSON renderer/parser with the orjson-based ones and measure compression savings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=200)
+        parser.add_argument("--items", type=int, default=8, help="Items per order")
+        parser.add_argument("--conversations", type=int, default=50)
+        parser.add_argument("--messages", type=int, default=40, help="Messages per conversation")
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def timed(self, func, repeat):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - start)
+        return best * 1000, result
+
+    def handle(self, *args, **options):
+        random.seed(options["seed"])
+        repeat = options["repeat"]
+        if orjson is None:
+            self.stdout.write(self.style.WARNING("orjson is not installed; the fast classes fall back to stdlib json."))
+
+        payloads = {
+            "orders": order_payload(options["orders"], options["items"]),
+            "conversations": conversation_payload(options["conversations"], options["messages"]),
+        }
+        compressor = CompressionMiddleware(lambda request: None)
+
+        for name, data in payloads.items():
+            drf_ms, body = self.timed(lambda: JSONRenderer().render(data), repeat)
+            fast_ms, fast_body = self.timed(lambda: FastJSONRenderer().render(data), repeat)
+            parse_ms, _ = self.timed(lambda: JSONParser().parse(io.BytesIO(body)), repeat)
+            fast_parse_ms, _ = self.timed(lambda: FastJSONParser().parse(io.BytesIO(body)), repeat)
+
+            self.stdout.write(f"\n{name}: {len(data)} objects, {len(body) / 1024:.1f} KiB")
+            self.stdout.write(f"  render  DRF {drf_ms:8.2f} ms   fast {fast_ms:8.2f} ms   x{drf_ms / fast_ms:.1f}")
+            self.stdout.write(f"  parse   DRF {parse_ms:8.2f} ms   fast {fast_parse_ms:8.2f} ms   x{parse_ms / fast_parse_ms:.1f}")
+            if len(fast_body) != len(body):
+                self.stdout.write(self.style.WARNING(f"  output size differs: {len(body)} vs {len(fast_body)} bytes"))
+
+            for coding in compressor.encodings:
+                ms, compressed = self.timed(lambda: compressor.compress(fast_body, coding), max(1, repeat // 4))
+                self.stdout.write(
+                    f"  {coding:<5} {len(compressed) / 1024:8.1f} KiB  "
+                    f"({100 - 100 * len(compressed) / len(fast_body):.0f}% smaller) in {ms:.2f} ms"
+                )
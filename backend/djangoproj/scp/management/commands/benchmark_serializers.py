@@ -0,0 +1,78 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+
+from scp.fast_serializers import ValuesSerializer
+from scp.models import Consumer, Order, OrderItem, Product, Supplier, User
+from scp.renderers import FastJSONRenderer
+from scp.serializers import OrderSerializer, ProductSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare ModelSerializer with ValuesSerializer on large product and order pages. "
+        "Rows are created inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000, help="Products and orders per page")
+        parser.add_argument("--items", type=int, default=3, help="Items per order")
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def timed(self, func, repeat):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - start)
+        return best * 1000, result
+
+    def seed(self, rows, items):
+        owner = User.objects.create_user(username="bench_owner", role="owner")
+        supplier = Supplier.objects.create(owner=owner, name="Bench supplier")
+        consumer = Consumer.objects.create(name="Bench consumer")
+        products = Product.objects.bulk_create(
+            Product(supplier=supplier, name=f"Product {i}", unit="kg", price=Decimal(i % 500) + Decimal("0.99"),
+                    stock=Decimal(i % 90), description="Bench product")
+            for i in range(rows)
+        )
+        orders = Order.objects.bulk_create(
+            Order(supplier=supplier, consumer=consumer, placed_by=owner, total_amount=Decimal("99.90"))
+            for _ in range(rows)
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=products[(i + j) % rows], quantity=Decimal("1.5"),
+                      unit_price=Decimal("10.00"), line_total=Decimal("15.00"))
+            for i, order in enumerate(orders)
+            for j in range(items)
+        )
+
+    def handle(self, *args, **options):
+        rows, repeat = options["rows"], options["repeat"]
+        context = {"request": RequestFactory().get("/api/")}
+        renderer = FastJSONRenderer()
+
+        with transaction.atomic():
+            self.seed(rows, options["items"])
+            pages = {
+                "products": (ProductSerializer, lambda: Product.objects.select_related("supplier")),
+                "orders": (OrderSerializer, lambda: Order.objects.prefetch_related("items")),
+            }
+            for name, (serializer_class, queryset) in pages.items():
+                slow_ms, slow = self.timed(
+                    lambda: serializer_class(queryset(), many=True, context=context).data, repeat
+                )
+                fast_ms, fast = self.timed(
+                    lambda: ValuesSerializer(serializer_class, queryset(), context=context).data, repeat
+                )
+                same = renderer.render(slow) == renderer.render(fast)
+                self.stdout.write(
+                    f"{name:<9} {len(fast)} rows  ModelSerializer {slow_ms:9.1f} ms  "
+                    f"ValuesSerializer {fast_ms:9.1f} ms  x{slow_ms / fast_ms:.1f}  "
+                    + ("identical output" if same else self.style.ERROR("OUTPUT DIFFERS"))
+                )
+            # leave the database as it was
+            transaction.set_rollback(True)
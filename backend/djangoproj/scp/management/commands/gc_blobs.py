@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from scp.blobs import collect_garbage
+
+
+class Command(BaseCommand):
+    help = "Recount blob references and delete blobs no row uses that are older than BLOB_GC_GRACE."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--grace-hours", type=float, help="Override BLOB_GC_GRACE.")
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be deleted.")
+
+    def handle(self, *args, **options):
+        grace = None if options["grace_hours"] is None else timedelta(hours=options["grace_hours"])
+        names, size = collect_garbage(grace=grace, dry_run=options["dry_run"])
+        verb = "Would reclaim" if options["dry_run"] else "Reclaimed"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(names)} blob(s), {size} bytes."))
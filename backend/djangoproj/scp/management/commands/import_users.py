@@ -0,0 +1,112 @@
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from scp.models import User
+
+FIELDS = ["username", "email", "password", "role", "display_name", "phone"]
+
+
+def _init_worker():
+    # spawned workers (macOS/Windows) start without configured apps
+    django.setup()
+
+
+def _hash_password(args):
+    password, hasher = args
+    return make_password(password or None, hasher=hasher)
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-create users from a CSV file with columns "
+        + ", ".join(FIELDS)
+        + ". Passwords are hashed across a process pool and users are inserted with bulk_create."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_path")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                            help="Hashing processes (1 = hash in this process)")
+        parser.add_argument("--hasher", default="default",
+                            help="Algorithm name from PASSWORD_HASHERS, e.g. pbkdf2_sha256 or argon2")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--skip-existing", action="store_true",
+                            help="Ignore rows whose username already exists instead of failing")
+
+    def handle(self, *args, **options):
+        rows = self.read_rows(options["csv_path"])
+        skipped = []
+        if options["skip_existing"]:
+            # filtered before hashing; bulk_create(ignore_conflicts=True) returns every object it was given
+            existing = self.existing_usernames([row["username"] for row in rows], options["batch_size"])
+            skipped = [row for row in rows if row["username"] in existing]
+            rows = [row for row in rows if row["username"] not in existing]
+        if not rows:
+            self.stdout.write(f"No users to import; skipped {len(skipped)} existing." if skipped else "No users to import.")
+            return
+
+        jobs = [(row["password"], options["hasher"]) for row in rows]
+        if options["workers"] > 1:
+            chunksize = max(1, len(jobs) // (options["workers"] * 4))
+            with ProcessPoolExecutor(max_workers=options["workers"], initializer=_init_worker) as pool:
+                hashes = list(pool.map(_hash_password, jobs, chunksize=chunksize))
+        else:
+            hashes = [_hash_password(job) for job in jobs]
+
+        users = [
+            User(
+                username=row["username"],
+                email=row["email"],
+                password=password_hash,
+                role=row["role"] or None,
+                display_name=row["display_name"],
+                phone=row["phone"],
+            )
+            for row, password_hash in zip(rows, hashes)
+        ]
+        with transaction.atomic():
+            # ignore_conflicts still covers usernames taken since the check
+            User.objects.bulk_create(
+                users, batch_size=options["batch_size"], ignore_conflicts=options["skip_existing"]
+            )
+
+        message = f"Imported {len(users)} user(s)."
+        if skipped:
+            message += f" Skipped {len(skipped)} existing."
+        self.stdout.write(self.style.SUCCESS(message))
+
+    def existing_usernames(self, usernames, batch_size):
+        existing = set()
+        for start in range(0, len(usernames), batch_size):
+            batch = usernames[start:start + batch_size]
+            existing.update(User.objects.filter(username__in=batch).values_list("username", flat=True))
+        return existing
+
+    def read_rows(self, path):
+        try:
+            with open(path, newline="", encoding="utf-8") as fh:
+                reader = csv.DictReader(fh)
+                missing = {"username", "password"} - set(reader.fieldnames or [])
+                if missing:
+                    raise CommandError(f"CSV is missing column(s): {', '.join(sorted(missing))}")
+                rows = [{field: (row.get(field) or "").strip() for field in FIELDS} for row in reader]
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        roles = set(User.Roles.values)
+        for line, row in enumerate(rows, start=2):
+            if not row["username"]:
+                raise CommandError(f"Line {line}: username is required.")
+            if row["role"] and row["role"] not in roles:
+                raise CommandError(f"Line {line}: unknown role '{row['role']}'.")
+
+        usernames = [row["username"] for row in rows]
+        if len(set(usernames)) != len(usernames):
+            raise CommandError("CSV contains duplicate usernames.")
+        return rows
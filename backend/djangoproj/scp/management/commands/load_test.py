@@ -0,0 +1,278 @@
+import http.client
+import json
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from scp.authentication import rotate_token
+from scp.models import Conversation, ConsumerContact, Order, Product, SupplierConsumerLink, SupplierStaffMembership
+
+DEFAULT_MIX = "browse=60,order=15,accept=10,chat=15"
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Client:
+    """One keep-alive HTTP connection per worker thread."""
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self.netloc, self.prefix, self.timeout = parts.netloc, parts.path.rstrip("/"), timeout
+        self.connection = None
+
+    def request(self, method, path, token, body=None, headers=None):
+        headers = {"Authorization": f"Token {token}", "Accept": "application/json", **(headers or {})}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        for attempt in (1, 2):
+            if self.connection is None:
+                self.connection = self.connection_class(self.netloc, timeout=self.timeout)
+            try:
+                self.connection.request(method, self.prefix + path, body=payload, headers=headers)
+                response = self.connection.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, OSError):
+                # the server closed an idle keep-alive connection; retry once on a new one
+                self.connection.close()
+                self.connection = None
+                if attempt == 2:
+                    raise
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay mixed traffic (browse, order, accept, chat) against a running API as users created by "
+        "seed_data, and report throughput and latency percentiles per endpoint. Reads users, products "
+        "and conversations from the database the server uses and issues API tokens for them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument("--prefix", default="seed", help="--prefix that was passed to seed_data")
+        parser.add_argument("--concurrency", type=int, default=8, help="Concurrent simulated users")
+        parser.add_argument("--duration", type=float, default=30, help="Seconds to run")
+        parser.add_argument("--iterations", type=int, default=None,
+                            help="Stop after this many scenarios instead of --duration")
+        parser.add_argument("--mix", default=DEFAULT_MIX, help="Scenario weights, e.g. browse=60,order=15,...")
+        parser.add_argument("--users", type=int, default=50, help="Seeded contacts and staff to act as")
+        parser.add_argument("--timeout", type=float, default=30)
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument("--json", dest="json_path", help="Also write the report as JSON to this path")
+
+    # -------------------------------
+    # setup
+    # -------------------------------
+    def parse_mix(self, value):
+        mix = {}
+        for part in value.split(","):
+            name, _, weight = part.partition("=")
+            name = name.strip()
+            if name not in ("browse", "order", "accept", "chat"):
+                raise CommandError(f"Unknown scenario {name!r} in --mix.")
+            try:
+                mix[name] = float(weight)
+            except ValueError:
+                raise CommandError(f"Weight of {name!r} must be a number.")
+        return mix
+
+    def load_actors(self, prefix, limit):
+        contacts = list(
+            ConsumerContact.objects.filter(user__username__startswith=f"{prefix}_contact")
+            .select_related("user").order_by("user__username")[:limit]
+        )
+        staff = list(
+            SupplierStaffMembership.objects.filter(user__username__startswith=f"{prefix}_", is_active=True)
+            .select_related("user").order_by("user__username")[:limit]
+        )
+        if not contacts or not staff:
+            raise CommandError(f"No seeded users named {prefix}_*; run seed_data first.")
+
+        links = defaultdict(list)
+        for consumer_id, supplier_id in SupplierConsumerLink.objects.filter(
+            consumer__in=[c.consumer_id for c in contacts], status=SupplierConsumerLink.Status.APPROVED
+        ).values_list("consumer_id", "supplier_id"):
+            links[consumer_id].append(supplier_id)
+        products = defaultdict(list)
+        for supplier_id, product_id in Product.objects.filter(
+            supplier__in={s for ids in links.values() for s in ids}, is_active=True
+        ).values_list("supplier_id", "id"):
+            products[supplier_id].append(str(product_id))
+        conversations = defaultdict(list)
+        for contact_id, conversation_id in Conversation.objects.filter(
+            consumer_contact__in=contacts
+        ).values_list("consumer_contact_id", "id"):
+            conversations[contact_id].append(conversation_id)
+
+        self.contacts = [
+            {
+                "name": contact.user.username,
+                "token": rotate_token(contact.user).key,
+                "consumer": str(contact.consumer_id),
+                "suppliers": [str(s) for s in links[contact.consumer_id] if products[s]],
+                "conversations": conversations[contact.pk],
+            }
+            for contact in contacts
+        ]
+        self.products = {str(supplier_id): ids for supplier_id, ids in products.items()}
+        self.staff = {}
+        for membership in staff:
+            self.staff.setdefault(str(membership.supplier_id), {
+                "name": membership.user.username, "token": rotate_token(membership.user).key,
+            })
+        # orders waiting for a supplier; the order scenario adds to it
+        self.pending = defaultdict(list)
+        for order_id, supplier_id in Order.objects.filter(
+            supplier__in=list(self.staff), status=Order.Status.PENDING
+        ).values_list("id", "supplier_id")[:10_000]:
+            self.pending[str(supplier_id)].append(str(order_id))
+        self.pending_lock = threading.Lock()
+
+    # -------------------------------
+    # scenarios: each returns [(endpoint, status, ms)]
+    # -------------------------------
+    def call(self, client, timings, endpoint, method, path, token, body=None, headers=None):
+        start = time.perf_counter()
+        try:
+            status, content = client.request(method, path, token, body, headers)
+        except (http.client.HTTPException, OSError):
+            status, content = 0, b""
+        timings.append((endpoint, status, (time.perf_counter() - start) * 1000))
+        return status, content
+
+    def browse(self, client, rng, timings):
+        contact = rng.choice(self.contacts)
+        self.call(client, timings, "GET /api/products/", "GET", "/api/products/", contact["token"])
+        supplier = rng.choice(contact["suppliers"]) if contact["suppliers"] else None
+        if supplier:
+            product = rng.choice(self.products[supplier])
+            self.call(client, timings, "GET /api/products/{id}/", "GET", f"/api/products/{product}/", contact["token"])
+
+    def order(self, client, rng, timings):
+        contact = rng.choice([c for c in self.contacts if c["suppliers"]] or self.contacts)
+        if not contact["suppliers"]:
+            return
+        supplier = rng.choice(contact["suppliers"])
+        products = rng.sample(self.products[supplier], min(len(self.products[supplier]), rng.randint(1, 5)))
+        body = {
+            "supplier": supplier,
+            "consumer": contact["consumer"],
+            "items": [{"product": product, "quantity": rng.randint(1, 10)} for product in products],
+        }
+        status, content = self.call(client, timings, "POST /api/orders/", "POST", "/api/orders/", contact["token"],
+                                    body, {"Idempotency-Key": str(uuid.uuid4())})
+        if status == 201 and supplier in self.staff:
+            with self.pending_lock:
+                self.pending[supplier].append(json.loads(content)["id"])
+
+    def accept(self, client, rng, timings):
+        with self.pending_lock:
+            suppliers = [supplier for supplier, orders in self.pending.items() if orders]
+            if not suppliers:
+                return
+            supplier = rng.choice(suppliers)
+            order_id = self.pending[supplier].pop()
+        staff = self.staff[supplier]
+        self.call(client, timings, "GET /api/orders/{id}/", "GET", f"/api/orders/{order_id}/", staff["token"])
+        self.call(client, timings, "POST /api/orders/{id}/accept/", "POST", f"/api/orders/{order_id}/accept/",
+                  staff["token"], {}, {"Idempotency-Key": str(uuid.uuid4())})
+
+    def chat(self, client, rng, timings):
+        contact = rng.choice([c for c in self.contacts if c["conversations"]] or self.contacts)
+        if not contact["conversations"]:
+            return
+        conversation = rng.choice(contact["conversations"])
+        self.call(client, timings, "POST /api/conversations/{id}/send_message/", "POST",
+                  f"/api/conversations/{conversation}/send_message/", contact["token"],
+                  {"text": "Any update on the delivery?"})
+        self.call(client, timings, "GET /api/conversations/{id}/", "GET",
+                  f"/api/conversations/{conversation}/", contact["token"])
+
+    # -------------------------------
+    # run
+    # -------------------------------
+    def worker(self, number, options, mix, deadline, budget):
+        rng = random.Random(None if options["seed"] is None else options["seed"] + number)
+        client = Client(options["base_url"], options["timeout"])
+        names, weights = list(mix), list(mix.values())
+        timings = []
+        while time.monotonic() < deadline:
+            with budget["lock"]:
+                if budget["left"] is not None:
+                    if budget["left"] <= 0:
+                        break
+                    budget["left"] -= 1
+            getattr(self, rng.choices(names, weights=weights)[0])(client, rng, timings)
+        return timings
+
+    def handle(self, *args, **options):
+        mix = self.parse_mix(options["mix"])
+        self.load_actors(options["prefix"], options["users"])
+        self.stdout.write(
+            f"{len(self.contacts)} contacts, {len(self.staff)} suppliers, {options['concurrency']} workers "
+            f"against {options['base_url']} ({options['mix']})"
+        )
+
+        duration = options["duration"] if options["iterations"] is None else float("inf")
+        budget = {"left": options["iterations"], "lock": threading.Lock()}
+        start = time.monotonic()
+        deadline = start + duration
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            futures = [pool.submit(self.worker, n, options, mix, deadline, budget)
+                       for n in range(options["concurrency"])]
+            timings = [timing for future in futures for timing in future.result()]
+        elapsed = time.monotonic() - start
+        self.report(timings, elapsed, options)
+
+    def summarize(self, samples):
+        latencies = sorted(ms for _, ms in samples)
+        return {
+            "requests": len(samples),
+            "errors": sum(1 for status, _ in samples if not 200 <= status < 300),
+            "throttled": sum(1 for status, _ in samples if status == 429),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p90_ms": round(percentile(latencies, 90), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+        }
+
+    def report(self, timings, elapsed, options):
+        by_endpoint = defaultdict(list)
+        for endpoint, status, ms in timings:
+            by_endpoint[endpoint].append((status, ms))
+        total = self.summarize([(status, ms) for _, status, ms in timings])
+        total["elapsed_s"] = round(elapsed, 2)
+        total["throughput_rps"] = round(len(timings) / elapsed, 1) if elapsed else 0.0
+        endpoints = {endpoint: self.summarize(samples) for endpoint, samples in sorted(by_endpoint.items())}
+
+        header = f"{'endpoint':<44} {'reqs':>7} {'err':>5} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}"
+        self.stdout.write(header)
+        for endpoint, row in [*endpoints.items(), ("total", total)]:
+            self.stdout.write(
+                f"{endpoint:<44} {row['requests']:>7} {row['errors']:>5} {row['p50_ms']:>8.1f} "
+                f"{row['p90_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>8.1f}"
+            )
+        self.stdout.write(f"{total['requests']} requests in {elapsed:.1f}s: {total['throughput_rps']} req/s")
+        if total["throttled"]:
+            self.stdout.write(self.style.WARNING(
+                f"{total['throttled']} responses were 429; raise DEFAULT_THROTTLE_RATES or set "
+                "THROTTLE_ENABLED = False to measure the server rather than the rate limits."
+            ))
+
+        if options["json_path"]:
+            with open(options["json_path"], "w") as fh:
+                json.dump({"base_url": options["base_url"], "concurrency": options["concurrency"],
+                           "mix": options["mix"], "total": total, "endpoints": endpoints}, fh, indent=2)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from scp.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete idempotency keys past IDEMPOTENCY_KEY_TTL."
+
+    def handle(self, *args, **options):
+        count = IdempotencyKey.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Purged {count} idempotency key(s)."))
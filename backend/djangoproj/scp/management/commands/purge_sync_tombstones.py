@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from scp.sync import purge_tombstones
+
+
+class Command(BaseCommand):
+    help = "Delete delta-sync tombstones older than SYNC_TOMBSTONE_TTL."
+
+    def handle(self, *args, **options):
+        count = purge_tombstones()
+        self.stdout.write(self.style.SUCCESS(f"Purged {count} tombstone(s)."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from scp.uploads import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Delete chunked uploads older than CHUNKED_UPLOAD_TTL and their staging files."
+
+    def handle(self, *args, **options):
+        count = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Purged {count} upload(s)."))
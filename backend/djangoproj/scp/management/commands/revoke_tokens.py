@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from scp.authentication import purge_expired_tokens, revoke_tokens
+from scp.models import User
+
+
+class Command(BaseCommand):
+    help = "Revoke API tokens in bulk (by username, by role, all of them) or purge expired ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", action="append", default=[], dest="usernames", help="Username (repeatable)")
+        parser.add_argument("--role", choices=User.Roles.values, help="Revoke tokens of every user with this role")
+        parser.add_argument("--all", action="store_true", help="Revoke every token")
+        parser.add_argument("--expired", action="store_true", help="Only delete tokens past TOKEN_TTL")
+
+    def handle(self, *args, **options):
+        if options["expired"]:
+            count = purge_expired_tokens()
+        elif options["all"]:
+            count = revoke_tokens()
+        elif options["usernames"] or options["role"]:
+            users = User.objects.all()
+            if options["usernames"]:
+                users = users.filter(username__in=options["usernames"])
+            if options["role"]:
+                users = users.filter(role=options["role"])
+            count = revoke_tokens(users)
+        else:
+            raise CommandError("Pass --user, --role, --all or --expired.")
+
+        self.stdout.write(self.style.SUCCESS(f"Revoked {count} token(s)."))
@@ -0,0 +1,55 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from scp.models import User
+from scp.perf import DEFAULT_PASSWORD, build_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed suppliers, consumers, links, catalogs, orders, complaints and chat histories with bulk_create. "
+        "Sizes are averages of long-tailed distributions; --seed makes a run reproducible. "
+        "Users are named <prefix>_owner0, <prefix>_contact0, ... with the same password."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--suppliers", type=int, default=50)
+        parser.add_argument("--consumers", type=int, default=500)
+        parser.add_argument("--links", type=int, default=3, help="Average suppliers per consumer")
+        parser.add_argument("--categories", type=int, default=8, help="Categories per supplier")
+        parser.add_argument("--products", type=int, default=200, help="Average products per supplier")
+        parser.add_argument("--orders", type=int, default=20, help="Average orders per supplier/consumer link")
+        parser.add_argument("--items", type=int, default=4, help="Average items per order")
+        parser.add_argument("--messages", type=int, default=12, help="Average messages per conversation")
+        parser.add_argument("--days", type=int, default=90, help="Spread orders over this many past days")
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument("--uniform", action="store_true", help="Exact sizes instead of random distributions")
+        parser.add_argument("--prefix", default="seed", help="Prefix of usernames and organisation names")
+        parser.add_argument("--password", default=DEFAULT_PASSWORD)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        prefix = options["prefix"]
+        if User.objects.filter(username__startswith=f"{prefix}_").exists():
+            raise CommandError(f"Users named {prefix}_* already exist; pass another --prefix.")
+
+        sizes = {name: options[name] for name in
+                 ("suppliers", "consumers", "links", "categories", "products", "orders", "items", "messages")}
+        rng = None if options["uniform"] else random.Random(options["seed"])
+
+        start = time.perf_counter()
+        with transaction.atomic():
+            data = build_dataset(prefix=prefix, password=options["password"], batch_size=options["batch_size"],
+                                 rng=rng, days=options["days"], **sizes)
+        elapsed = time.perf_counter() - start
+
+        for name, count in data.counts().items():
+            if count:
+                self.stdout.write(f"{name:<20} {count:>9}")
+        total = sum(data.counts().values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {total} rows in {elapsed:.1f}s. Log in as {prefix}_owner0 / {prefix}_contact0 / {prefix}_admin."
+        ))
@@ -0,0 +1,325 @@
+# scp/metrics.py
+"""
+Per-request instrumentation: SQL count and time, serializer time and total
+time, tagged with the viewset and action that served the request.
+
+RequestMetricsMiddleware (scp.middleware) is opt-in: it removes itself unless
+REQUEST_METRICS_ENABLED, REQUEST_PROFILE_SECRET or SLOW_QUERY_THRESHOLD_MS
+(scp/slow_queries.py) is set.
+
+  - SQL is measured with a database execute wrapper on every connection.
+  - Serializer time is the time spent in `.data` of the outermost serializer,
+    including the queries it triggers (lazy relations). install() wraps
+    Serializer.data, ListSerializer.data and ValuesSerializer.data for that;
+    the wrappers do nothing outside an instrumented request.
+  - Observations go to histograms in this process, exposed to platform admins
+    in Prometheus text format at GET /api/metrics/. Each worker process keeps
+    its own numbers, so scrape every worker or run one per container.
+
+A request carrying `X-Profile: <REQUEST_PROFILE_SECRET>` is also run under
+cProfile (for REQUEST_PROFILE_SAMPLE_RATE of such requests, one at a time)
+and the stats are written to REQUEST_PROFILE_DIR; the response names the file
+in X-Profile-Dump. Open dumps with `python -m pstats` or snakeviz.
+"""
+import contextvars
+import cProfile
+import hmac
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import connections
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+PROFILE_HEADER = "X-Profile"
+PROFILE_DUMP_HEADER = "X-Profile-Dump"
+
+DEFAULT_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# per-request measurements, set up by RequestMetricsMiddleware
+_state = contextvars.ContextVar("scp_request_metrics", default=None)
+
+
+def metrics_enabled():
+    return getattr(settings, "REQUEST_METRICS_ENABLED", False)
+
+
+def get_duration_buckets():
+    return tuple(getattr(settings, "REQUEST_METRICS_BUCKETS", DEFAULT_DURATION_BUCKETS))
+
+
+# -------------------------------
+# per-request state
+# -------------------------------
+def begin_request(method=""):
+    """Start measuring a request made with `method`; returns a token for end_request()."""
+    return _state.set({
+        "start": time.perf_counter(),
+        "method": method.lower(),
+        "sql_count": 0,
+        "sql_time": 0.0,
+        "serializer_time": 0.0,
+        "in_serializer": False,
+        "view": "unresolved",
+        "actions": {},
+    })
+
+
+def end_request(token):
+    state = _state.get()
+    _state.reset(token)
+    state["total_time"] = time.perf_counter() - state["start"]
+    return state
+
+
+def tag_view(view_func):
+    """Record the viewset (or plain view) and action that will serve the request."""
+    state = _state.get()
+    if state is None:
+        return
+    view_class = getattr(view_func, "cls", None) or getattr(view_func, "view_class", None)
+    state["view"] = view_class.__name__ if view_class else getattr(view_func, "__name__", "view")
+    state["actions"] = getattr(view_func, "actions", None) or {}
+
+
+def current_view():
+    """'View.action' of the request being served, or None outside an instrumented request."""
+    state = _state.get()
+    if state is None:
+        return None
+    action = state["actions"].get(state["method"], "")
+    return f"{state['view']}.{action}" if action else state["view"]
+
+
+class QueryTimer:
+    """Database execute wrapper adding each query to the current request."""
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            state = _state.get()
+            if state is not None:
+                state["sql_count"] += 1
+                state["sql_time"] += time.perf_counter() - start
+
+
+def instrument_connections(stack, wrapper):
+    """Enter `wrapper` on every configured database connection of this thread."""
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(wrapper))
+
+
+# -------------------------------
+# serializer timing
+# -------------------------------
+def _timed_data(prop):
+    def data(self):
+        state = _state.get()
+        if state is None or state["in_serializer"]:
+            return prop.fget(self)
+        state["in_serializer"] = True
+        start = time.perf_counter()
+        try:
+            return prop.fget(self)
+        finally:
+            state["serializer_time"] += time.perf_counter() - start
+            state["in_serializer"] = False
+
+    data.__wrapped__ = prop
+    return property(data)
+
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+def install():
+    """Wrap the serializers' `.data` properties once per process."""
+    global _installed
+    from .fast_serializers import ValuesSerializer
+
+    with _install_lock:
+        if _installed:
+            return
+        for cls in (serializers.Serializer, serializers.ListSerializer, ValuesSerializer):
+            cls.data = _timed_data(cls.__dict__["data"])
+        _installed = True
+
+
+# -------------------------------
+# histograms
+# -------------------------------
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name, self.help_text = name, help_text
+        self.label_names, self.buckets = tuple(label_names), tuple(buckets)
+        self.series = {}  # label values -> [count per bucket..., sum, count]
+
+    def observe(self, label_values, value):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, series in sorted(self.series.items()):
+            for bound, count in zip((*self.buckets, float("inf")), (*series[:-2], series[-1])):
+                labels = _format_labels(self.label_names, label_values, [("le", _format_number(bound))])
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_number(series[-2])}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+class Counter:
+
+    def __init__(self, name, help_text, label_names):
+        self.name, self.help_text, self.label_names = name, help_text, tuple(label_names)
+        self.series = {}
+
+    def inc(self, label_values, amount=1):
+        self.series[label_values] = self.series.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self.series.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {value}")
+        return lines
+
+
+class Registry:
+    """The request metrics of this process."""
+    labels = ("view", "action", "method")
+
+    def __init__(self, duration_buckets=DEFAULT_DURATION_BUCKETS):
+        self.lock = threading.Lock()
+        self.requests = Counter("scp_requests_total", "Requests served.", (*self.labels, "status"))
+        self.total = Histogram("scp_request_duration_seconds", "Total request time.", self.labels, duration_buckets)
+        self.sql = Histogram("scp_request_sql_duration_seconds", "Time in SQL queries per request.",
+                             self.labels, duration_buckets)
+        self.serializer = Histogram("scp_request_serializer_duration_seconds",
+                                    "Time in serializers per request, including the queries they trigger.",
+                                    self.labels, duration_buckets)
+        self.queries = Histogram("scp_request_sql_queries", "SQL queries per request.", self.labels,
+                                 QUERY_COUNT_BUCKETS)
+
+    def record(self, record):
+        labels = (record["view"], record["action"], record["method"])
+        with self.lock:
+            self.requests.inc((*labels, str(record["status"])))
+            self.total.observe(labels, record["total_time"])
+            self.sql.observe(labels, record["sql_time"])
+            self.serializer.observe(labels, record["serializer_time"])
+            self.queries.observe(labels, record["sql_count"])
+
+    def render(self):
+        with self.lock:
+            lines = [line for metric in (self.requests, self.total, self.sql, self.serializer, self.queries)
+                     for line in metric.render()]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry(get_duration_buckets())
+
+
+def finish_request(state, request, response):
+    """Turn the request's measurements into a record and add it to the registry."""
+    action = state["actions"].get(request.method.lower(), "")
+    record = {
+        "view": state["view"],
+        "action": action,
+        "method": request.method,
+        "status": response.status_code,
+        "total_time": state["total_time"],
+        "sql_count": state["sql_count"],
+        "sql_time": state["sql_time"],
+        "serializer_time": state["serializer_time"],
+    }
+    if metrics_enabled():
+        registry.record(record)
+    logger.debug(
+        "%(method)s %(view)s.%(action)s %(status)s total=%(total_time).4fs sql=%(sql_count)d/%(sql_time).4fs "
+        "serializer=%(serializer_time).4fs", record,
+    )
+    return record
+
+
+# -------------------------------
+# sampled cProfile
+# -------------------------------
+_profile_lock = threading.Lock()
+
+
+def get_profile_secret():
+    return getattr(settings, "REQUEST_PROFILE_SECRET", None)
+
+
+def wants_profile(request):
+    secret = get_profile_secret()
+    value = request.headers.get(PROFILE_HEADER)
+    # as bytes: compare_digest() refuses str with non-ASCII characters, which clients control
+    if not secret or not value or not hmac.compare_digest(value.encode(), secret.encode()):
+        return False
+    return random.random() < getattr(settings, "REQUEST_PROFILE_SAMPLE_RATE", 1.0)
+
+
+def profile_request(get_response, request):
+    """
+    Run get_response(request) under cProfile and dump the stats. Returns the
+    response and the dump's file name, or None if another request is being
+    profiled (cProfile is not reentrant across threads).
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return get_response(request), None
+    try:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+        directory = getattr(settings, "REQUEST_PROFILE_DIR", "profiles")
+        os.makedirs(directory, exist_ok=True)
+        state = _state.get() or {}
+        name = "{}-{}-{}-{}.prof".format(
+            time.strftime("%Y%m%dT%H%M%S"), state.get("view", "view"),
+            state.get("actions", {}).get(request.method.lower(), request.method.lower()), uuid.uuid4().hex[:8],
+        )
+        profiler.dump_stats(os.path.join(directory, name))
+        return response, name
+    finally:
+        _profile_lock.release()
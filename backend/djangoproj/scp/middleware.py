@@ -1,13 +1,237 @@
 # myapp/middleware.py
-class PrintRequestMiddleware:
+import contextlib
+import gzip
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+
+from . import metrics, replicas, slow_queries
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+class SyncAndAsyncMiddleware:
+    """
+    Base for middleware that runs natively under both WSGI and ASGI, so async
+    views (scp/async_views.py) are awaited on the event loop instead of being
+    pushed onto a thread. Subclasses implement process_request() and / or
+    process_response(); neither may block on I/O.
+    """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        self.process_request(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        self.process_request(request)
+        return self.process_response(request, await self.get_response(request))
+
+    def process_request(self, request):
+        pass
+
+    def process_response(self, request, response):
+        return response
+
+
+class PrintRequestMiddleware(SyncAndAsyncMiddleware):
+    # request.body reads the whole body into memory, and a stream read here
+    # cannot be read again by the view; only small text bodies are printed
+    printable_types = ("application/json", "application/x-www-form-urlencoded", "text/")
+    max_printed_body = 64 * 1024
+
+    def process_request(self, request):
         print("=== Incoming request ===")
         print("Method:", request.method)
         print("Path:", request.path)
         print("Headers:", request.headers)
-        print("Body:", request.body.decode() if request.body else "<empty>")
-        response = self.get_response(request)
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+        if not length:
+            print("Body: <empty>")
+        elif length > self.max_printed_body or not request.content_type.startswith(self.printable_types):
+            print(f"Body: <{length} bytes of {request.content_type or 'unknown type'}>")
+        else:
+            print("Body:", request.body.decode(errors="replace"))
+
+
+class RateLimitHeadersMiddleware(SyncAndAsyncMiddleware):
+    """
+    Adds RateLimit-Limit / -Remaining / -Reset (seconds until the bucket is full)
+    and RateLimit-Policy headers for requests that went through TokenBucketThrottle.
+    """
+
+    def process_response(self, request, response):
+        info = getattr(request, "rate_limit", None)
+        if info:
+            response["RateLimit-Limit"] = str(info["limit"])
+            response["RateLimit-Remaining"] = str(info["remaining"])
+            response["RateLimit-Reset"] = str(info["reset"])
+            response["RateLimit-Policy"] = f'{info["limit"]};policy="token-bucket";scope="{info["scope"]}"'
+        return response
+
+
+class CompressionMiddleware(SyncAndAsyncMiddleware):
+    """
+    Negotiated response compression: brotli (when the `brotli` package is
+    installed) or gzip, whichever Accept-Encoding prefers, for text and JSON
+    bodies of at least COMPRESSION_MIN_SIZE bytes. Smaller bodies are sent as-is;
+    compressing them costs more CPU than it saves on the wire.
+
+    Like django.middleware.gzip.GZipMiddleware it should sit near the top of
+    MIDDLEWARE so it sees the final body, and it weakens strong ETags.
+    """
+    compressible_types = re.compile(r"^(text/.+|application/(.+\+)?(json|javascript|xml))$")
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.min_size = getattr(settings, "COMPRESSION_MIN_SIZE", 1024)
+        self.gzip_level = getattr(settings, "COMPRESSION_GZIP_LEVEL", 6)
+        self.brotli_quality = getattr(settings, "COMPRESSION_BROTLI_QUALITY", 5)
+        self.encodings = (["br"] if brotli is not None else []) + ["gzip"]
+
+    def choose_encoding(self, accept_encoding):
+        """Best supported coding from an Accept-Encoding header, or None."""
+        weights = {}
+        for part in accept_encoding.split(","):
+            coding, _, params = part.strip().partition(";")
+            q = 1.0
+            if params.strip().startswith("q="):
+                try:
+                    q = float(params.strip()[2:])
+                except ValueError:
+                    q = 0.0
+            weights[coding.strip().lower()] = q
+
+        best = None
+        for coding in self.encodings:  # server preference breaks ties
+            q = weights.get(coding, weights.get("*", 0.0))
+            if q > 0 and (best is None or q > best[1]):
+                best = (coding, q)
+        return best and best[0]
+
+    def compress(self, content, coding):
+        if coding == "br":
+            return brotli.compress(content, quality=self.brotli_quality)
+        return gzip.compress(content, compresslevel=self.gzip_level, mtime=0)
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header("Content-Encoding") or len(response.content) < self.min_size:
+            return response
+        content_type = response.get("Content-Type", "").split(";")[0].strip().lower()
+        if not self.compressible_types.match(content_type):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        coding = self.choose_encoding(request.headers.get("Accept-Encoding", ""))
+        if coding is None:
+            return response
+
+        compressed = self.compress(response.content, coding)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = coding
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
         return response
+
+
+class ReplicaStickinessMiddleware(SyncAndAsyncMiddleware):
+    """
+    Tracks database routing for the request (see scp/replicas.py) and pins
+    users who wrote something to the primary for REPLICA_STICKY_SECONDS.
+    DRF copies the authenticated user onto the Django request, so token users
+    are visible here after the view has run.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = replicas.begin_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            state = replicas.end_request(token)
+        user_id = self.user_to_pin(request, state)
+        if user_id is not None:
+            replicas.pin_to_primary(user_id)
+        return response
+
+    async def __acall__(self, request):
+        token = replicas.begin_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            state = replicas.end_request(token)
+        user_id = self.user_to_pin(request, state)
+        if user_id is not None:
+            await sync_to_async(replicas.pin_to_primary)(user_id)
+        return response
+
+    def user_to_pin(self, request, state):
+        user = getattr(request, "user", None)
+        if state["wrote"] and user is not None and user.is_authenticated:
+            return user.pk
+        return None
+
+
+class RequestMetricsMiddleware:
+    """
+    Opt-in per-request instrumentation (see scp/metrics.py): SQL count and time,
+    serializer time and total time per viewset action, plus cProfile dumps for
+    requests sending the X-Profile header, and the slow-query log (see
+    scp/slow_queries.py). Put it first in MIDDLEWARE so the total covers the
+    whole stack; it is removed at startup unless REQUEST_METRICS_ENABLED,
+    REQUEST_PROFILE_SECRET or SLOW_QUERY_THRESHOLD_MS is set.
+
+    It is sync-only: execute wrappers are per connection, and connections are
+    per thread. Under ASGI, enabling it runs every request on a thread again.
+    """
+    def __init__(self, get_response):
+        threshold = slow_queries.get_threshold()
+        if not (metrics.metrics_enabled() or metrics.get_profile_secret() or threshold is not None):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.query_timer = metrics.QueryTimer()
+        self.slow_query_log = slow_queries.SlowQueryLog(threshold) if threshold is not None else None
+        metrics.install()
+
+    def __call__(self, request):
+        token = metrics.begin_request(request.method)
+        dump = None
+        try:
+            with contextlib.ExitStack() as stack:
+                metrics.instrument_connections(stack, self.query_timer)
+                if self.slow_query_log:
+                    metrics.instrument_connections(stack, self.slow_query_log)
+                if metrics.wants_profile(request):
+                    response, dump = metrics.profile_request(self.get_response, request)
+                else:
+                    response = self.get_response(request)
+        finally:
+            state = metrics.end_request(token)
+        metrics.finish_request(state, request, response)
+        if dump:
+            response[metrics.PROFILE_DUMP_HEADER] = dump
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics.tag_view(view_func)
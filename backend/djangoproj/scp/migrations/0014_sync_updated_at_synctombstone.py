@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scp', '0013_claimsuser'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=32)),
+                ('object_id', models.CharField(max_length=64)),
+                ('supplier_id', models.UUIDField(blank=True, null=True)),
+                ('consumer_id', models.UUIDField(blank=True, null=True)),
+                ('deleted_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='catalogcategory',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterField(
+            model_name='conversation',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='catalogcategory',
+            index=models.Index(fields=['supplier', 'updated_at'], name='scp_catalog_supplie_ef1365_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['supplier', 'updated_at'], name='scp_order_supplie_3c389e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['consumer', 'updated_at'], name='scp_order_consume_e32193_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['supplier', 'updated_at'], name='scp_product_supplie_4fed0f_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scp', '0014_sync_updated_at_synctombstone'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(fields=['assigned_to', 'status'], name='scp_complaint_assignee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'created_at'], name='scp_message_conv_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['supplier', '-created_at'], name='scp_order_supplier_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['consumer', '-created_at'], name='scp_order_consumer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supplierconsumerlink',
+            index=models.Index(fields=['consumer', 'status'], name='scp_link_consumer_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supplierconsumerlink',
+            index=models.Index(condition=models.Q(('status', 'approved')), fields=['consumer', 'supplier'], name='scp_link_approved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supplierstaffmembership',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['user', 'supplier'], name='scp_staff_active_user_idx'),
+        ),
+    ]
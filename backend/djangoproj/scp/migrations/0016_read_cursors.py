@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:32
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def start_cursors_at_latest(apps, schema_editor):
+    # existing history counts as read; otherwise every old message turns unread at once
+    Conversation = apps.get_model("scp", "Conversation")
+    Message = apps.get_model("scp", "Message")
+    ConversationReadCursor = apps.get_model("scp", "ConversationReadCursor")
+    latest = dict(Message.objects.values("conversation").annotate(latest=Max("id")).values_list("conversation", "latest"))
+    participants = set(Conversation.objects.values_list("pk", "consumer_contact__user"))
+    participants.update(
+        Conversation.supplier_staff.through.objects.values_list("conversation", "supplierstaffmembership__user")
+    )
+    ConversationReadCursor.objects.bulk_create(
+        [
+            ConversationReadCursor(conversation_id=conversation_id, user_id=user_id, last_read_message_id=latest[conversation_id])
+            for conversation_id, user_id in participants if conversation_id in latest
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scp', '0015_query_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationReadCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_message_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'id', 'sender'], name='scp_message_conv_id_idx'),
+        ),
+        migrations.AddField(
+            model_name='conversationreadcursor',
+            name='conversation',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to='scp.conversation'),
+        ),
+        migrations.AddField(
+            model_name='conversationreadcursor',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='conversationreadcursor',
+            constraint=models.UniqueConstraint(fields=('conversation', 'user'), name='scp_read_cursor_unique'),
+        ),
+        migrations.RunPython(start_cursors_at_latest, migrations.RunPython.noop),
+    ]
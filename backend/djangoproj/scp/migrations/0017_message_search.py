@@ -0,0 +1,73 @@
+from django.db import migrations
+
+# keep in step with SEARCH_CONFIG in scp/search.py
+POSTGRESQL = [
+    (
+        "CREATE EXTENSION IF NOT EXISTS btree_gin",
+        None,
+    ),
+    (
+        # filled in for existing rows by the ALTER (a table rewrite), then kept current on every write
+        "ALTER TABLE scp_message ADD COLUMN search_vector tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('english'::regconfig, coalesce(text, ''))) STORED",
+        "ALTER TABLE scp_message DROP COLUMN search_vector",
+    ),
+    (
+        "CREATE INDEX scp_message_search_idx ON scp_message USING gin (conversation_id, search_vector)",
+        "DROP INDEX scp_message_search_idx",
+    ),
+]
+
+SQLITE = [
+    (
+        "CREATE VIRTUAL TABLE scp_message_fts USING fts5("
+        "text, content='scp_message', content_rowid='id', tokenize='porter unicode61')",
+        "DROP TABLE scp_message_fts",
+    ),
+    (
+        "INSERT INTO scp_message_fts(scp_message_fts) VALUES ('rebuild')",
+        None,
+    ),
+    (
+        "CREATE TRIGGER scp_message_fts_insert AFTER INSERT ON scp_message BEGIN "
+        "INSERT INTO scp_message_fts(rowid, text) VALUES (new.id, new.text); END",
+        "DROP TRIGGER scp_message_fts_insert",
+    ),
+    (
+        "CREATE TRIGGER scp_message_fts_delete AFTER DELETE ON scp_message BEGIN "
+        "INSERT INTO scp_message_fts(scp_message_fts, rowid, text) VALUES ('delete', old.id, old.text); END",
+        "DROP TRIGGER scp_message_fts_delete",
+    ),
+    (
+        "CREATE TRIGGER scp_message_fts_update AFTER UPDATE OF text ON scp_message BEGIN "
+        "INSERT INTO scp_message_fts(scp_message_fts, rowid, text) VALUES ('delete', old.id, old.text); "
+        "INSERT INTO scp_message_fts(rowid, text) VALUES (new.id, new.text); END",
+        "DROP TRIGGER scp_message_fts_update",
+    ),
+]
+
+
+def statements(schema_editor):
+    return {"postgresql": POSTGRESQL, "sqlite": SQLITE}.get(schema_editor.connection.vendor, [])
+
+
+def create_search_index(apps, schema_editor):
+    for forward, _ in statements(schema_editor):
+        schema_editor.execute(forward)
+
+
+def drop_search_index(apps, schema_editor):
+    for _, backward in reversed(statements(schema_editor)):
+        if backward:
+            schema_editor.execute(backward)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("scp", "0016_read_cursors"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:44
+
+import django.utils.timezone
+import scp.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scp', '0018_upload_sessions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('ref_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='attachment',
+            name='file',
+            field=models.FileField(storage=scp.storage.blob_storage, upload_to='chat_attachments/%Y/%m/%d/'),
+        ),
+        migrations.AlterField(
+            model_name='productattachment',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=scp.storage.blob_storage, upload_to='product_attachments/%Y/%m/%d/'),
+        ),
+        migrations.AlterField(
+            model_name='supplierkybdocument',
+            name='document',
+            field=models.FileField(storage=scp.storage.blob_storage, upload_to='kyb/%Y/%m/%d/'),
+        ),
+    ]
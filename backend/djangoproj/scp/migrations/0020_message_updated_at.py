@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:01
+
+from django.db import migrations, models
+from django.db.models import F
+
+# the search triggers of 0017; a copy, so later changes to scp/search.py leave this migration alone
+SQLITE_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS scp_message_fts_insert AFTER INSERT ON scp_message BEGIN "
+    "INSERT INTO scp_message_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER IF NOT EXISTS scp_message_fts_delete AFTER DELETE ON scp_message BEGIN "
+    "INSERT INTO scp_message_fts(scp_message_fts, rowid, text) VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER IF NOT EXISTS scp_message_fts_update AFTER UPDATE OF text ON scp_message BEGIN "
+    "INSERT INTO scp_message_fts(scp_message_fts, rowid, text) VALUES ('delete', old.id, old.text); "
+    "INSERT INTO scp_message_fts(rowid, text) VALUES (new.id, new.text); END",
+]
+
+
+def restore_sqlite_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        for create in SQLITE_TRIGGERS:
+            schema_editor.execute(create)
+
+
+def backfill_updated_at(apps, schema_editor):
+    # otherwise the first delta sync after the upgrade re-sends every message
+    Message = apps.get_model("scp", "Message")
+    Message.objects.update(updated_at=F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scp', '0019_blobs'),
+    ]
+
+    # adding or removing the column rebuilds scp_message on SQLite, dropping the search triggers
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_sqlite_triggers),
+        migrations.AddField(
+            model_name='message',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'updated_at'], name='scp_message_conv_updated_idx'),
+        ),
+        migrations.RunPython(restore_sqlite_triggers, migrations.RunPython.noop),
+    ]
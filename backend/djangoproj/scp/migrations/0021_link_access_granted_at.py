@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scp', '0020_message_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supplierconsumerlink',
+            name='access_granted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,9 +1,14 @@
-from django.db import models
+from django.db import connections, models, router
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 import uuid
 
+from .storage import blob_storage
+
 
 # -----------------------------
 # Custom User
@@ -36,6 +41,19 @@ class User(AbstractUser):
         return self.display_name or self.get_full_name() or self.username
 
 
+class ClaimsUser(User):
+    """
+    User rebuilt from signed access-token claims without a DB read
+    (see scp/authentication.py). Only identity, role and staff flags are set,
+    so it is read-only; load a real User to change or fully serialize it.
+    """
+    class Meta:
+        proxy = True
+
+    def save(self, *args, **kwargs):
+        raise TypeError("ClaimsUser is read-only; load the User from the database to modify it.")
+
+
 # -----------------------------
 # Organizations: Supplier & Consumer
 # -----------------------------
@@ -81,7 +99,7 @@ class Supplier(models.Model):
 
 class SupplierKYBDocument(models.Model):
     supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name="kyb_documents")
-    document = models.FileField(upload_to="kyb/%Y/%m/%d/")
+    document = models.FileField(upload_to="kyb/%Y/%m/%d/", storage=blob_storage)
     uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
     uploaded_at = models.DateTimeField(default=timezone.now)
     note = models.TextField(blank=True, null=True)
@@ -145,6 +163,10 @@ class SupplierStaffMembership(models.Model):
 
     class Meta:
         unique_together = ("supplier", "user")
+        indexes = [
+            # "which suppliers is this user active staff of" runs on every authenticated request
+            models.Index(fields=["user", "supplier"], condition=models.Q(is_active=True), name="scp_staff_active_user_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user} as {self.role} @ {self.supplier.name}"
@@ -171,12 +193,19 @@ class SupplierConsumerLink(models.Model):
     # approval metadata
     approved_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="link_approvals")
     approved_at = models.DateTimeField(blank=True, null=True)
+    # set by scp/sync.py whenever the link becomes approved; the consumer's next delta sync has the whole catalog
+    access_granted_at = models.DateTimeField(blank=True, null=True)
 
     blocked_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="link_blocks")
     blocked_at = models.DateTimeField(blank=True, null=True)
 
     class Meta:
         unique_together = ("supplier", "consumer")
+        indexes = [
+            models.Index(fields=["consumer", "status"], name="scp_link_consumer_status_idx"),
+            # permission checks only ever ask for approved links
+            models.Index(fields=["consumer", "supplier"], condition=models.Q(status="approved"), name="scp_link_approved_idx"),
+        ]
 
     def approve(self, approver: models.Model):
         self.status = self.Status.APPROVED
@@ -210,9 +239,11 @@ class CatalogCategory(models.Model):
     name = models.CharField(max_length=255)
     slug = models.SlugField(max_length=255)
     parent = models.ForeignKey("self", on_delete=models.CASCADE, null=True, blank=True, related_name="children")
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ("supplier", "slug")
+        indexes = [models.Index(fields=["supplier", "updated_at"])]
 
     def __str__(self):
         return f"{self.supplier.name} / {self.name}"
@@ -253,6 +284,7 @@ class Product(models.Model):
 
     class Meta:
         unique_together = ("supplier", "name")
+        indexes = [models.Index(fields=["supplier", "updated_at"])]
 
     @property
     def effective_price(self):
@@ -270,7 +302,7 @@ class ProductAttachment(models.Model):
         on_delete=models.CASCADE,
         related_name="product_attachments",  # must be unique to avoid clashes
     )
-    file = models.FileField(upload_to="product_attachments/%Y/%m/%d/", blank=True, null=True)
+    file = models.FileField(upload_to="product_attachments/%Y/%m/%d/", storage=blob_storage, blank=True, null=True)
     uploaded_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
@@ -313,13 +345,41 @@ class Order(models.Model):
     tracking_code = models.CharField(max_length=255, blank=True, null=True)
     estimated_delivery = models.DateTimeField(blank=True, null=True)
 
+    # bumped on every status transition; see scp/order_states.py
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["supplier", "updated_at"]),
+            models.Index(fields=["consumer", "updated_at"]),
+            # order lists filter by party and use the default -created_at ordering
+            models.Index(fields=["supplier", "-created_at"], name="scp_order_supplier_created_idx"),
+            models.Index(fields=["consumer", "-created_at"], name="scp_order_consumer_created_idx"),
+        ]
 
     def __str__(self):
         return f"Order {self.id} — {self.consumer.name} -> {self.supplier.name} [{self.status}]"
 
 
+class OrderStatusTransition(models.Model):
+    """Append-only history of order status changes (one row per transition)."""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="transitions")
+    from_status = models.CharField(max_length=16, choices=Order.Status.choices)
+    to_status = models.CharField(max_length=16, choices=Order.Status.choices)
+    version = models.PositiveIntegerField()
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["order", "version"]
+        unique_together = ("order", "version")
+
+    def __str__(self):
+        return f"Order {self.order_id}: {self.from_status} -> {self.to_status} (v{self.version})"
+
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -365,6 +425,9 @@ class Complaint(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     resolved_at = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["assigned_to", "status"], name="scp_complaint_assignee_idx")]
+
     def escalate(self, to_user: models.Model):
         """Assign the complaint to the next staff level"""
         self.assigned_to = to_user
@@ -433,7 +496,7 @@ class Conversation(models.Model):
     )
 
     created_at = models.DateTimeField(default=timezone.now)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         staff_names = ", ".join([s.user.username for s in self.supplier_staff.all()])
@@ -444,8 +507,23 @@ class Message(models.Model):
     sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
     text = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
     is_read = models.BooleanField(default=False)
 
+    # Full-text search (scp/search.py) adds what migration state does not know about:
+    # a generated search_vector column and GIN index on PostgreSQL, and on SQLite the
+    # scp_message_fts table kept current by triggers on this table. Schema changes here
+    # usually rebuild the table on SQLite, which drops the triggers: end such migrations
+    # by recreating them, as 0020 does.
+    class Meta:
+        indexes = [
+            models.Index(fields=["conversation", "created_at"], name="scp_message_conv_created_idx"),
+            # delta sync: changed messages of the conversations a user can see
+            models.Index(fields=["conversation", "updated_at"], name="scp_message_conv_updated_idx"),
+            # unread counts: an id range per conversation; sender as a trailing key makes it index-only
+            models.Index(fields=["conversation", "id", "sender"], name="scp_message_conv_id_idx"),
+        ]
+
     # attachments handled by Attachment model
     def __str__(self):
         return f"Message {self.id} by {self.sender}"
@@ -453,13 +531,80 @@ class Message(models.Model):
 
 class Attachment(models.Model):
     message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name="attachments")
-    file = models.FileField(upload_to="chat_attachments/%Y/%m/%d/")
+    file = models.FileField(upload_to="chat_attachments/%Y/%m/%d/", storage=blob_storage)
     filename = models.CharField(max_length=512, blank=True, null=True)
     uploaded_at = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
         return f"Attachment {self.filename or self.file.name}"
 
+
+class ConversationReadCursor(models.Model):
+    """
+    How far a participant has read a conversation: the id of the last message
+    they have seen. Later messages from anyone else are unread, so reading a
+    thread moves one row instead of updating every message (Message.is_read
+    cannot say who read a conversation with several staff members).
+    """
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name="read_cursors")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="read_cursors")
+    # a plain id rather than a FK, so deleting a message does not move the cursor
+    last_read_message_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["conversation", "user"], name="scp_read_cursor_unique"),
+        ]
+
+    @classmethod
+    def mark_read(cls, conversation_id, user_id, up_to=None):
+        """
+        Move the user's cursor to the newest message of the conversation (or the
+        newest at or before message id `up_to`) in one INSERT ... ON CONFLICT
+        statement. The cursor never moves backwards. Returns its new position.
+        """
+        connection = connections[router.db_for_write(cls)]
+        qn = connection.ops.quote_name
+        table, messages = qn(cls._meta.db_table), qn(Message._meta.db_table)
+        user_id = cls._meta.get_field("user").get_db_prep_value(user_id, connection)
+        now = cls._meta.get_field("updated_at").get_db_prep_value(timezone.now(), connection)
+        params = [conversation_id, user_id, now, conversation_id]
+        up_to_filter = ""
+        if up_to is not None:
+            up_to_filter, params = " AND id <= %s", params + [up_to]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (conversation_id, user_id, last_read_message_id, updated_at) "
+                f"SELECT %s, %s, COALESCE(MAX(id), 0), %s FROM {messages} WHERE conversation_id = %s{up_to_filter} "
+                f"ON CONFLICT (conversation_id, user_id) DO UPDATE SET "
+                f"last_read_message_id = CASE WHEN excluded.last_read_message_id > {table}.last_read_message_id "
+                f"THEN excluded.last_read_message_id ELSE {table}.last_read_message_id END, "
+                f"updated_at = excluded.updated_at "
+                f"RETURNING last_read_message_id",
+                params,
+            )
+            return cursor.fetchone()[0]
+
+    @classmethod
+    def unread_count(cls, user):
+        """Conversation annotation: messages from others after `user`'s cursor (all of them without one)."""
+        last_read = cls.objects.filter(conversation=OuterRef("conversation"), user=user.pk).values(
+            "last_read_message_id"
+        )[:1]
+        unread = (
+            Message.objects.filter(conversation=OuterRef("pk"), id__gt=Coalesce(Subquery(last_read), 0))
+            .exclude(sender=user.pk)
+            .order_by()
+            .values("conversation")
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        return Coalesce(Subquery(unread), 0)
+
+    def __str__(self):
+        return f"{self.user_id} read conversation {self.conversation_id} up to message {self.last_read_message_id}"
+
 # -----------------------------
 # Basic notification & audit models (minimal)
 # -----------------------------
@@ -486,6 +631,108 @@ class AuditLog(models.Model):
         return f"Audit: {self.action} @ {self.timestamp}"
 
 
+# -----------------------------
+# Idempotency keys (safe client retries)
+# -----------------------------
+class IdempotencyKey(models.Model):
+    """
+    First response for a client-supplied `Idempotency-Key`, scoped per user.
+    A row with `response_status` unset is an in-flight request and acts as the lock
+    for concurrent duplicates; see scp/idempotency.py.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="idempotency_keys")
+    key = models.CharField(max_length=255)
+    method = models.CharField(max_length=8)
+    path = models.CharField(max_length=512)
+    request_hash = models.CharField(max_length=64)
+
+    response_status = models.PositiveSmallIntegerField(blank=True, null=True)
+    response_body = models.JSONField(blank=True, null=True, encoder=DjangoJSONEncoder)
+
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ("user", "key")
+
+    @property
+    def is_complete(self):
+        return self.response_status is not None
+
+    @classmethod
+    def purge_expired(cls):
+        return cls.objects.filter(expires_at__lte=timezone.now()).delete()[0]
+
+    def __str__(self):
+        return f"Idempotency key {self.key} ({self.method} {self.path})"
+
+
+# -----------------------------
+# Delta sync tombstones
+# -----------------------------
+class SyncTombstone(models.Model):
+    """
+    Marker left behind when a synced row is deleted, so offline clients can drop
+    their copy; see scp/sync.py. Supplier / consumer ids are plain values (not FKs)
+    because they are often deleted in the same cascade.
+    """
+    model = models.CharField(max_length=32)
+    object_id = models.CharField(max_length=64)
+    supplier_id = models.UUIDField(blank=True, null=True)
+    consumer_id = models.UUIDField(blank=True, null=True)
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    @classmethod
+    def purge_older_than(cls, cutoff):
+        return cls.objects.filter(deleted_at__lt=cutoff).delete()[0]
+
+    def __str__(self):
+        return f"Deleted {self.model} {self.object_id} @ {self.deleted_at}"
+
+
+# -----------------------------
+# Chunked uploads
+# -----------------------------
+class UploadSession(models.Model):
+    """
+    A file being uploaded in chunks; see scp/uploads.py. The bytes received so
+    far are in a staging file named after the id, `offset` of them. Creating a
+    KYB document, attachment or product attachment with `upload=<id>` commits it.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="upload_sessions")
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True)  # of the whole file, if the client sent it
+    offset = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+
+    @property
+    def is_complete(self):
+        return self.offset == self.size
+
+    def __str__(self):
+        return f"Upload {self.filename} ({self.offset}/{self.size})"
+
+
+# -----------------------------
+# Deduplicated file storage
+# -----------------------------
+class Blob(models.Model):
+    """
+    A file in ContentAddressedStorage (scp/storage.py) and how many rows point
+    at it, as last counted by gc_blobs (scp/blobs.py), which reclaims it at zero.
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} references)"
+
+
 # -----------------------------
 # Data retention hint
 # -----------------------------
@@ -0,0 +1,99 @@
+# scp/order_states.py
+"""
+Declarative order state machine.
+
+Every transition is a single conditional UPDATE:
+
+    UPDATE scp_order SET status = <target>, version = version + 1, ...
+    WHERE id = <id> AND status = <current> AND version = <current version>
+
+so two staff members acting on the same order at once cannot both win; the loser
+gets TransitionConflict instead of silently overwriting the other's change. No row
+locks are held, and the history row is written in the same transaction.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Order, OrderStatusTransition, Product
+
+
+class InvalidTransition(Exception):
+    """The order's current status does not allow this transition."""
+
+
+class TransitionConflict(InvalidTransition):
+    """The order changed (status or version) between reading and updating it."""
+
+
+def _decrement_stock(order):
+    # F() keeps concurrent accepts of different orders for the same product correct
+    for product_id, quantity in order.items.values_list("product_id", "quantity"):
+        Product.objects.filter(pk=product_id).update(stock=F("stock") - quantity, updated_at=timezone.now())
+
+
+class Transition:
+    def __init__(self, sources, target, timestamp_field=None, on_apply=None):
+        self.sources = tuple(sources)
+        self.target = target
+        self.timestamp_field = timestamp_field
+        self.on_apply = on_apply
+
+
+S = Order.Status
+
+ORDER_TRANSITIONS = {
+    "accept": Transition([S.PENDING], S.IN_PROGRESS, timestamp_field="accepted_at", on_apply=_decrement_stock),
+    "reject": Transition([S.PENDING], S.REJECTED),
+    "complete": Transition([S.IN_PROGRESS], S.COMPLETED, timestamp_field="completed_at"),
+    "cancel": Transition([S.PENDING, S.ACCEPTED, S.IN_PROGRESS, S.REJECTED], S.CANCELLED),
+}
+
+
+def can_transition(order, name):
+    return order.status in ORDER_TRANSITIONS[name].sources
+
+
+def apply_transition(order, name, actor=None, expected_version=None):
+    """
+    Move `order` through transition `name` and record it in the history table.
+    `expected_version` lets clients pass the version they last saw; it defaults to
+    the version loaded on `order`. Updates `order` in place and returns it.
+    """
+    transition = ORDER_TRANSITIONS[name]
+    if not can_transition(order, name):
+        raise InvalidTransition(f"Cannot {name} an order in status '{order.status}'.")
+
+    expected_version = order.version if expected_version is None else int(expected_version)
+    from_status = order.status
+
+    now = timezone.now()
+    # update() skips auto_now, so updated_at (used by delta sync) is set explicitly
+    updates = {"status": transition.target, "version": F("version") + 1, "updated_at": now}
+    if transition.timestamp_field:
+        updates[transition.timestamp_field] = now
+
+    with transaction.atomic():
+        updated = Order.objects.filter(
+            pk=order.pk, status=from_status, version=expected_version
+        ).update(**updates)
+        if not updated:
+            raise TransitionConflict("Order was modified by another request; reload and retry.")
+
+        order.status = transition.target
+        order.version = expected_version + 1
+        order.updated_at = now
+        if transition.timestamp_field:
+            setattr(order, transition.timestamp_field, updates[transition.timestamp_field])
+
+        OrderStatusTransition.objects.create(
+            order=order,
+            from_status=from_status,
+            to_status=transition.target,
+            version=order.version,
+            actor=actor if actor is not None and actor.is_authenticated else None,
+        )
+        if transition.on_apply:
+            transition.on_apply(order)
+
+    return order
@@ -0,0 +1,275 @@
+# scp/perf.py
+"""
+Synthetic marketplace data for performance tests, load runs and local seeding.
+
+build_dataset() creates suppliers with staff, categories and products,
+consumers with contacts linked to suppliers, orders with items, complaint
+conversations with messages, notifications and audit rows. Everything is
+inserted with bulk_create, a few statements per model regardless of size, and
+no model save() or signals run.
+
+Sizes are per parent: `products` per supplier, `links` per consumer, `orders`
+per link, `items` per order, `messages` per conversation. Without `rng` every
+parent gets exactly that many (what the budget tests rely on). With a
+random.Random the sizes become means of long-tailed distributions: a few
+suppliers have most of the products, a few consumers place most orders,
+popular products appear in most order lines, prices are log-normal and orders
+are spread over the last `days` with older ones mostly completed.
+"""
+import itertools
+import math
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from .models import (
+    User, Supplier, SupplierKYBDocument, Consumer, ConsumerContact, SupplierStaffMembership,
+    SupplierConsumerLink, CatalogCategory, Product, ProductAttachment, Order, OrderItem,
+    Complaint, Incident, Conversation, Message, Attachment, Notification, AuditLog,
+)
+
+DEFAULT_SIZES = {
+    "suppliers": 2,
+    "consumers": 3,
+    "links": 2,
+    "categories": 3,
+    "products": 10,
+    "orders": 3,
+    "items": 3,
+    "messages": 5,
+}
+
+DEFAULT_PASSWORD = "perf-pass-123"
+
+UNITS = ["kg", "l", "piece", "box", "pack"]
+PRODUCT_WORDS = ["Tomatoes", "Potatoes", "Beef", "Chicken", "Milk", "Cream", "Flour", "Rice", "Apples",
+                 "Onions", "Butter", "Cheese", "Eggs", "Salmon", "Olive oil", "Sugar", "Coffee", "Tea"]
+CHAT_LINES = ["Hello, the delivery is late.", "We are checking with the driver.", "Two boxes were damaged.",
+              "Can you send photos?", "Photos attached.", "We will replace them tomorrow.", "Thank you!"]
+
+# status mix of orders older than a week; newer ones are mostly still open
+SETTLED_STATUSES = [(Order.Status.COMPLETED, 80), (Order.Status.CANCELLED, 8), (Order.Status.REJECTED, 4),
+                    (Order.Status.IN_PROGRESS, 8)]
+RECENT_STATUSES = [(Order.Status.PENDING, 45), (Order.Status.ACCEPTED, 25), (Order.Status.IN_PROGRESS, 20),
+                   (Order.Status.COMPLETED, 10)]
+COMPLAINT_RATE = 0.05
+
+
+def scaled_sizes(scale=1, **overrides):
+    """DEFAULT_SIZES with list-like sizes multiplied by `scale`, then `overrides`."""
+    sizes = {name: count * scale for name, count in DEFAULT_SIZES.items()}
+    # deeper fan-out only makes rows wider, not the lists longer
+    sizes["items"] = DEFAULT_SIZES["items"]
+    sizes.update(overrides)
+    return sizes
+
+
+def long_tail(rng, mean, cap=10):
+    """A count with the given mean: exact without `rng`, otherwise Pareto distributed (at least 1)."""
+    if rng is None or mean <= 0:
+        return mean
+    # Pareto(alpha=1.5) has mean 3
+    return max(1, min(round(rng.paretovariate(1.5) * mean / 3), mean * cap))
+
+
+class Dataset:
+    """The created rows, grouped by model; the first of each is handy as a sample."""
+
+    def __init__(self, prefix, sizes):
+        self.prefix = prefix
+        self.sizes = sizes
+        self.admin = None
+        self.owners, self.managers, self.contact_users = [], [], []
+        self.suppliers, self.consumers, self.contacts, self.memberships, self.links = [], [], [], [], []
+        self.kyb_documents, self.categories, self.products, self.product_attachments = [], [], [], []
+        self.orders, self.items, self.complaints, self.incidents = [], [], [], []
+        self.conversations, self.messages, self.attachments = [], [], []
+        self.notifications, self.audit_logs = [], []
+
+    def counts(self):
+        return {name: len(value) for name, value in vars(self).items() if isinstance(value, list)}
+
+
+def build_dataset(prefix="perf", password=DEFAULT_PASSWORD, batch_size=1000, rng=None, days=90, **sizes):
+    """
+    Create a dataset and return it. `prefix` keeps usernames and names unique,
+    so several datasets can share a database. Pass a seeded random.Random as
+    `rng` for realistic, reproducible distributions.
+    """
+    sizes = {**DEFAULT_SIZES, **sizes}
+    data = Dataset(prefix, sizes)
+    now = timezone.now()
+    password = make_password(password)  # hash once, not per user
+
+    def bulk(model, objs):
+        return model.objects.bulk_create(objs, batch_size=batch_size)
+
+    def user(username, role, **extra):
+        return User(username=f"{prefix}_{username}", role=role, password=password,
+                    email=f"{prefix}_{username}@example.com", **extra)
+
+    zipf_weights = {}
+
+    def popular(objs, k):
+        """`k` distinct objects, earlier ones much more likely (Zipf-like) when random."""
+        k = min(k, len(objs))
+        if rng is None:
+            return objs[:k]
+        if len(objs) not in zipf_weights:
+            zipf_weights[len(objs)] = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(objs))))
+        chosen = {}
+        while len(chosen) < k:
+            obj = rng.choices(objs, cum_weights=zipf_weights[len(objs)])[0]
+            chosen[obj.pk] = obj
+        return list(chosen.values())
+
+    # users and organisations
+    data.admin = bulk(User, [user("admin", User.Roles.PLATFORM_ADMIN, is_staff=True)])[0]
+    data.owners = bulk(User, [user(f"owner{s}", User.Roles.OWNER) for s in range(sizes["suppliers"])])
+    data.managers = bulk(User, [user(f"manager{s}", User.Roles.MANAGER) for s in range(sizes["suppliers"])])
+    data.contact_users = bulk(User, [user(f"contact{c}", User.Roles.CONSUMER_CONTACT) for c in range(sizes["consumers"])])
+
+    data.suppliers = bulk(Supplier, [
+        Supplier(owner=owner, name=f"{prefix} supplier {s}", city="Almaty", contact_email=owner.email,
+                 is_verified=True, verification_status="verified", languages=["kk", "ru"])
+        for s, owner in enumerate(data.owners)
+    ])
+    data.memberships = bulk(SupplierStaffMembership, [
+        SupplierStaffMembership(supplier=supplier, user=staff, role=role)
+        for supplier, owner, manager in zip(data.suppliers, data.owners, data.managers)
+        for staff, role in ((owner, "owner"), (manager, "manager"))
+    ])
+    data.kyb_documents = bulk(SupplierKYBDocument, [
+        SupplierKYBDocument(supplier=supplier, document=f"kyb/{prefix}/{supplier.pk}.pdf", uploaded_by=supplier.owner)
+        for supplier in data.suppliers
+    ])
+    data.consumers = bulk(Consumer, [
+        Consumer(name=f"{prefix} consumer {c}", address=f"Street {c}", languages=["ru"],
+                 consumer_type=Consumer.Types.HOTEL if rng and rng.random() < 0.2 else Consumer.Types.RESTAURANT)
+        for c in range(sizes["consumers"])
+    ])
+    data.contacts = bulk(ConsumerContact, [
+        ConsumerContact(consumer=consumer, user=contact_user, title="Buyer", is_primary=True)
+        for consumer, contact_user in zip(data.consumers, data.contact_users)
+    ])
+    data.links = bulk(SupplierConsumerLink, [
+        SupplierConsumerLink(supplier=supplier, consumer=consumer, requested_by=contact.user,
+                             status=SupplierConsumerLink.Status.APPROVED, approved_by=supplier.owner, approved_at=now)
+        for consumer, contact in zip(data.consumers, data.contacts)
+        for supplier in popular(data.suppliers, long_tail(rng, sizes["links"], cap=3))
+    ])
+
+    # catalog
+    data.categories = bulk(CatalogCategory, [
+        CatalogCategory(supplier=supplier, name=f"Category {k}", slug=f"category-{k}")
+        for supplier in data.suppliers
+        for k in range(sizes["categories"])
+    ])
+    categories = {}
+    for category in data.categories:
+        categories.setdefault(category.supplier_id, []).append(category)
+    products = []
+    for supplier in data.suppliers:
+        supplier_categories = categories.get(supplier.pk)
+        for p in range(long_tail(rng, sizes["products"])):
+            if rng is None:
+                price, unit = Decimal(p % 500) + Decimal("0.99"), "kg"
+            else:
+                price = Decimal(str(round(rng.lognormvariate(math.log(1500), 0.9), 2)))
+                unit = rng.choice(UNITS)
+            products.append(Product(
+                supplier=supplier, name=f"{PRODUCT_WORDS[p % len(PRODUCT_WORDS)]} {p}" if rng else f"Product {p}",
+                category=supplier_categories[p % len(supplier_categories)] if supplier_categories else None,
+                unit=unit, price=price, stock=Decimal(100 + p % 50), description="Synthetic product",
+                created_at=now - timedelta(minutes=p),
+            ))
+    data.products = bulk(Product, products)
+    data.product_attachments = bulk(ProductAttachment, [
+        ProductAttachment(product=product, file=f"product_attachments/{prefix}/{product.pk}.pdf", uploaded_by=product.supplier.owner)
+        for product in data.products[::max(1, sizes["products"])]
+    ])
+
+    # orders
+    catalog = {}
+    for product in data.products:
+        catalog.setdefault(product.supplier_id, []).append(product)
+    orders, order_items = [], []
+    for link in data.links:
+        for o in range(long_tail(rng, sizes["orders"])):
+            if rng is None:
+                created_at, order_status = now - timedelta(hours=o), Order.Status.PENDING
+            else:
+                created_at = now - timedelta(days=days * rng.random() ** 2)  # more recent than old
+                statuses = SETTLED_STATUSES if now - created_at > timedelta(days=7) else RECENT_STATUSES
+                order_status = rng.choices([s for s, _ in statuses], weights=[w for _, w in statuses])[0]
+            order = Order(supplier=link.supplier, consumer=link.consumer, placed_by=link.requested_by,
+                          status=order_status, created_at=created_at)
+            lines = []
+            for product in popular(catalog[link.supplier_id], long_tail(rng, sizes["items"], cap=4)):
+                quantity = Decimal(1 + len(lines)) if rng is None else Decimal(rng.randint(1, 20))
+                lines.append(OrderItem(order=order, product=product, quantity=quantity,
+                                       unit_price=product.price, line_total=product.price * quantity))
+            order.total_amount = sum((line.line_total for line in lines), Decimal("0"))
+            orders.append(order)
+            order_items.extend(lines)
+    data.orders = bulk(Order, orders)
+    data.items = bulk(OrderItem, order_items)  # order ids were set on the instances by bulk_create
+
+    # support: a complaint with a conversation about a link's latest order (uniform)
+    # or about COMPLAINT_RATE of all orders (random)
+    managers = {membership.supplier_id: membership for membership in data.memberships if membership.role == "manager"}
+    contacts = {contact.consumer_id: contact for contact in data.contacts}
+    if rng is None:
+        complained = data.orders[::sizes["orders"]] if sizes["orders"] else []
+    else:
+        complained = [order for order in data.orders if rng.random() < COMPLAINT_RATE]
+    data.complaints = bulk(Complaint, [
+        Complaint(order=order, filed_by=order.placed_by, assigned_to=managers[order.supplier_id].user,
+                  status=Complaint.Status.IN_PROGRESS, description="Late delivery")
+        for order in complained
+    ])
+    data.incidents = bulk(Incident, [
+        Incident(supplier=supplier, reported_by=supplier.owner, title="Delivery delay", description="Synthetic incident")
+        for supplier in data.suppliers
+    ])
+    data.conversations = bulk(Conversation, [
+        Conversation(consumer_contact=contacts[complaint.order.consumer_id], complaint=complaint)
+        for complaint in data.complaints
+    ])
+    Conversation.supplier_staff.through.objects.bulk_create([
+        Conversation.supplier_staff.through(conversation=conversation,
+                                            supplierstaffmembership=managers[conversation.complaint.order.supplier_id])
+        for conversation in data.conversations
+    ], batch_size=batch_size)
+    messages = []
+    for conversation in data.conversations:
+        count = long_tail(rng, sizes["messages"])
+        staff_user = managers[conversation.complaint.order.supplier_id].user
+        for m in range(count):
+            messages.append(Message(
+                conversation=conversation,
+                sender=conversation.consumer_contact.user if m % 2 == 0 else staff_user,
+                text=CHAT_LINES[m % len(CHAT_LINES)] if rng else f"Message {m}",
+                created_at=now - timedelta(minutes=count - m),
+                is_read=m < count - 1,
+            ))
+    data.messages = bulk(Message, messages)
+    data.attachments = bulk(Attachment, [
+        Attachment(message=message, file=f"chat_attachments/{prefix}/{message.pk}.jpg", filename="photo.jpg")
+        for message in data.messages[::max(1, sizes["messages"])]
+    ])
+
+    # inboxes
+    users = [data.admin, *data.owners, *data.managers, *data.contact_users]
+    data.notifications = bulk(Notification, [
+        Notification(user=recipient, title="Order update", body="Your order changed")
+        for recipient in users
+        for _ in range(3)
+    ])
+    data.audit_logs = bulk(AuditLog, [
+        AuditLog(actor=order.placed_by, action="order.create", target_type="order", target_id=str(order.pk))
+        for order in data.orders
+    ])
+    return data
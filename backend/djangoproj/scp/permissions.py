@@ -1,4 +1,5 @@
 from django.db import transaction
+from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from rest_framework import viewsets, mixins, status
@@ -18,6 +19,31 @@ from .models import (
     Conversation, Message, Attachment, Notification, AuditLog
 )
 
+# -------------------------------
+# Claims (signed access tokens, see scp/authentication.py)
+# -------------------------------
+
+def token_claims(user):
+    """Claims of a Bearer-authenticated user, or None for DB-backed users."""
+    return getattr(user, "token_claims", None)
+
+
+def claimed_supplier_role(user, supplier_id):
+    """Role of `user` at `supplier_id` according to its claims (None if not staff there)."""
+    return token_claims(user)["sup"].get(str(supplier_id))
+
+
+def claimed_consumer_ids(user):
+    return token_claims(user)["con"]
+
+# -------------------------------
+# Query filters
+# -------------------------------
+
+def participant_filter(user):
+    """Conversations `user` takes part in, as the consumer contact or active supplier staff."""
+    return Q(consumer_contact__user_id=user.pk) | Q(supplier_staff__user_id=user.pk, supplier_staff__is_active=True)
+
 # -------------------------------
 # Permissions
 # -------------------------------
@@ -45,6 +71,9 @@ class IsSupplierStaff(BasePermission):
         if supplier is None:
             return False
 
+        if token_claims(request.user) is not None:
+            return claimed_supplier_role(request.user, supplier.pk) is not None or request.user.role == 'platform_admin'
+
         return (
             SupplierStaffMembership.objects.filter(supplier=supplier, user=request.user, is_active=True).exists()
             or request.user.role == 'platform_admin'
@@ -55,6 +84,8 @@ class IsOwnerOrManager(BasePermission):
         # obj expected Supplier
         if not isinstance(obj, Supplier):
             return False
+        if token_claims(request.user) is not None:
+            return claimed_supplier_role(request.user, obj.pk) in ('owner', 'manager') or request.user.role == 'platform_admin'
         return SupplierStaffMembership.objects.filter(supplier=obj, user=request.user, role__in=['owner','manager']).exists() or (request.user.role == 'platform_admin')
 
 class IsLinkedConsumerAndSupplierStaff(BasePermission):
@@ -76,8 +107,10 @@ class IsLinkedConsumerAndSupplierStaff(BasePermission):
         # For POST (creating incident)
         if request.method == 'POST':
             # Get all consumer instances for this user
-            consumer_contacts = ConsumerContact.objects.filter(user=user)
-            consumer_ids = consumer_contacts.values_list('consumer_id', flat=True)
+            if token_claims(user) is not None:
+                consumer_ids = claimed_consumer_ids(user)
+            else:
+                consumer_ids = ConsumerContact.objects.filter(user=user).values_list('consumer_id', flat=True)
 
             # Get supplier ID from request data
             supplier_id = request.data.get('supplier')
@@ -97,15 +130,21 @@ class IsLinkedConsumerAndSupplierStaff(BasePermission):
         return False
 
     def has_object_permission(self, request, view, obj):
-        # allow supplier staff
-        if SupplierStaffMembership.objects.filter(
-            supplier=obj.supplier, user=request.user, is_active=True
-        ).exists():
-            return True
+        if token_claims(request.user) is not None:
+            if claimed_supplier_role(request.user, obj.supplier_id) is not None:
+                return True
+            consumer_ids = claimed_consumer_ids(request.user)
+        else:
+            # allow supplier staff
+            if SupplierStaffMembership.objects.filter(
+                supplier=obj.supplier, user=request.user, is_active=True
+            ).exists():
+                return True
+            consumer_ids = ConsumerContact.objects.filter(user=request.user).values_list('consumer', flat=True)
 
         # allow linked consumer
         linked = SupplierConsumerLink.objects.filter(
-            consumer__in=ConsumerContact.objects.filter(user=request.user).values_list('consumer', flat=True),
+            consumer__in=consumer_ids,
             supplier=obj.supplier,
             status='approved'
         ).exists()
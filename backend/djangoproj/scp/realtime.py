@@ -0,0 +1,225 @@
+# scp/realtime.py
+"""
+Wakeups for long-polling clients (see scp/async_views.py).
+
+A long-poll subscribes to channels, then checks the database, then sleeps
+until one of its channels is published to or the wait runs out:
+
+    conversation:<id>   a Message was saved in the conversation
+    user:<id>           a Notification was saved for the user
+
+Messages and notifications publish from post_save once their transaction has
+committed, so a woken client always finds the new row.
+
+Within a process, publishing sets an asyncio.Event on each subscriber's event
+loop (safe from any thread). Across processes, on PostgreSQL with
+REALTIME_PG_NOTIFY, publish() also sends NOTIFY on REALTIME_PG_CHANNEL, and
+every process runs one listener thread with its own LISTEN connection that
+wakes its local subscribers. Without it (SQLite, or the setting off), other
+processes' subscribers are only woken by their LONG_POLL_INTERVAL re-check.
+"""
+import asyncio
+import copy
+import logging
+import select
+import threading
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Message, Notification
+
+logger = logging.getLogger(__name__)
+
+# tells this process's own NOTIFYs apart; it already woke its subscribers
+ORIGIN = uuid.uuid4().hex[:12]
+
+
+def conversation_channel(conversation_id):
+    return f"conversation:{conversation_id}"
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+def get_pg_channel():
+    return getattr(settings, "REALTIME_PG_CHANNEL", "scp_events")
+
+
+def pg_notify_enabled(alias="default"):
+    return getattr(settings, "REALTIME_PG_NOTIFY", True) and connections[alias].vendor == "postgresql"
+
+
+class Subscription:
+    """Channels one waiting coroutine listens on; use as a context manager."""
+
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = set(channels)
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def __enter__(self):
+        self.broker.add(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.broker.remove(self)
+
+    def wake(self):
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:  # the loop has closed
+            pass
+
+    async def wait(self, timeout):
+        """True if woken within `timeout` seconds."""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.event.clear()
+
+
+class Broker:
+    """Subscriptions of this process by channel."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = defaultdict(set)
+        self.listener = None
+
+    def subscribe(self, channels):
+        if pg_notify_enabled():
+            self.start_listener()
+        return Subscription(self, channels)
+
+    def add(self, subscription):
+        with self.lock:
+            for channel in subscription.channels:
+                self.subscriptions[channel].add(subscription)
+
+    def remove(self, subscription):
+        with self.lock:
+            for channel in subscription.channels:
+                subscribers = self.subscriptions.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self.subscriptions[channel]
+
+    def wake(self, channels):
+        with self.lock:
+            woken = {subscription for channel in channels for subscription in self.subscriptions.get(channel, ())}
+        for subscription in woken:
+            subscription.wake()
+
+    def publish(self, channels, using="default"):
+        """Wake subscribers of `channels` here and, with LISTEN/NOTIFY, in other processes."""
+        channels = list(channels)
+        self.wake(channels)
+        if pg_notify_enabled(using):
+            try:
+                with connections[using].cursor() as cursor:
+                    cursor.execute("SELECT pg_notify(%s, %s)", [get_pg_channel(), f"{ORIGIN}|{','.join(channels)}"])
+            except Exception:
+                # other processes fall back to their re-check interval
+                logger.exception("NOTIFY failed")
+
+    def start_listener(self, using="default"):
+        with self.lock:
+            if self.listener is None or not self.listener.is_alive():
+                self.listener = Listener(self, using)
+                self.listener.start()
+        return self.listener
+
+    def stop_listener(self):
+        with self.lock:
+            listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.stop()
+
+
+class Listener(threading.Thread):
+    """LISTENs on its own connection and wakes local subscribers; reconnects on errors."""
+    poll_timeout = 5  # seconds between checks of the stop flag
+
+    def __init__(self, broker, using="default"):
+        super().__init__(name="scp-realtime-listener", daemon=True)
+        self.broker, self.using = broker, using
+        self.stopping = threading.Event()
+
+    def connect(self):
+        # a private connection, never handed out by the connection pool
+        settings_dict = copy.deepcopy(connections.settings[self.using])
+        settings_dict["OPTIONS"].pop("pool", None)
+        wrapper = connections[self.using].__class__(settings_dict, self.using)
+        wrapper.ensure_connection()
+        wrapper.connection.autocommit = True
+        with wrapper.connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {wrapper.ops.quote_name(get_pg_channel())}")
+        return wrapper
+
+    def notifications(self, raw):
+        if hasattr(raw, "notifies") and callable(raw.notifies):  # psycopg >= 3.2
+            for notify in raw.notifies(timeout=self.poll_timeout):
+                yield notify.payload
+        else:  # psycopg2
+            if select.select([raw], [], [], self.poll_timeout)[0]:
+                raw.poll()
+                while raw.notifies:
+                    yield raw.notifies.pop(0).payload
+
+    def run(self):
+        backoff = 1
+        while not self.stopping.is_set():
+            wrapper = None
+            try:
+                wrapper = self.connect()
+                backoff = 1
+                while not self.stopping.is_set():
+                    for payload in self.notifications(wrapper.connection):
+                        origin, _, channels = payload.partition("|")
+                        if origin != ORIGIN and channels:
+                            self.broker.wake(channels.split(","))
+            except Exception:
+                logger.exception("LISTEN connection failed; reconnecting in %ss", backoff)
+                self.stopping.wait(backoff)
+                backoff = min(backoff * 2, 60)
+            finally:
+                if wrapper is not None:
+                    wrapper.close()
+
+    def stop(self):
+        self.stopping.set()
+        self.join(self.poll_timeout + 1)
+
+
+broker = Broker()
+
+
+def subscribe(channels):
+    return broker.subscribe(channels)
+
+
+def publish_on_commit(channels, using):
+    transaction.on_commit(lambda: broker.publish(channels, using), using=using)
+
+
+@receiver(post_save, sender=Message)
+def _message_saved(sender, instance, created, using, **kwargs):
+    if created:
+        publish_on_commit([conversation_channel(instance.conversation_id)], using)
+
+
+@receiver(post_save, sender=Notification)
+def _notification_saved(sender, instance, created, using, **kwargs):
+    if created:
+        publish_on_commit([user_channel(instance.user_id)], using)
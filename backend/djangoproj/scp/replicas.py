@@ -0,0 +1,100 @@
+# scp/replicas.py
+"""
+Read-replica routing with read-your-writes stickiness.
+
+Replicas are the aliases in REPLICA_DATABASES (see DB_REPLICA_URLS in
+djangoproj/database.py). Nothing is read from a replica unless a view opts in:
+
+  - ReplicaReadMixin marks safe-method requests on a ViewSet as replica reads,
+    after authentication and permission checks (those stay on the primary, so
+    a token issued a moment ago is always found). One replica is picked per
+    request so all of its queries see the same snapshot.
+  - ReplicaRouter sends ORM reads to that replica and all writes to the primary.
+  - ReplicaStickinessMiddleware (scp.middleware) notes when a request wrote to
+    the database and pins that user to the primary for REPLICA_STICKY_SECONDS,
+    so they read their own writes while replicas catch up.
+
+Pins live in the default cache; use a shared cache backend when running more
+than one process.
+"""
+import contextvars
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_PREFIX = "scp:replica:pin"
+
+# per-request routing state, set up by ReplicaStickinessMiddleware
+_state = contextvars.ContextVar("scp_replica_state", default=None)
+
+
+def get_replicas():
+    return list(getattr(settings, "REPLICA_DATABASES", []))
+
+
+def get_sticky_seconds():
+    return getattr(settings, "REPLICA_STICKY_SECONDS", 10)
+
+
+def begin_request():
+    """Start tracking a request; returns a token for end_request()."""
+    return _state.set({"replica": None, "wrote": False})
+
+
+def end_request(token):
+    state = _state.get()
+    _state.reset(token)
+    return state
+
+
+def use_replica():
+    """Route the rest of the current request's reads to one replica."""
+    state, replicas = _state.get(), get_replicas()
+    if state is None or state["wrote"] or not replicas:
+        return None
+    if state["replica"] is None:
+        state["replica"] = random.choice(replicas)
+    return state["replica"]
+
+
+def pin_to_primary(user_id):
+    cache.set(f"{PIN_PREFIX}:{user_id}", True, get_sticky_seconds())
+
+
+def is_pinned(user_id):
+    return bool(cache.get(f"{PIN_PREFIX}:{user_id}"))
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is not None and state["replica"] and not state["wrote"]:
+            return state["replica"]
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            # anything read after a write in the same request comes from the primary too
+            state["wrote"] = True
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {"default", *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaReadMixin:
+    """ViewSet mixin: serve safe-method requests from a replica unless the user is pinned."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            user = request.user
+            if not (user and user.is_authenticated and is_pinned(user.pk)):
+                use_replica()
@@ -0,0 +1,104 @@
+# scp/search.py
+"""
+Full-text search over chat messages (GET /api/messages/search/).
+
+The index is maintained by the database as messages are written, so there is
+nothing to rebuild or queue (migration 0017):
+
+  PostgreSQL  scp_message.search_vector, a stored generated tsvector column
+              over `text`, with a GIN index on (conversation_id, search_vector)
+              (btree_gin): the words alone, or the words within one
+              conversation, are looked up in the index however many
+              messages there are overall.
+  SQLite      scp_message_fts, an FTS5 table with the message table as its
+              external content, kept in sync by insert/update/delete triggers.
+
+search_messages() narrows a Message queryset to matches and annotates `rank`
+(higher is better) and `headline` (matching fragments with the search terms
+wrapped in sentinels); highlight() turns a headline into escaped HTML with
+<mark> around the terms. Both backends stem English words ("deliveries"
+finds "delivery"); SEARCH_CONFIG has to match the one in the migration.
+"""
+import re
+
+from django.conf import settings
+from django.db import NotSupportedError, connections
+from django.db.models import BooleanField, FloatField, TextField
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+
+from .models import Message
+
+SEARCH_CONFIG = "english"
+FTS_TABLE = "scp_message_fts"
+
+# private-use characters: cannot be typed into a search, survive escaping
+START, STOP = "\ue000", "\ue001"
+
+HEADLINE_OPTIONS = f"StartSel={START}, StopSel={STOP}, MaxFragments=3, MaxWords=15, MinWords=5, FragmentDelimiter=\" … \""
+SNIPPET_TOKENS = 16
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+
+# On SQLite, triggers on scp_message keep FTS_TABLE in step (created by migration 0017).
+# Most schema changes to a SQLite table rebuild it, and the rebuild drops its triggers:
+# a migration that alters Message has to recreate them, with its own copy of the SQL (see 0020).
+_word = re.compile(r"\w+")
+
+
+def get_max_offset():
+    # ranking is done over every match, so deep pages cost more than early ones
+    return getattr(settings, "MESSAGE_SEARCH_MAX_OFFSET", 500)
+
+
+def fts5_query(text):
+    """Words of `text` as an FTS5 query that matches all of them; None if there are none."""
+    # quoted, so operators and stray punctuation in user input are just words
+    words = _word.findall(text)
+    return " ".join(f'"{word}"' for word in words) or None
+
+
+def search_messages(queryset, text):
+    """
+    `queryset` filtered to messages matching `text` and annotated with `rank`
+    and `headline`, best match first.
+    """
+    vendor = connections[queryset.db].vendor
+    table = Message._meta.db_table
+
+    if vendor == "postgresql":
+        query = "websearch_to_tsquery(%s::regconfig, %s)"
+        params = (SEARCH_CONFIG, text)
+        match = RawSQL(f"{table}.search_vector @@ {query}", params, output_field=BooleanField())
+        rank = RawSQL(f"ts_rank_cd({table}.search_vector, {query})", params, output_field=FloatField())
+        # evaluated after the LIMIT, so only for the rows on the page
+        headline = RawSQL(
+            f"ts_headline(%s::regconfig, coalesce({table}.text, ''), {query}, %s)",
+            (SEARCH_CONFIG, *params, HEADLINE_OPTIONS), output_field=TextField(),
+        )
+    elif vendor == "sqlite":
+        query = fts5_query(text)
+        if query is None:
+            return queryset.none()
+        matches = f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+        match = RawSQL(f"{table}.id IN (SELECT rowid {matches})", (query,), output_field=BooleanField())
+        # bm25() is lower for better matches
+        rank = RawSQL(
+            f"(SELECT -bm25({FTS_TABLE}) {matches} AND rowid = {table}.id)", (query,), output_field=FloatField()
+        )
+        headline = RawSQL(
+            f"(SELECT snippet({FTS_TABLE}, 0, %s, %s, '…', %s) {matches} AND rowid = {table}.id)",
+            (START, STOP, SNIPPET_TOKENS, query), output_field=TextField(),
+        )
+    else:
+        raise NotSupportedError(f"Message search is not available on {vendor}.")
+
+    return queryset.filter(match).annotate(rank=rank, headline=headline).order_by("-rank", "-id")
+
+
+def highlight(headline):
+    """A headline as HTML: the message text escaped, matches wrapped in <mark>."""
+    if not headline:
+        return ""
+    return escape(headline).replace(START, "<mark>").replace(STOP, "</mark>")
@@ -9,20 +9,26 @@ from rest_framework.permissions import IsAuthenticated, BasePermission, SAFE_MET
 from rest_framework.routers import DefaultRouter
 from django.conf import settings
 from django.contrib.auth import authenticate
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework.permissions import AllowAny
 
 from .models import (
     User, Supplier, SupplierKYBDocument, Consumer, ConsumerContact,
     SupplierStaffMembership, SupplierConsumerLink, CatalogCategory, Product,
     ProductAttachment, Order, OrderItem, Complaint, Incident,
-    Conversation, Message, Attachment, Notification, AuditLog
+    Conversation, ConversationReadCursor, Message, Attachment, Notification, AuditLog, OrderStatusTransition,
+    UploadSession,
 )
+from .fieldsets import DynamicFieldsMixin
+from .search import highlight
+from . import uploads
 
 # -------------------------------
 # Serializers (compact but include key fields)
 # -------------------------------
 
-class UserReadSerializer(serializers.ModelSerializer):
+class UserReadSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'role', 'display_name', 'phone', 'is_active_user']
@@ -36,16 +42,15 @@ class UserWriteSerializer(serializers.ModelSerializer):
         extra_kwargs = {'password': {'write_only': True}}
 
     def create(self, validated_data):
-        user = User.objects.create_user(
+        # one INSERT, one password hash
+        return User.objects.create_user(
             username=validated_data['username'],
             email=validated_data.get('email', ''),
             password=validated_data['password'],
+            role=validated_data.get('role'),
+            display_name=validated_data.get('display_name', ''),
+            phone=validated_data.get('phone', ''),
         )
-        user.role = validated_data.get('role')
-        user.display_name = validated_data.get('display_name', '')
-        user.phone = validated_data.get('phone', '')
-        user.save()
-        return user
     
 class RegisterSerializer(serializers.Serializer):
     username = serializers.CharField(required=True)
@@ -104,69 +109,190 @@ class RegisterSerializer(serializers.Serializer):
             Consumer.objects.create(user=user)
 
         return user
-    
-class SupplierSerializer(serializers.ModelSerializer):
+
+def get_staff_invite_max():
+    return getattr(settings, "STAFF_INVITE_MAX", 100)
+
+
+class StaffInviteSerializer(serializers.Serializer):
+    """One entry of SupplierViewSet.invite_staff; password is optional."""
+    username = serializers.CharField(max_length=150)
+    email = serializers.EmailField(required=False, allow_blank=True, default="")
+    role = serializers.ChoiceField(choices=[("manager", "Manager"), ("sales", "Sales Representative")], default="sales")
+    display_name = serializers.CharField(required=False, allow_blank=True, default="")
+    phone = serializers.CharField(required=False, allow_blank=True, default="")
+    password = serializers.CharField(required=False, write_only=True)
+
+    def validate_username(self, value):
+        return User.normalize_username(value)
+
+    def validate(self, attrs):
+        password = attrs.get("password")
+        if password is not None:
+            user = User(username=attrs["username"], email=attrs["email"], display_name=attrs["display_name"])
+            try:
+                validate_password(password, user)
+            except DjangoValidationError as exc:
+                raise serializers.ValidationError({"password": list(exc.messages)})
+        return attrs
+
+
+class SetPasswordSerializer(serializers.Serializer):
+    uid = serializers.UUIDField()
+    token = serializers.CharField()
+    password = serializers.CharField(write_only=True)
+
+class SupplierSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Supplier
         fields = "__all__"
         read_only_fields = ("id", "created_at")
 
-class SupplierKYBSerializer(serializers.ModelSerializer):
+class UploadSessionSerializer(serializers.ModelSerializer):
+    chunk_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = ["id", "filename", "size", "sha256", "offset", "chunk_size", "created_at", "expires_at"]
+        read_only_fields = ["id", "offset", "created_at", "expires_at"]
+
+    def get_chunk_size(self, obj):
+        return uploads.get_max_chunk_size()
+
+    def validate_size(self, value):
+        if value > uploads.get_max_size():
+            raise serializers.ValidationError(f"Files can be at most {uploads.get_max_size()} bytes.")
+        return value
+
+    def validate_sha256(self, value):
+        if value and (len(value) != 64 or any(c not in "0123456789abcdefABCDEF" for c in value)):
+            raise serializers.ValidationError("A hex-encoded SHA-256 digest is required.")
+        return value
+
+    def create(self, validated_data):
+        return uploads.start(self.context["request"].user, **validated_data)
+
+class CommittedUploadMixin:
+    """
+    Lets a create take `upload`, the id of the caller's finished upload session
+    (scp/uploads.py), in place of the file in `upload_file_field`. The session
+    and its staging file go once the row is saved. Declare the `upload` field
+    on the serializer.
+    """
+    upload_file_field = "file"
+
+    def validate_upload(self, session):
+        if session.user_id != self.context["request"].user.pk:
+            raise serializers.ValidationError("Upload not found.")
+        if session.expires_at <= timezone.now():
+            raise serializers.ValidationError("The upload has expired.")
+        return session
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        session = attrs.pop("upload", None)
+        file = attrs.get(self.upload_file_field)
+        if session is not None:
+            if file:
+                raise serializers.ValidationError({"upload": "Send either a file or an upload, not both."})
+            try:
+                attrs[self.upload_file_field] = uploads.open_completed(session)
+            except ValueError as exc:
+                raise serializers.ValidationError({"upload": str(exc)})
+            if "filename" in self.fields and not attrs.get("filename"):
+                attrs["filename"] = session.filename
+            self._upload_session = session
+        elif file:
+            if file.size > uploads.get_max_size():
+                raise serializers.ValidationError(
+                    {self.upload_file_field: f"Files can be at most {uploads.get_max_size()} bytes."}
+                )
+        elif self.instance is None and not self.Meta.model._meta.get_field(self.upload_file_field).blank:
+            raise serializers.ValidationError({self.upload_file_field: "No file was submitted."})
+        return attrs
+
+    def create(self, validated_data):
+        session = getattr(self, "_upload_session", None)
+        if session is None:
+            return super().create(validated_data)
+        try:
+            with transaction.atomic():
+                # one commit per upload: a concurrent one waits here, then finds the session gone
+                if not UploadSession.objects.select_for_update().filter(pk=session.pk).exists():
+                    raise serializers.ValidationError({"upload": "The upload has already been committed or abandoned."})
+                instance = super().create(validated_data)
+                uploads.finish(session)
+        finally:
+            validated_data[self.upload_file_field].close()
+        return instance
+
+class SupplierKYBSerializer(CommittedUploadMixin, DynamicFieldsMixin, serializers.ModelSerializer):
+    upload = serializers.PrimaryKeyRelatedField(queryset=UploadSession.objects.all(), write_only=True, required=False)
+    upload_file_field = "document"
+
     class Meta:
         model = SupplierKYBDocument
-        fields = ["id", "supplier", "document", "uploaded_by", "uploaded_at", "note"]
+        fields = ["id", "supplier", "document", "upload", "uploaded_by", "uploaded_at", "note"]
         read_only_fields = ["id", "supplier", "uploaded_by", "uploaded_at"]
+        extra_kwargs = {"document": {"required": False}}
 
-class ConsumerSerializer(serializers.ModelSerializer):
+class ConsumerSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Consumer
         fields = ['id','name','consumer_type','address','contact_email','contact_phone','languages','created_at','updated_at','deleted']
         read_only_fields = ['id','created_at','updated_at']
 
-class ConsumerContactSerializer(serializers.ModelSerializer):
+class ConsumerContactSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = UserReadSerializer(read_only=True)
     user_id = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), write_only=True, source='user')
     class Meta:
         model = ConsumerContact
         fields = ['consumer','user','user_id','title','is_primary']
 
-class SupplierStaffMembershipSerializer(serializers.ModelSerializer):
+class SupplierStaffMembershipSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = UserReadSerializer(read_only=True)
     user_id = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), write_only=True, source='user')
     class Meta:
         model = SupplierStaffMembership
         fields = ['id','supplier','user','user_id','role','created_at','is_active']
         read_only_fields = ['id','created_at']
+        expandable_fields = {'supplier': SupplierSerializer}
 
-class SupplierConsumerLinkSerializer(serializers.ModelSerializer):
+class SupplierConsumerLinkSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = SupplierConsumerLink
         fields = ['id','supplier','consumer','requested_by','status','note','created_at','approved_by','approved_at','blocked_by','blocked_at']
         read_only_fields = ['id','created_at','approved_by','approved_at','blocked_by','blocked_at','requested_by']
+        expandable_fields = {'supplier': SupplierSerializer, 'consumer': ConsumerSerializer}
     
     def create(self, validated_data):
         validated_data['status'] = 'pending'
         return super().create(validated_data)
 
-class CatalogCategorySerializer(serializers.ModelSerializer):
+class CatalogCategorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = CatalogCategory
         fields = ['id','supplier','name','slug','parent']
+        expandable_fields = {'supplier': SupplierSerializer}
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = ['id','supplier','category','name','description','unit','price','discount_percentage','stock','min_order_quantity',
                   'is_active','delivery_option','lead_time_days','image','created_at','updated_at']
         read_only_fields = ['id','created_at','updated_at']
+        expandable_fields = {'supplier': SupplierSerializer, 'category': CatalogCategorySerializer}
+
+class ProductAttachmentSerializer(CommittedUploadMixin, DynamicFieldsMixin, serializers.ModelSerializer):
+    upload = serializers.PrimaryKeyRelatedField(queryset=UploadSession.objects.all(), write_only=True, required=False)
 
-class ProductAttachmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductAttachment
-        fields = ["id", "product", "file", "uploaded_by", "uploaded_at"]
+        fields = ["id", "product", "file", "upload", "uploaded_by", "uploaded_at"]
         read_only_fields = ["id", "uploaded_by", "uploaded_at"]
+        expandable_fields = {"product": ProductSerializer}
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     order = serializers.PrimaryKeyRelatedField(read_only=True)
     unit_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
     line_total = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
@@ -174,13 +300,15 @@ class OrderItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderItem
         fields = ["order", "product", "quantity", "unit_price", "line_total"]
+        expandable_fields = {"product": ProductSerializer}
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     class Meta:
         model = Order
-        fields = ['id','supplier','consumer','placed_by','status','note','total_amount','created_at','accepted_at','completed_at','tracking_code','estimated_delivery','items']
-        read_only_fields = ['id','created_at','accepted_at','completed_at','total_amount']
+        fields = ['id','supplier','consumer','placed_by','status','note','total_amount','created_at','accepted_at','completed_at','tracking_code','estimated_delivery','version','items']
+        read_only_fields = ['id','status','created_at','accepted_at','completed_at','total_amount','version']  # status moves only through apply_transition
+        expandable_fields = {'supplier': SupplierSerializer, 'consumer': ConsumerSerializer, 'placed_by': UserReadSerializer}
     
     def create(self, validated_data):
         items_data = validated_data.pop('items')
@@ -198,6 +326,13 @@ class OrderSerializer(serializers.ModelSerializer):
         return order
 
 
+class OrderStatusTransitionSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = OrderStatusTransition
+        fields = ['from_status','to_status','version','actor','created_at']
+        read_only_fields = fields
+
+
 class OrderCreateSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, write_only=True)
     class Meta:
@@ -257,7 +392,7 @@ class OrderCreateSerializer(serializers.ModelSerializer):
             order.save()
         return order
 
-class ComplaintSerializer(serializers.ModelSerializer):
+class ComplaintSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Complaint
         fields = [
@@ -274,22 +409,37 @@ class ComplaintSerializer(serializers.ModelSerializer):
             'resolved_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'resolved_at']
+        expandable_fields = {'order': OrderSerializer, 'filed_by': UserReadSerializer, 'assigned_to': UserReadSerializer}
 
-class IncidentSerializer(serializers.ModelSerializer):
+class IncidentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Incident
         fields = ['id','supplier','consumer','reported_by','title','description','status','created_at','updated_at','exported']
         read_only_fields = ['id','created_at','updated_at']
+        expandable_fields = {'supplier': SupplierSerializer, 'consumer': ConsumerSerializer, 'reported_by': UserReadSerializer}
 
-class MessageSerializer(serializers.ModelSerializer):
+class MessageSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     sender_name = serializers.CharField(source='sender.username', read_only=True)
     
     class Meta:
         model = Message
         fields = ['id', 'sender', 'sender_name', 'text', 'created_at', 'is_read']
         read_only_fields = ['id', 'sender', 'created_at', 'is_read']
+        expandable_fields = {'sender': UserReadSerializer}
 
-class ConversationSerializer(serializers.ModelSerializer):
+class MessageSearchResultSerializer(MessageSerializer):
+    """A message found by /api/messages/search/; `highlight` is HTML with the matches in <mark>."""
+    rank = serializers.FloatField(read_only=True)
+    highlight = serializers.SerializerMethodField()
+
+    class Meta(MessageSerializer.Meta):
+        fields = ['id', 'conversation', 'sender', 'sender_name', 'text', 'created_at', 'rank', 'highlight']
+        read_only_fields = fields
+
+    def get_highlight(self, obj):
+        return highlight(obj.headline)
+
+class ConversationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     messages = MessageSerializer(many=True, read_only=True)
 
     # Friendly fields
@@ -310,12 +460,14 @@ class ConversationSerializer(serializers.ModelSerializer):
         source="consumer_contact.user.username",
         read_only=True
     )
+    # annotated by ConversationViewSet from the requesting user's read cursor
+    unread_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Conversation
         fields = [
             "id", "supplier_staff", "consumer_contact", "supplier_name", "supplier_staff_name", "consumer_name",
-            "consumer_contact_name", "created_at", "updated_at", "messages", "complaint"
+            "consumer_contact_name", "created_at", "updated_at", "messages", "complaint", "unread_count"
             ]
 
         read_only_fields = [
@@ -323,20 +475,50 @@ class ConversationSerializer(serializers.ModelSerializer):
             "consumer_contact_name", "created_at", "updated_at", "messages"
         ]
 
+    def get_unread_count(self, obj):
+        return getattr(obj, "unread_count", None)
+
+
+class SyncConversationSerializer(ConversationSerializer):
+    """A conversation without its messages; delta sync sends changed messages on their own."""
+
+    class Meta(ConversationSerializer.Meta):
+        fields = [name for name in ConversationSerializer.Meta.fields if name != "messages"]
+        read_only_fields = fields
+
+
+class SyncMessageSerializer(MessageSerializer):
+    """A message as delta sync sends it, outside its conversation."""
+
+    class Meta(MessageSerializer.Meta):
+        fields = ['id', 'conversation', 'sender', 'sender_name', 'text', 'created_at', 'updated_at', 'is_read']
+        read_only_fields = fields
+
+
+class ConversationReadCursorSerializer(serializers.ModelSerializer):
+    username = serializers.CharField(source="user.username", read_only=True)
+
+    class Meta:
+        model = ConversationReadCursor
+        fields = ["user", "username", "last_read_message_id", "updated_at"]
+        read_only_fields = fields
+
+class AttachmentSerializer(CommittedUploadMixin, DynamicFieldsMixin, serializers.ModelSerializer):
+    upload = serializers.PrimaryKeyRelatedField(queryset=UploadSession.objects.all(), write_only=True, required=False)
 
-class AttachmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Attachment
-        fields = ['id','message','file','filename','uploaded_at']
+        fields = ['id','message','file','upload','filename','uploaded_at']
         read_only_fields = ['id','uploaded_at']
+        extra_kwargs = {'file': {'required': False}}
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = ['id','user','title','body','is_read','created_at']
         read_only_fields = ['id','created_at']
 
-class AuditLogSerializer(serializers.ModelSerializer):
+class AuditLogSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = AuditLog
         fields = ['id','actor','action','target_type','target_id','data','timestamp']
@@ -0,0 +1,206 @@
+# scp/slow_queries.py
+"""
+Slow-query log with EXPLAIN capture.
+
+SlowQueryLog is a database execute wrapper, entered by RequestMetricsMiddleware
+on every connection when SLOW_QUERY_THRESHOLD_MS is set. A query slower than
+the threshold is recorded under the fingerprint of its normalized SQL
+(literals, placeholders and IN lists collapsed), so one entry collects every
+run of the same statement with:
+
+  - count, total / max duration and when it was first and last seen,
+  - the viewset actions that issued it (from scp/metrics.py), e.g.
+    "ProductViewSet.list", and the innermost project frame on the stack,
+    e.g. "scp/views.py:412 in get_queryset",
+  - one sample statement and its EXPLAIN plan, taken the first time (EXPLAIN
+    ANALYZE on PostgreSQL with SLOW_QUERY_EXPLAIN_ANALYZE, which runs the
+    query a second time).
+
+Parameters are token keys, password hashes and message text as often as not,
+so by default the sample is the normalized SQL: EXPLAIN runs with the real
+parameters, which are then dropped, and string literals in the plan are
+masked. SLOW_QUERY_CAPTURE_PARAMS keeps the statement and its parameters as
+they were sent, for debugging on a machine without real data.
+
+Entries live in a bounded buffer in this process (SLOW_QUERY_BUFFER_SIZE
+fingerprints, least recently seen dropped first) and are listed on the
+/admin/slow-queries/ page.
+"""
+import contextvars
+import hashlib
+import os
+import re
+import threading
+import time
+import traceback
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from . import metrics
+
+DEFAULT_BUFFER_SIZE = 200
+
+_explaining = contextvars.ContextVar("scp_slow_query_explaining", default=False)
+
+_comments = re.compile(r"/\*.*?\*/|--[^\n]*", re.S)
+_strings = re.compile(r"'(?:[^']|'')*'")
+_numbers = re.compile(r"(?<![\w.\"])-?\d+(?:\.\d+)?\b")
+_placeholders = re.compile(r"%s|\?|\$\d+")
+_in_lists = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.I)
+_values_lists = re.compile(r"\bVALUES\s*\(.*\)", re.I | re.S)
+_whitespace = re.compile(r"\s+")
+
+# frames in these files are the instrumentation, not where a query came from
+_here = os.path.dirname(os.path.abspath(__file__))
+_skip_paths = {os.path.join(_here, name) for name in ("slow_queries.py", "metrics.py", "middleware.py")}
+
+
+def get_threshold():
+    """Slow-query threshold in seconds, or None when the log is off."""
+    value = getattr(settings, "SLOW_QUERY_THRESHOLD_MS", None)
+    return None if value is None else value / 1000
+
+
+def capture_params():
+    return getattr(settings, "SLOW_QUERY_CAPTURE_PARAMS", False)
+
+
+def normalize(sql):
+    sql = _comments.sub(" ", sql)
+    sql = _strings.sub("?", sql)
+    sql = _placeholders.sub("?", sql)
+    sql = _numbers.sub("?", sql)
+    sql = _in_lists.sub("IN (...)", sql)
+    sql = _values_lists.sub("VALUES (...)", sql)
+    return _whitespace.sub(" ", sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:16]
+
+
+def query_origin():
+    """'path:line in function' of the innermost project frame outside this instrumentation."""
+    base = str(settings.BASE_DIR) + os.sep
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if filename.startswith(base) and "site-packages" not in filename and filename not in _skip_paths:
+            return f"{os.path.relpath(filename, base)}:{frame.lineno} in {frame.name}"
+    return ""
+
+
+def explain(connection, sql, params):
+    """EXPLAIN (ANALYZE) output for a SELECT, or None for other statements."""
+    if not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    options = {}
+    if connection.vendor == "postgresql" and getattr(settings, "SLOW_QUERY_EXPLAIN_ANALYZE", False):
+        options["analyze"] = True
+    token = _explaining.set(True)
+    try:
+        # a savepoint, so a failing EXPLAIN cannot break the caller's transaction
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix(**options)} {sql}", params)
+            return "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+    except DatabaseError as exc:
+        return f"EXPLAIN failed: {exc}"
+    finally:
+        _explaining.reset(token)
+
+
+class SlowQueryBuffer:
+    """Slow-query entries by fingerprint, keeping the `size` most recently seen."""
+
+    def __init__(self, size=DEFAULT_BUFFER_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def add(self, fp, duration, sql, params, alias, view, origin):
+        """Record one run; returns True if `fp` is new and still needs a plan."""
+        now = timezone.now()
+        with self.lock:
+            entry = self.entries.get(fp)
+            if entry is None:
+                entry = self.entries[fp] = {
+                    "fingerprint": fp,
+                    "normalized": normalize(sql),
+                    "sql": sql,
+                    "params": repr(tuple(params)) if params is not None else "",
+                    "database": alias,
+                    "plan": None,
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "first_seen": now,
+                    "views": {},
+                    "origin": origin,
+                }
+                while len(self.entries) > self.size:
+                    self.entries.popitem(last=False)
+            else:
+                self.entries.move_to_end(fp)
+            ms = duration * 1000
+            entry["count"] += 1
+            entry["total_ms"] += ms
+            entry["max_ms"] = max(entry["max_ms"], ms)
+            entry["last_seen"] = now
+            entry["origin"] = origin or entry["origin"]
+            if view:
+                entry["views"][view] = entry["views"].get(view, 0) + 1
+            return entry["plan"] is None
+
+    def set_plan(self, fp, plan):
+        with self.lock:
+            if fp in self.entries:
+                self.entries[fp]["plan"] = plan
+
+    def snapshot(self):
+        """Copies of the entries, slowest in total first."""
+        with self.lock:
+            entries = [{**entry, "views": dict(entry["views"])} for entry in self.entries.values()]
+        for entry in entries:
+            entry["avg_ms"] = entry["total_ms"] / entry["count"]
+        return sorted(entries, key=lambda entry: entry["total_ms"], reverse=True)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+buffer = SlowQueryBuffer(getattr(settings, "SLOW_QUERY_BUFFER_SIZE", DEFAULT_BUFFER_SIZE))
+
+
+class SlowQueryLog:
+    """Database execute wrapper adding queries over the threshold to `buffer`."""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+
+    def __call__(self, execute, sql, params, many, context):
+        if _explaining.get():
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = time.perf_counter() - start
+        if duration >= self.threshold:
+            self.record(sql, params, many, context["connection"], duration)
+        return result
+
+    def record(self, sql, params, many, connection, duration):
+        view = metrics.current_view()
+        fp = fingerprint(sql)
+        if capture_params():
+            sample, sample_params = sql, None if many else params
+        else:
+            sample, sample_params = normalize(sql), None
+        needs_plan = buffer.add(fp, duration, sample, sample_params, connection.alias, view, query_origin())
+        if needs_plan and not many and getattr(settings, "SLOW_QUERY_EXPLAIN", True):
+            plan = explain(connection, sql, params) or ""
+            if not capture_params():
+                # PostgreSQL plans quote the values filters compare against
+                plan = _strings.sub("?", plan)
+            buffer.set_plan(fp, plan)
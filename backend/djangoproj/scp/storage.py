@@ -0,0 +1,78 @@
+# scp/storage.py
+"""
+Content-addressed file storage for KYB documents, chat attachments and
+product attachments.
+
+Suppliers upload the same spec sheets and certificates again and again.
+ContentAddressedStorage names a file after its contents,
+blobs/<aa>/<bb>/<sha256><ext>, so identical uploads share one file: the
+bytes are hashed while they are streamed to a temp file, and if a blob of
+that name is already there it is replaced by the new copy, which also
+tells gc_blobs the blob is in use again. The upload_to of the field only contributes the extension.
+
+It is a FileSystemStorage on MEDIA_ROOT, so files saved under their dated
+upload_to paths before the switch are still served from where they are.
+The gc_blobs command (scp/blobs.py) deletes blobs nothing references any
+more.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+BLOB_PREFIX = "blobs/"
+STAGING_DIR = f"{BLOB_PREFIX}tmp"
+BLOCK_SIZE = 64 * 1024
+MAX_EXTENSION_LENGTH = 16  # keeps names within FileField's default max_length of 100
+
+
+def blob_name(sha256, extension=""):
+    return f"{BLOB_PREFIX}{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}"
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def _save(self, name, content):
+        extension = os.path.splitext(name)[1].lower()
+        if len(extension) > MAX_EXTENSION_LENGTH:
+            extension = ""
+        staging_dir = self.path(STAGING_DIR)
+        os.makedirs(staging_dir, exist_ok=True)
+
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=staging_dir)
+        try:
+            with os.fdopen(fd, "wb") as temp:
+                if hasattr(content, "seek"):
+                    content.seek(0)
+                for chunk in content.chunks(BLOCK_SIZE):
+                    digest.update(chunk)
+                    temp.write(chunk)
+            name = blob_name(digest.hexdigest(), extension)
+            path = self.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            # atomic, and always done: a fresh file (and mtime) is what keeps gc_blobs off a
+            # blob stored again, and a concurrent save of the same bytes writes the same file
+            os.replace(temp_path, path)
+            temp_path = None
+            return name
+        finally:
+            if temp_path is not None:
+                os.remove(temp_path)
+
+    def get_available_name(self, name, max_length=None):
+        # the name is replaced by the content hash in _save; never look for a free one
+        return name
+
+
+_blob_storage = ContentAddressedStorage()
+
+
+def blob_storage():
+    """Storage of the file fields that deduplicate (a callable, so migrations refer to it by name)."""
+    return _blob_storage
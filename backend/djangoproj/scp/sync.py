@@ -0,0 +1,232 @@
+# scp/sync.py
+"""
+Delta sync for offline-capable clients.
+
+GET /api/sync/?since=<watermark> returns the products, categories, orders,
+conversations and messages the user can see whose `updated_at` is at or after
+the watermark, the ids of rows deleted since then (from SyncTombstone), and a
+new watermark to send next time. Without `since`, or with one older than SYNC_TOMBSTONE_TTL, the
+response has "full": true and everything; the client should replace its cache.
+
+The new watermark trails the server clock by SYNC_WATERMARK_LAG so rows written
+by transactions that were still open during the request are picked up next
+time. Consecutive responses may overlap; clients upsert by id.
+
+Conversations are sent without their messages; messages are a source of their
+own, so a new message costs one row rather than the whole thread.
+
+Rows the user stops seeing without being deleted get tombstones too: when a
+consumer's link to a supplier stops being approved, that consumer is sent the
+supplier's products and categories as deleted. When a link is approved, its
+access_granted_at is set, and that consumer's next delta contains the whole
+catalog of the supplier; other consumers and the supplier's staff are not
+sent it again.
+
+Writes that bypass save() (queryset.update()) must set updated_at themselves;
+child rows (order items, messages) touch their parent through the signals below.
+"""
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import (
+    CatalogCategory, ConsumerContact, Conversation, Message, Order, OrderItem, Product,
+    SupplierConsumerLink, SupplierStaffMembership, SyncTombstone,
+)
+
+# tombstone `model` values; also the keys of the response
+PRODUCTS, CATEGORIES, ORDERS = "products", "categories", "orders"
+CONVERSATIONS, MESSAGES = "conversations", "messages"
+CATALOG = (PRODUCTS, CATEGORIES)
+
+
+def get_tombstone_ttl():
+    return getattr(settings, "SYNC_TOMBSTONE_TTL", timedelta(days=30))
+
+
+def get_watermark_lag():
+    return getattr(settings, "SYNC_WATERMARK_LAG", timedelta(seconds=5))
+
+
+def format_watermark(value):
+    return value.astimezone(dt_timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def parse_watermark(value):
+    """
+    Returns the watermark as a datetime, or None for a full sync (none given, or
+    older than the retained tombstones). Raises ValueError.
+    """
+    if not value:
+        return None
+    # a "+00:00" offset sent without URL-encoding arrives as " 00:00"
+    since = parse_datetime(value.replace(" ", "+"))
+    if since is None or timezone.is_naive(since):
+        raise ValueError(value)
+    if since < timezone.now() - get_tombstone_ttl():
+        return None
+    return since
+
+
+def visible_tombstones(user):
+    if user.role == "platform_admin":
+        # catalog tombstones without a supplier are a consumer losing access, not a deletion
+        return SyncTombstone.objects.exclude(model__in=CATALOG, supplier_id=None)
+
+    supplier_ids = SupplierStaffMembership.objects.filter(user=user, is_active=True).values("supplier_id")
+    consumer_ids = ConsumerContact.objects.filter(user=user).values("consumer_id")
+    linked_supplier_ids = SupplierConsumerLink.objects.filter(
+        consumer_id__in=consumer_ids, status=SupplierConsumerLink.Status.APPROVED
+    ).values("supplier_id")
+    return SyncTombstone.objects.filter(
+        Q(supplier_id__in=supplier_ids)
+        | Q(consumer_id__in=consumer_ids)
+        # linked consumers only learn about deleted catalog rows, not other consumers' orders
+        | Q(model__in=CATALOG, supplier_id__in=linked_supplier_ids)
+    )
+
+
+def granted_supplier_ids(user, since):
+    """Suppliers whose catalog `user`'s consumer gained access to at or after `since`."""
+    consumer_ids = ConsumerContact.objects.filter(user=user).values("consumer_id")
+    return SupplierConsumerLink.objects.filter(
+        consumer_id__in=consumer_ids, status=SupplierConsumerLink.Status.APPROVED, access_granted_at__gte=since
+    ).values("supplier_id")
+
+
+def changes_since(since, sources, tombstones, context=None, granted=None):
+    """
+    `sources` maps response keys to (queryset of visible rows, serializer class).
+    `granted` (supplier ids, e.g. granted_supplier_ids()) have their whole
+    catalog sent, changed or not.
+    """
+    now = timezone.now()
+    payload = {"watermark": format_watermark(now - get_watermark_lag()), "full": since is None}
+
+    for name, (queryset, serializer_class) in sources.items():
+        if since is not None:
+            changed = Q(updated_at__gte=since)
+            if granted is not None and name in CATALOG:
+                changed |= Q(supplier_id__in=granted)
+            queryset = queryset.filter(changed)
+        payload[name] = serializer_class(queryset, many=True, context=context).data
+
+    deleted = {name: [] for name in sources}
+    if since is not None:
+        # a row lost and regained within the window is visible now: send it, not its tombstone
+        sent = {name: {str(row["id"]) for row in payload[name]} for name in sources}
+        rows = tombstones.filter(deleted_at__gte=since, model__in=list(sources)).values_list("model", "object_id").distinct()
+        for model, object_id in rows:
+            if object_id not in sent[model]:
+                deleted[model].append(object_id)
+    payload["deleted"] = deleted
+    return payload
+
+
+def purge_tombstones():
+    return SyncTombstone.purge_older_than(timezone.now() - get_tombstone_ttl())
+
+
+# -------------------------------
+# Tombstones and parent touches
+# -------------------------------
+
+def _tombstone(name, instance, supplier_id=None, consumer_id=None):
+    SyncTombstone.objects.create(
+        model=name, object_id=str(instance.pk), supplier_id=supplier_id, consumer_id=consumer_id
+    )
+
+
+@receiver(pre_delete, sender=Product)
+def _product_deleted(sender, instance, **kwargs):
+    _tombstone(PRODUCTS, instance, supplier_id=instance.supplier_id)
+
+
+@receiver(pre_delete, sender=CatalogCategory)
+def _category_deleted(sender, instance, **kwargs):
+    _tombstone(CATEGORIES, instance, supplier_id=instance.supplier_id)
+    # the cascade sets product.category to NULL with update(), which skips auto_now
+    Product.objects.filter(category=instance).update(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=Order)
+def _order_deleted(sender, instance, **kwargs):
+    _tombstone(ORDERS, instance, supplier_id=instance.supplier_id, consumer_id=instance.consumer_id)
+
+
+def _conversation_tombstones(name, instance, conversation_id):
+    # pre_delete: the staff m2m rows are still there, also when a conversation delete cascades
+    scope = Conversation.objects.filter(pk=conversation_id).values_list(
+        "consumer_contact__consumer_id", "supplier_staff__supplier_id"
+    )
+    SyncTombstone.objects.bulk_create([
+        SyncTombstone(model=name, object_id=str(instance.pk), supplier_id=supplier_id, consumer_id=consumer_id)
+        for consumer_id, supplier_id in set(scope)
+    ])
+
+
+@receiver(pre_delete, sender=Conversation)
+def _conversation_deleted(sender, instance, **kwargs):
+    _conversation_tombstones(CONVERSATIONS, instance, instance.pk)
+
+
+@receiver(pre_delete, sender=Message)
+def _message_deleted(sender, instance, **kwargs):
+    _conversation_tombstones(MESSAGES, instance, instance.conversation_id)
+
+
+def _catalog_access_lost(supplier_id, consumer_id):
+    # no supplier_id: only the consumer may see these, not the supplier's staff or other consumers
+    SyncTombstone.objects.bulk_create(
+        [
+            SyncTombstone(model=name, object_id=str(pk), consumer_id=consumer_id)
+            for name, model in ((PRODUCTS, Product), (CATEGORIES, CatalogCategory))
+            for pk in model.objects.filter(supplier_id=supplier_id).values_list("pk", flat=True)
+        ],
+        batch_size=1000,
+    )
+
+
+@receiver(pre_save, sender=SupplierConsumerLink)
+def _link_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    approved = SupplierConsumerLink.Status.APPROVED
+    was_approved = SupplierConsumerLink.objects.filter(pk=instance.pk, status=approved).exists()
+    if was_approved and instance.status != approved:
+        _catalog_access_lost(instance.supplier_id, instance.consumer_id)
+    elif instance.status == approved and not was_approved:
+        # the catalog is older than the consumer's watermark; granted_supplier_ids() picks it up
+        instance.access_granted_at = timezone.now()
+
+
+@receiver(pre_delete, sender=SupplierConsumerLink)
+def _link_deleted(sender, instance, **kwargs):
+    if instance.status == SupplierConsumerLink.Status.APPROVED:
+        _catalog_access_lost(instance.supplier_id, instance.consumer_id)
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def _order_item_changed(sender, instance, **kwargs):
+    Order.objects.filter(pk=instance.order_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def _message_changed(sender, instance, **kwargs):
+    # the conversation's unread_count and latest activity move with its messages
+    Conversation.objects.filter(pk=instance.conversation_id).update(updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=Conversation.supplier_staff.through)
+def _conversation_staff_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith("post_") or (reverse and action == "post_clear"):
+        return  # after a reverse clear the affected conversation ids are unknown
+    ids = pk_set if reverse else [instance.pk]
+    Conversation.objects.filter(pk__in=ids).update(updated_at=timezone.now())
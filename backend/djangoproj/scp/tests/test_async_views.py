@@ -0,0 +1,182 @@
+import asyncio
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.test import APITestCase
+from scp.authentication import rotate_token
+from scp.models import (
+    User, Supplier, SupplierStaffMembership, Consumer, ConsumerContact, Conversation, Message, Notification
+)
+
+
+def make_conversation(test):
+    test.owner = User.objects.create_user(username="owner1", password="pass123", role="owner")
+    test.contact_user = User.objects.create_user(username="contact1", password="pass123", role="consumer_contact")
+    test.outsider = User.objects.create_user(username="outsider", password="pass123", role="consumer_contact")
+    supplier = Supplier.objects.create(owner=test.owner, name="Supplier1")
+    staff = SupplierStaffMembership.objects.create(supplier=supplier, user=test.owner, role="owner")
+    contact = ConsumerContact.objects.create(consumer=Consumer.objects.create(name="Consumer1"), user=test.contact_user)
+    test.conversation = Conversation.objects.create(consumer_contact=contact)
+    test.conversation.supplier_staff.add(staff)
+
+
+def settle_messages():
+    """Age existing messages past LONG_POLL_CURSOR_OVERLAP, so ?after= answers leave them out."""
+    Message.objects.update(created_at=timezone.now() - timedelta(minutes=1))
+
+
+class MiddlewareTests(SimpleTestCase):
+
+    def test_middleware_is_async_capable(self):
+        # a sync-only middleware would put every async view back on a thread under ASGI
+        for path in settings.MIDDLEWARE:
+            if path != "scp.middleware.RequestMetricsMiddleware":
+                self.assertTrue(getattr(import_string(path), "async_capable", False), path)
+
+
+# the LISTEN connection of scp/realtime.py would outlive the test database
+@override_settings(REALTIME_PG_NOTIFY=False)
+class ConversationMessagesTests(APITestCase):
+
+    def setUp(self):
+        make_conversation(self)
+        self.messages = [
+            Message.objects.create(conversation=self.conversation, sender=self.owner, text=f"m{n}") for n in range(5)
+        ]
+        settle_messages()
+        self.url = reverse("conversation-messages", args=[self.conversation.pk])
+
+    def test_requires_authentication(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(resp["WWW-Authenticate"], "Token")
+
+    def test_token_authentication(self):
+        token = rotate_token(self.contact_user)
+        resp = self.client.get(self.url, HTTP_AUTHORIZATION=f"Token {token.key}")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_non_participant_gets_404(self):
+        self.client.force_authenticate(user=self.outsider)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+        resp = self.client.post(self.url, {"text": "hi"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_history_pages_backwards(self):
+        self.client.force_authenticate(user=self.contact_user)
+        resp = self.client.get(self.url, {"limit": 3})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([m["text"] for m in resp.json()["results"]], ["m2", "m3", "m4"])
+        self.assertEqual(resp.json()["results"][0]["sender_name"], "owner1")
+
+        resp = self.client.get(self.url, {"limit": 3, "before": resp.json()["earliest"]})
+        self.assertEqual([m["text"] for m in resp.json()["results"]], ["m0", "m1"])
+
+    def test_after_returns_newer_messages(self):
+        self.client.force_authenticate(user=self.contact_user)
+        resp = self.client.get(self.url, {"after": self.messages[2].pk})
+        self.assertEqual([m["text"] for m in resp.json()["results"]], ["m3", "m4"])
+        self.assertEqual(resp.json()["latest"], self.messages[4].pk)
+
+    @override_settings(LONG_POLL_INTERVAL=0.05)
+    def test_after_repeats_recent_messages_below_the_cursor(self):
+        # m3 was written recently and may have committed after the client saw m4
+        Message.objects.filter(pk=self.messages[3].pk).update(created_at=timezone.now())
+        self.client.force_authenticate(user=self.contact_user)
+        start = time.monotonic()
+        resp = self.client.get(self.url, {"after": self.messages[4].pk, "wait": 1})
+        # repeated, but it does not end the long-poll
+        self.assertGreaterEqual(time.monotonic() - start, 1)
+        self.assertEqual([m["text"] for m in resp.json()["results"]], ["m3"])
+        self.assertEqual(resp.json()["latest"], self.messages[4].pk)
+
+    def test_invalid_cursor(self):
+        self.client.force_authenticate(user=self.contact_user)
+        resp = self.client.get(self.url, {"after": "abc"})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("after", resp.json())
+
+    def test_send_message(self):
+        self.client.force_authenticate(user=self.contact_user)
+        resp = self.client.post(self.url, {"text": "Where is my order?"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.json()["sender_name"], "contact1")
+        message = Message.objects.get(pk=resp.json()["id"])
+        self.assertEqual((message.conversation_id, message.sender_id), (self.conversation.pk, self.contact_user.pk))
+
+    @override_settings(LONG_POLL_INTERVAL=0.05)
+    def test_long_poll_times_out_empty(self):
+        self.client.force_authenticate(user=self.contact_user)
+        start = time.monotonic()
+        resp = self.client.get(self.url, {"after": self.messages[-1].pk, "wait": 1})
+        self.assertGreaterEqual(time.monotonic() - start, 1)
+        self.assertEqual(resp.json()["results"], [])
+        self.assertEqual(resp.json()["latest"], self.messages[-1].pk)
+
+
+@override_settings(LONG_POLL_INTERVAL=0.05, REALTIME_PG_NOTIFY=False)
+class LongPollTests(TestCase):
+
+    def setUp(self):
+        make_conversation(self)
+        self.last = Message.objects.create(conversation=self.conversation, sender=self.owner, text="hello")
+        settle_messages()
+        self.auth = f"Token {rotate_token(self.contact_user).key}"
+
+    async def test_waiting_client_gets_new_message(self):
+        url = reverse("conversation-messages", args=[self.conversation.pk])
+
+        async def reply_later():
+            await asyncio.sleep(0.2)
+            await Message.objects.acreate(conversation=self.conversation, sender=self.owner, text="on its way")
+
+        start = time.monotonic()
+        resp, _ = await asyncio.gather(
+            self.async_client.get(url, {"after": self.last.pk, "wait": 5}, headers={"Authorization": self.auth}),
+            reply_later(),
+        )
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual([m["text"] for m in resp.json()["results"]], ["on its way"])
+
+    async def test_waits_concurrently(self):
+        url = reverse("conversation-messages", args=[self.conversation.pk])
+        poll = {"after": self.last.pk, "wait": 1}
+        start = time.monotonic()
+        responses = await asyncio.gather(
+            *[self.async_client.get(url, poll, headers={"Authorization": self.auth}) for _ in range(5)]
+        )
+        # five one-second waits overlap on the event loop rather than queueing
+        self.assertLess(time.monotonic() - start, 3)
+        self.assertEqual({resp.status_code for resp in responses}, {status.HTTP_200_OK})
+
+
+class NotificationInboxTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="u1", password="pass123", role="consumer_contact")
+        other = User.objects.create_user(username="u2", password="pass123", role="consumer_contact")
+        for n in range(4):
+            Notification.objects.create(user=self.user, title=f"n{n}", is_read=n < 2)
+        Notification.objects.create(user=other, title="not mine")
+        self.url = reverse("notification-inbox")
+
+    def test_inbox(self):
+        self.client.force_authenticate(user=self.user)
+        resp = self.client.get(self.url, {"limit": 3})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([n["title"] for n in resp.json()["results"]], ["n3", "n2", "n1"])
+        self.assertEqual(resp.json()["unread_count"], 2)
+
+        resp = self.client.get(self.url, {"before": resp.json()["earliest"]})
+        self.assertEqual([n["title"] for n in resp.json()["results"]], ["n0"])
+
+    def test_unread_only(self):
+        self.client.force_authenticate(user=self.user)
+        resp = self.client.get(self.url, {"unread": "1"})
+        self.assertEqual([n["title"] for n in resp.json()["results"]], ["n3", "n2"])
@@ -1,10 +1,14 @@
 # scp/tests/test_user_registration.py
 import uuid
+from unittest.mock import patch
+from django.contrib.auth.hashers import get_hasher
+from django.test import override_settings
 from django.urls import reverse
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework import status
 from scp.models import Consumer, ConsumerContact, User, Supplier, SupplierStaffMembership
 
+@override_settings(THROTTLE_ENABLED=False)
 class UserRegistrationTests(APITestCase):
 
     def setUp(self):
@@ -139,19 +143,6 @@ class UserRegistrationTests(APITestCase):
         self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn("supplier_id", resp.data)
 
-    def test_sales_registration_to_non_existing_supplier(self):
-        url = reverse("user-register")
-        payload = {
-            "username": "sales3",
-            "email": "sales3@example.com",
-            "password": "pass123",
-            "role": "sales",
-            "supplier_id": "00000000-0000-0000-0000-000000000000"  # non-existent
-        }
-        resp = self.client.post(url, payload, format="json")
-        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertIn("supplier_id", resp.data)
-    
     def test_register_owner_creates_supplier_and_membership(self):
         url = reverse("user-register")
         payload = {
@@ -192,18 +183,6 @@ class UserRegistrationTests(APITestCase):
         membership = SupplierStaffMembership.objects.get(user=user, supplier=self.supplier)
         self.assertEqual(membership.role, "sales")
 
-    def test_register_manager_to_non_existing_supplier_fails(self):
-        url = reverse("user-register")
-        payload = {
-            "username": "manager1",
-            "password": "pass123",
-            "role": "manager",
-            "supplier_id": str(uuid.uuid4())  # random ID that doesn't exist
-        }
-        resp = self.client.post(url, payload, format="json")
-        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertIn("supplier_id", resp.data)
-
     # ------------------------
     # Consumer Contact Registration
     # ------------------------
@@ -235,3 +214,49 @@ class UserRegistrationTests(APITestCase):
         resp = self.client.post(url, payload, format="json")
         self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn("consumer_name", resp.data)
+
+    def test_registration_hashes_password_once(self):
+        url = reverse("user-register")
+        payload = {
+            "username": "consumer3",
+            "password": "pass123",
+            "role": "consumer_contact",
+            "consumer_name": "Hash Once Cafe"
+        }
+        with patch("django.contrib.auth.hashers.get_hasher", wraps=get_hasher) as hasher:
+            resp = self.client.post(url, payload, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(hasher.call_count, 1)
+        self.assertTrue(User.objects.get(username="consumer3").check_password("pass123"))
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class RegistrationCommitTests(APITransactionTestCase):
+    """The supplier of a sales / manager registration is checked by the foreign key, at commit."""
+
+    def test_sales_registration_to_non_existing_supplier(self):
+        url = reverse("user-register")
+        payload = {
+            "username": "sales3",
+            "email": "sales3@example.com",
+            "password": "pass123",
+            "role": "sales",
+            "supplier_id": "00000000-0000-0000-0000-000000000000"  # non-existent
+        }
+        resp = self.client.post(url, payload, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("supplier_id", resp.data)
+        self.assertFalse(User.objects.filter(username="sales3").exists())
+
+    def test_register_manager_to_non_existing_supplier_fails(self):
+        url = reverse("user-register")
+        payload = {
+            "username": "manager1",
+            "password": "pass123",
+            "role": "manager",
+            "supplier_id": str(uuid.uuid4())  # random ID that doesn't exist
+        }
+        resp = self.client.post(url, payload, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("supplier_id", resp.data)
+        self.assertFalse(User.objects.filter(username="manager1").exists())
@@ -0,0 +1,164 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from scp import blobs, storage
+from scp.models import Blob, Product, ProductAttachment, Supplier, SupplierKYBDocument, User
+
+SPEC_SHEET = b"%PDF-1.4 spec sheet " * 100
+
+
+class BlobTestCase(TestCase):
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings_override = override_settings(MEDIA_ROOT=root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.storage = storage.blob_storage()
+
+        self.owner = User.objects.create_user(username="owner1", password="pass123", role="owner")
+        self.supplier = Supplier.objects.create(owner=self.owner, name="Supplier1")
+        self.product = Product.objects.create(supplier=self.supplier, name="Flour", unit="kg", price="1.00")
+
+    def kyb(self, content=SPEC_SHEET, name="certificate.pdf"):
+        return SupplierKYBDocument.objects.create(supplier=self.supplier, document=ContentFile(content, name=name))
+
+    def product_attachment(self, content=SPEC_SHEET, name="spec.pdf"):
+        return ProductAttachment.objects.create(product=self.product, file=ContentFile(content, name=name))
+
+    def blob_files(self):
+        files = []
+        for directory, _, filenames in os.walk(self.storage.path("blobs")):
+            files += [os.path.join(directory, filename) for filename in filenames]
+        return files
+
+    def age(self, name, hours):
+        then = time.time() - hours * 3600
+        os.utime(self.storage.path(name), (then, then))
+
+
+class StorageTests(BlobTestCase):
+
+    def test_named_after_content(self):
+        document = self.kyb()
+        digest = hashlib.sha256(SPEC_SHEET).hexdigest()
+        self.assertEqual(document.document.name, f"blobs/{digest[:2]}/{digest[2:4]}/{digest}.pdf")
+        with document.document.open("rb") as stored:
+            self.assertEqual(stored.read(), SPEC_SHEET)
+
+    def test_identical_files_are_stored_once(self):
+        document = self.kyb()
+        attachment = self.product_attachment(name="SPEC-COPY.PDF")
+        self.assertEqual(attachment.file.name, document.document.name)
+        self.assertEqual(len(self.blob_files()), 1)
+
+        other = self.product_attachment(content=b"another sheet")
+        self.assertNotEqual(other.file.name, document.document.name)
+        self.assertEqual(len(self.blob_files()), 2)
+
+    def test_legacy_paths_still_open(self):
+        path = self.storage.path("kyb/2024/01/02/old.pdf")
+        os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as legacy:
+            legacy.write(b"old")
+        document = SupplierKYBDocument.objects.create(supplier=self.supplier, document="kyb/2024/01/02/old.pdf")
+        with document.document.open("rb") as stored:
+            self.assertEqual(stored.read(), b"old")
+
+
+class ReferenceCountTests(BlobTestCase):
+
+    def test_counted_across_models(self):
+        document = self.kyb()
+        attachment = self.product_attachment()
+        name = document.document.name
+        self.assertEqual(blobs.recount()[name], 2)
+        blob = Blob.objects.get(name=name)
+        self.assertEqual((blob.ref_count, blob.size), (2, len(SPEC_SHEET)))
+
+        document.delete()
+        self.assertEqual(blobs.recount()[name], 1)
+        ProductAttachment.objects.filter(pk=attachment.pk).delete()
+        self.assertEqual(blobs.recount()[name], 0)
+        self.assertEqual(Blob.objects.get(name=name).ref_count, 0)
+
+    def test_saving_costs_no_bookkeeping_queries(self):
+        with self.assertNumQueries(1):
+            self.product_attachment()
+
+
+class GarbageCollectionTests(BlobTestCase):
+
+    def gc(self, *args):
+        out = StringIO()
+        call_command("gc_blobs", *args, stdout=out)
+        return out.getvalue()
+
+    def test_reclaims_old_unreferenced_blobs(self):
+        kept = self.kyb().document.name
+        attachment = self.product_attachment(content=b"outdated sheet")
+        dropped = attachment.file.name
+        attachment.delete()
+        fresh = self.product_attachment(content=b"just uploaded")
+        fresh_name = fresh.file.name
+        fresh.delete()
+        for name in (kept, dropped):
+            self.age(name, 48)
+
+        self.assertIn("Would reclaim 1 blob(s), 14 bytes.", self.gc("--dry-run"))
+        self.assertTrue(self.storage.exists(dropped))
+
+        self.assertIn("Reclaimed 1 blob(s), 14 bytes.", self.gc())
+        self.assertFalse(self.storage.exists(dropped))
+        self.assertFalse(Blob.objects.filter(name=dropped).exists())
+        # referenced, or unreferenced but within the grace period
+        self.assertTrue(self.storage.exists(kept))
+        self.assertTrue(self.storage.exists(fresh_name))
+
+        self.assertIn("Reclaimed 1 blob(s)", self.gc("--grace-hours", "0"))
+        self.assertFalse(self.storage.exists(fresh_name))
+
+    def test_recount_repairs_drift(self):
+        name = self.kyb().document.name
+        self.product_attachment()
+        # the stored count is stale; the tables decide
+        ProductAttachment.objects.filter(product=self.product).update(file=None)
+        Blob.objects.filter(name=name).update(ref_count=7)
+        self.age(name, 48)
+        self.gc()
+        self.assertEqual(Blob.objects.get(name=name).ref_count, 1)
+        self.assertTrue(self.storage.exists(name))
+
+    def test_reusing_a_blob_protects_it(self):
+        attachment = self.product_attachment()
+        name = attachment.file.name
+        attachment.delete()
+        self.age(name, 48)
+        # the same file arrives again; storing it refreshes the blob
+        self.storage.save("spec.pdf", ContentFile(SPEC_SHEET))
+        self.assertGreater(os.path.getmtime(self.storage.path(name)), time.time() - 60)
+
+    def test_blob_stored_again_during_collection_is_kept(self):
+        attachment = self.product_attachment()
+        name = attachment.file.name
+        attachment.delete()
+        self.age(name, 48)
+        cutoff = time.time() - 3600
+        # gc_blobs found it stale; the same file is stored before it gets to the delete
+        self.storage.save("spec.pdf", ContentFile(SPEC_SHEET))
+        self.assertFalse(blobs._remove_if_stale(self.storage.path(name), cutoff, self.storage.path(storage.STAGING_DIR)))
+        with self.storage.open(name, "rb") as stored:
+            self.assertEqual(stored.read(), SPEC_SHEET)
+
+        self.age(name, 48)
+        self.assertTrue(blobs._remove_if_stale(self.storage.path(name), cutoff, self.storage.path(storage.STAGING_DIR)))
+        self.assertFalse(self.storage.exists(name))
+        self.assertEqual(self.blob_files(), [])
@@ -0,0 +1,90 @@
+from django.urls import reverse
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.test import APITestCase
+from scp.models import User, Supplier, SupplierStaffMembership, Product
+
+
+class ConditionalGetTests(APITestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner1", password="pass123", role="owner")
+        self.supplier = Supplier.objects.create(owner=self.owner, name="Supplier1")
+        SupplierStaffMembership.objects.create(supplier=self.supplier, user=self.owner, role="owner")
+        self.product = Product.objects.create(supplier=self.supplier, name="Product1", unit="kg", price=100)
+        Product.objects.create(supplier=self.supplier, name="Product2", unit="kg", price=50)
+        self.client.force_authenticate(user=self.owner)
+
+    def test_product_list_revalidates_with_etag(self):
+        url = reverse("product-list")
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        etag = first["ETag"]
+        self.assertTrue(etag.startswith('W/"'))
+
+        with self.assertNumQueries(2):  # membership exists(), aggregate; nothing serialized
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(resp.content, b"")
+
+    def test_list_etag_depends_on_the_query(self):
+        url = reverse("product-list")
+        etag = self.client.get(url)["ETag"]
+        sparse = self.client.get(url, {"fields": "id,name"})
+        self.assertNotEqual(sparse["ETag"], etag)
+        self.assertEqual(self.client.get(url, {"fields": "id,name"}, HTTP_IF_NONE_MATCH=etag).status_code,
+                         status.HTTP_200_OK)
+        # the same parameters in another order are the same list
+        first = self.client.get(f"{url}?fields=id,name&expand=supplier")["ETag"]
+        self.assertEqual(self.client.get(f"{url}?expand=supplier&fields=id,name")["ETag"], first)
+
+    def test_vary_keeps_other_headers(self):
+        resp = self.client.get(reverse("product-list"))
+        self.assertIn("Authorization", resp["Vary"])
+        self.assertIn("Accept", resp["Vary"])
+
+    def test_product_change_invalidates_list_etag(self):
+        url = reverse("product-list")
+        etag = self.client.get(url)["ETag"]
+        self.product.price = 120
+        self.product.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_expanded_relation_change_invalidates_etag(self):
+        for url in (reverse("product-list"), reverse("product-detail", args=[self.product.id])):
+            etag = self.client.get(url, {"expand": "supplier"})["ETag"]
+            self.assertEqual(self.client.get(url, {"expand": "supplier"}, HTTP_IF_NONE_MATCH=etag).status_code,
+                             status.HTTP_304_NOT_MODIFIED)
+            self.supplier.name = f"{self.supplier.name}!"
+            self.supplier.save()
+            resp = self.client.get(url, {"expand": "supplier"}, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            self.assertIn(self.supplier.name, resp.content.decode())
+
+    def test_deletion_invalidates_list_etag(self):
+        url = reverse("product-list")
+        etag = self.client.get(url)["ETag"]
+        Product.objects.filter(name="Product2").delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_product_detail_if_modified_since(self):
+        url = reverse("product-detail", args=[self.product.id])
+        resp = self.client.get(url)
+        self.assertIn("Last-Modified", resp)
+
+        later = http_date(self.product.updated_at.timestamp() + 60)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=later).status_code, status.HTTP_304_NOT_MODIFIED)
+        earlier = http_date(self.product.updated_at.timestamp() - 60)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=earlier).status_code, status.HTTP_200_OK)
+
+    def test_supplier_detail_etag(self):
+        url = reverse("supplier-detail", args=[self.supplier.id])
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_not_modified_still_requires_permission(self):
+        url = reverse("supplier-detail", args=[self.supplier.id])
+        etag = self.client.get(url)["ETag"]
+        outsider = User.objects.create_user(username="x", password="pass123", role="sales")
+        self.client.force_authenticate(user=outsider)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_403_FORBIDDEN)
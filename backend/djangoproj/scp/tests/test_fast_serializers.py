@@ -0,0 +1,91 @@
+from decimal import Decimal
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory
+from django.urls import reverse
+from rest_framework import serializers, status
+from rest_framework.test import APITestCase
+from scp.fast_serializers import ValuesSerializer
+from scp.models import (
+    User, Supplier, Consumer, SupplierStaffMembership, ConsumerContact, SupplierConsumerLink,
+    CatalogCategory, Product, Order
+)
+from scp.renderers import FastJSONRenderer
+from scp.serializers import OrderSerializer, ProductSerializer, ConversationSerializer
+
+# 1x1 transparent GIF
+GIF = b"GIF89a\x01\x00\x01\x00\x00\xff\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x00;"
+
+
+class ValuesSerializerTests(APITestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner1", password="pass123", role="owner")
+        self.supplier = Supplier.objects.create(owner=self.owner, name="Supplier1")
+        SupplierStaffMembership.objects.create(supplier=self.supplier, user=self.owner, role="owner")
+        self.consumer_user = User.objects.create_user(username="consumer1", password="pass123", role="consumer_contact")
+        self.consumer = Consumer.objects.create(name="Consumer1")
+        ConsumerContact.objects.create(consumer=self.consumer, user=self.consumer_user, is_primary=True)
+        SupplierConsumerLink.objects.create(supplier=self.supplier, consumer=self.consumer, status="approved")
+
+        category = CatalogCategory.objects.create(supplier=self.supplier, name="Dairy", slug="dairy")
+        self.milk = Product.objects.create(
+            supplier=self.supplier, category=category, name="Milk", unit="l", price=Decimal("10.5"),
+            discount_percentage=Decimal("5"), stock=Decimal("12.25"), description="Fresh",
+            image=SimpleUploadedFile("milk.gif", GIF, content_type="image/gif"),
+        )
+        self.salt = Product.objects.create(supplier=self.supplier, name="Salt", unit="kg", price=2)
+
+        self.order = Order.objects.create(supplier=self.supplier, consumer=self.consumer, placed_by=self.consumer_user, note="Back door")
+        self.order.items.create(product=self.milk, quantity=Decimal("2.5"), unit_price=10, line_total=25)
+        self.order.items.create(product=self.salt, quantity=1, unit_price=2, line_total=2)
+        Order.objects.create(supplier=self.supplier, consumer=self.consumer)
+
+    def tearDown(self):
+        self.milk.image.delete(save=False)
+
+    def assertSameOutput(self, serializer_class, queryset):
+        context = {"request": RequestFactory().get("/api/")}
+        expected = serializer_class(queryset, many=True, context=context).data
+        actual = ValuesSerializer(serializer_class, queryset, context=context).data
+        self.assertEqual(FastJSONRenderer().render(actual), FastJSONRenderer().render(expected))
+
+    def test_products_match_model_serializer(self):
+        self.assertSameOutput(ProductSerializer, Product.objects.select_related("supplier").order_by("name"))
+
+    def test_orders_with_items_match_model_serializer(self):
+        self.assertSameOutput(OrderSerializer, Order.objects.prefetch_related("items").all())
+
+    def test_orders_use_two_queries(self):
+        with self.assertNumQueries(2):
+            data = ValuesSerializer(OrderSerializer, Order.objects.all()).data
+        self.assertEqual(sorted(len(order["items"]) for order in data), [0, 2])
+
+    def test_unsupported_fields_are_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            ValuesSerializer(ConversationSerializer, Order.objects.none()).data
+
+        class MethodFieldSerializer(serializers.ModelSerializer):
+            label = serializers.SerializerMethodField()
+
+            class Meta:
+                model = Product
+                fields = ["id", "label"]
+
+        with self.assertRaises(ImproperlyConfigured):
+            ValuesSerializer(MethodFieldSerializer, Product.objects.all()).data
+
+    def test_list_endpoints_use_fast_path(self):
+        self.client.force_authenticate(user=self.consumer_user)
+        resp = self.client.get(reverse("order-list"))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(resp.data), 2)
+        detail = self.client.get(reverse("order-detail", args=[self.order.id])).data
+        self.assertIn(detail, resp.data)
+
+        resp = self.client.get(reverse("product-list"))
+        names = sorted(p["name"] for p in resp.data)
+        self.assertEqual(names, ["Milk", "Salt"])
+        milk = next(p for p in resp.data if p["name"] == "Milk")
+        self.assertEqual(milk, self.client.get(reverse("product-detail", args=[self.milk.id])).data)
@@ -0,0 +1,93 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from scp.models import (
+    User, Supplier, Consumer, SupplierStaffMembership, ConsumerContact, SupplierConsumerLink,
+    CatalogCategory, Product, Order
+)
+
+
+class SparseFieldsetTests(APITestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner1", password="pass123", role="owner")
+        self.supplier = Supplier.objects.create(owner=self.owner, name="Supplier1", description="A long description")
+        SupplierStaffMembership.objects.create(supplier=self.supplier, user=self.owner, role="owner")
+        category = CatalogCategory.objects.create(supplier=self.supplier, name="Dairy", slug="dairy")
+        self.product = Product.objects.create(
+            supplier=self.supplier, category=category, name="Milk", unit="l", price=10, description="Fresh milk"
+        )
+        Product.objects.create(supplier=self.supplier, name="Salt", unit="kg", price=2)
+
+        consumer = Consumer.objects.create(name="Consumer1")
+        self.consumer_user = User.objects.create_user(username="consumer1", password="pass123", role="consumer_contact")
+        ConsumerContact.objects.create(consumer=consumer, user=self.consumer_user, is_primary=True)
+        SupplierConsumerLink.objects.create(supplier=self.supplier, consumer=consumer, status="approved")
+        order = Order.objects.create(supplier=self.supplier, consumer=consumer, placed_by=self.consumer_user)
+        order.items.create(product=self.product, quantity=1, unit_price=10, line_total=10)
+
+        self.client.force_authenticate(user=self.owner)
+
+    def get(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(url, params)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK, resp.data)
+        return resp, [q["sql"] for q in queries]
+
+    def test_fields_limit_output_and_columns(self):
+        resp, queries = self.get(reverse("product-list"), fields="id,name,price")
+        self.assertEqual({tuple(p) for p in resp.data}, {("id", "name", "price")})
+        product_query = next(sql for sql in queries if 'FROM "scp_product"' in sql and "MAX" not in sql)
+        self.assertNotIn('"description"', product_query)
+        self.assertNotIn("JOIN", product_query)
+
+    def test_detail_fields(self):
+        resp, _ = self.get(reverse("product-detail", args=[self.product.id]), fields="name")
+        self.assertEqual(resp.data, {"name": "Milk"})
+
+    def test_expand_joins_relation(self):
+        resp, queries = self.get(reverse("product-list"), fields="id,name,supplier", expand="supplier")
+        self.assertEqual({p["supplier"]["name"] for p in resp.data}, {"Supplier1"})
+        product_queries = [sql for sql in queries if 'FROM "scp_product"' in sql and "MAX" not in sql]
+        self.assertEqual(len(product_queries), 1)
+        self.assertIn('JOIN "scp_supplier"', product_queries[0])
+        # one query for the products, none per supplier
+        self.assertFalse([sql for sql in queries if sql.startswith('SELECT') and 'FROM "scp_supplier"' in sql])
+
+    def test_expand_without_fields_keeps_everything_else(self):
+        resp, _ = self.get(reverse("product-detail", args=[self.product.id]), expand="category")
+        self.assertEqual(resp.data["category"]["slug"], "dairy")
+        self.assertEqual(resp.data["description"], "Fresh milk")
+
+    def test_nested_items_are_skipped_unless_requested(self):
+        self.client.force_authenticate(user=self.consumer_user)
+        resp, queries = self.get(reverse("order-list"), fields="id,status")
+        self.assertEqual(list(resp.data[0]), ["id", "status"])
+        self.assertFalse([sql for sql in queries if 'FROM "scp_orderitem"' in sql])
+
+        resp, _ = self.get(reverse("order-list"), fields="id,items", expand="")
+        self.assertEqual(len(resp.data[0]["items"]), 1)
+
+        resp, _ = self.get(reverse("order-list"), fields="id,placed_by", expand="placed_by")
+        self.assertEqual(resp.data[0]["placed_by"]["username"], "consumer1")
+
+    def test_supplier_fields(self):
+        resp, queries = self.get(reverse("supplier-list"), fields="id,name")
+        self.assertEqual([dict(s) for s in resp.data], [{"id": str(self.supplier.id), "name": "Supplier1"}])
+        self.assertTrue(all('"description"' not in sql for sql in queries if 'FROM "scp_supplier"' in sql and "MAX" not in sql))
+
+    def test_unknown_names_are_rejected(self):
+        resp = self.client.get(reverse("product-list"), {"fields": "id,nope"})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("nope", str(resp.data["fields"]))
+        resp = self.client.get(reverse("product-detail", args=[self.product.id]), {"expand": "owner"})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_writes_ignore_fieldsets(self):
+        url = reverse("product-detail", args=[self.product.id]) + "?fields=name"
+        resp = self.client.patch(url, {"price": "12.00"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["price"], "12.00")
+        self.assertIn("description", resp.data)
@@ -0,0 +1,118 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from scp.models import (
+    User, Supplier, Consumer, SupplierStaffMembership, ConsumerContact, SupplierConsumerLink,
+    Product, Order, IdempotencyKey
+)
+
+
+class IdempotencyKeyTests(APITestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner1", password="pass123", role="owner")
+        self.supplier = Supplier.objects.create(owner=self.owner, name="Supplier1")
+        self.sales_user = User.objects.create_user(username="sales1", password="pass123", role="sales")
+        SupplierStaffMembership.objects.create(supplier=self.supplier, user=self.sales_user, role="sales", is_active=True)
+
+        self.consumer_user = User.objects.create_user(username="consumer1", password="pass123", role="consumer_contact")
+        self.consumer = Consumer.objects.create(name="Consumer1")
+        ConsumerContact.objects.create(consumer=self.consumer, user=self.consumer_user, is_primary=True)
+        SupplierConsumerLink.objects.create(supplier=self.supplier, consumer=self.consumer, status="approved")
+
+        self.product = Product.objects.create(supplier=self.supplier, name="Product1", unit="kg", price=100, stock=50)
+
+    def order_payload(self, quantity=2):
+        return {
+            "supplier": str(self.supplier.id),
+            "consumer": str(self.consumer.id),
+            "items": [{"product": str(self.product.id), "quantity": quantity}],
+        }
+
+    def test_retried_order_create_is_replayed(self):
+        self.client.force_authenticate(user=self.consumer_user)
+        url = reverse("order-list")
+
+        first = self.client.post(url, self.order_payload(), format="json", HTTP_IDEMPOTENCY_KEY="abc-1")
+        second = self.client.post(url, self.order_payload(), format="json", HTTP_IDEMPOTENCY_KEY="abc-1")
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(str(first.data["id"]), second.data["id"])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_requests_without_key_are_not_deduplicated(self):
+        self.client.force_authenticate(user=self.consumer_user)
+        url = reverse("order-list")
+        self.client.post(url, self.order_payload(), format="json")
+        self.client.post(url, self.order_payload(), format="json")
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_key_reused_with_different_payload_is_rejected(self):
+        self.client.force_authenticate(user=self.consumer_user)
+        url = reverse("order-list")
+        self.client.post(url, self.order_payload(2), format="json", HTTP_IDEMPOTENCY_KEY="abc-2")
+        resp = self.client.post(url, self.order_payload(3), format="json", HTTP_IDEMPOTENCY_KEY="abc-2")
+        self.assertEqual(resp.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_retried_accept_decrements_stock_once(self):
+        order = Order.objects.create(supplier=self.supplier, consumer=self.consumer, placed_by=self.consumer_user)
+        order.items.create(product=self.product, quantity=5, unit_price=100, line_total=500)
+
+        self.client.force_authenticate(user=self.sales_user)
+        url = reverse("order-accept", args=[order.id])
+        first = self.client.post(url, HTTP_IDEMPOTENCY_KEY="accept-1")
+        second = self.client.post(url, HTTP_IDEMPOTENCY_KEY="accept-1")
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 45)
+
+    def test_in_flight_duplicate_gets_conflict(self):
+        self.client.force_authenticate(user=self.consumer_user)
+        url = reverse("order-list")
+        self.client.post(url, self.order_payload(), format="json", HTTP_IDEMPOTENCY_KEY="busy")
+        # simulate the first request still running
+        IdempotencyKey.objects.filter(key="busy").update(response_status=None, response_body=None)
+
+        resp = self.client.post(url, self.order_payload(), format="json", HTTP_IDEMPOTENCY_KEY="busy")
+        self.assertEqual(resp.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_expired_key_is_not_replayed(self):
+        self.client.force_authenticate(user=self.consumer_user)
+        url = reverse("order-list")
+        self.client.post(url, self.order_payload(), format="json", HTTP_IDEMPOTENCY_KEY="old")
+        IdempotencyKey.objects.filter(key="old").update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        resp = self.client.post(url, self.order_payload(), format="json", HTTP_IDEMPOTENCY_KEY="old")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn("Idempotent-Replayed", resp)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_purge_expired(self):
+        IdempotencyKey.objects.create(
+            user=self.consumer_user, key="gone", method="POST", path="/", request_hash="x",
+            expires_at=timezone.now() - timedelta(seconds=1),
+        )
+        self.assertEqual(IdempotencyKey.purge_expired(), 1)
+
+    def test_purge_command(self):
+        for key, expires_in in (("gone", -1), ("kept", 60)):
+            IdempotencyKey.objects.create(
+                user=self.consumer_user, key=key, method="POST", path="/", request_hash="x",
+                expires_at=timezone.now() + timedelta(seconds=expires_in),
+            )
+        out = StringIO()
+        call_command("purge_idempotency_keys", stdout=out)
+        self.assertIn("Purged 1 idempotency key(s).", out.getvalue())
+        self.assertEqual(list(IdempotencyKey.objects.values_list("key", flat=True)), ["kept"])
@@ -0,0 +1,57 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from scp.models import User
+
+
+class ImportUsersCommandTests(TestCase):
+
+    def write_csv(self, content):
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, "w") as fh:
+            fh.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_imports_users_with_hashed_passwords(self):
+        path = self.write_csv(
+            "username,email,password,role,display_name,phone\n"
+            "sales1,s1@example.com,secret1,sales,Sales One,+7700\n"
+            "sales2,s2@example.com,secret2,sales,,\n"
+        )
+        out = StringIO()
+        call_command("import_users", path, "--workers", "2", stdout=out)
+        self.assertIn("Imported 2 user(s).", out.getvalue())
+
+        user = User.objects.get(username="sales1")
+        self.assertTrue(user.check_password("secret1"))
+        self.assertEqual(user.role, "sales")
+        self.assertEqual(user.display_name, "Sales One")
+
+    def test_skip_existing_reports_skipped_rows(self):
+        User.objects.create_user(username="sales1", password="old")
+        path = self.write_csv("username,password\nsales1,secret1\nsales2,secret2\n")
+        out = StringIO()
+        call_command("import_users", path, "--workers", "1", "--skip-existing", stdout=out)
+        self.assertIn("Imported 1 user(s). Skipped 1 existing.", out.getvalue())
+        self.assertTrue(User.objects.get(username="sales1").check_password("old"))
+        self.assertTrue(User.objects.get(username="sales2").check_password("secret2"))
+
+        out = StringIO()
+        call_command("import_users", path, "--workers", "1", "--skip-existing", stdout=out)
+        self.assertIn("No users to import; skipped 2 existing.", out.getvalue())
+
+    def test_blank_password_is_unusable(self):
+        path = self.write_csv("username,password\ninvitee,\n")
+        call_command("import_users", path, "--workers", "1", stdout=StringIO())
+        self.assertFalse(User.objects.get(username="invitee").has_usable_password())
+
+    def test_rejects_unknown_role(self):
+        path = self.write_csv("username,password,role\nx,pw,wizard\n")
+        with self.assertRaises(CommandError):
+            call_command("import_users", path, stdout=StringIO())
+        self.assertFalse(User.objects.exists())
@@ -0,0 +1,114 @@
+import os
+import pstats
+import re
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from scp import metrics
+from scp.middleware import RequestMetricsMiddleware
+from scp.models import User, Supplier, SupplierStaffMembership, Product
+
+
+def sample(text, name, **labels):
+    """The value of one series in Prometheus text output."""
+    label_text = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    match = re.search(rf"^{name}\{{{re.escape(label_text)}\}} (\S+)$", text, re.M)
+    return float(match.group(1)) if match else None
+
+
+class HistogramTests(SimpleTestCase):
+
+    def test_cumulative_buckets(self):
+        histogram = metrics.Histogram("latency_seconds", "Latency.", ("view",), (0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(("A",), value)
+        text = "\n".join(histogram.render())
+        self.assertIn("# TYPE latency_seconds histogram", text)
+        self.assertEqual(sample(text, "latency_seconds_bucket", view="A", le="0.1"), 1)
+        self.assertEqual(sample(text, "latency_seconds_bucket", view="A", le="1.0"), 2)
+        self.assertEqual(sample(text, "latency_seconds_bucket", view="A", le="+Inf"), 3)
+        self.assertEqual(sample(text, "latency_seconds_count", view="A"), 3)
+        self.assertAlmostEqual(sample(text, "latency_seconds_sum", view="A"), 5.55)
+
+    def test_middleware_is_opt_in(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            RequestMetricsMiddleware(lambda request: None)
+
+
+@override_settings(REQUEST_METRICS_ENABLED=True)
+class RequestMetricsTests(APITestCase):
+
+    def setUp(self):
+        registry = mock.patch.object(metrics, "registry", metrics.Registry())
+        self.registry = registry.start()
+        self.addCleanup(registry.stop)
+
+        self.owner = User.objects.create_user(username="owner1", password="pass123", role="owner")
+        self.supplier = Supplier.objects.create(owner=self.owner, name="Supplier1")
+        SupplierStaffMembership.objects.create(supplier=self.supplier, user=self.owner, role="owner")
+        for name in ("Milk", "Salt", "Rice"):
+            Product.objects.create(supplier=self.supplier, name=name, unit="kg", price=10)
+        self.admin = User.objects.create_user(username="admin1", password="pass123", role="platform_admin")
+
+    def test_records_sql_serializer_and_total_time_per_action(self):
+        self.client.force_authenticate(user=self.owner)
+        with self.assertNumQueries(3):
+            self.client.get(reverse("product-list"))
+        self.client.get(reverse("product-list"))
+
+        text = self.registry.render()
+        labels = {"view": "ProductViewSet", "action": "list", "method": "GET"}
+        self.assertEqual(sample(text, "scp_requests_total", **labels, status="200"), 2)
+        self.assertEqual(sample(text, "scp_request_sql_queries_sum", **labels), 6)
+        self.assertEqual(sample(text, "scp_request_duration_seconds_count", **labels), 2)
+        self.assertGreater(sample(text, "scp_request_sql_duration_seconds_sum", **labels), 0)
+        self.assertGreater(sample(text, "scp_request_serializer_duration_seconds_sum", **labels), 0)
+
+    def test_metrics_endpoint_is_admin_only(self):
+        self.client.force_authenticate(user=self.owner)
+        self.client.get(reverse("product-list"))
+        self.assertEqual(self.client.get(reverse("metrics-list")).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.admin)
+        resp = self.client.get(reverse("metrics-list"), HTTP_ACCEPT="text/plain;version=0.0.4;q=0.5,*/*;q=0.1")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp["Content-Type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn('scp_requests_total{view="ProductViewSet",action="list",method="GET",status="200"} 1',
+                      resp.content.decode())
+
+    @override_settings(REQUEST_METRICS_ENABLED=False)
+    def test_metrics_endpoint_when_disabled(self):
+        self.client.force_authenticate(user=self.admin)
+        self.assertEqual(self.client.get(reverse("metrics-list")).status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(REQUEST_PROFILE_SECRET="s3cret")
+class RequestProfileTests(APITestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = override_settings(REQUEST_PROFILE_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user(username="owner1", password="pass123", role="owner")
+        self.client.force_authenticate(user=self.user)
+
+    def test_profiles_requests_with_the_secret(self):
+        resp = self.client.get(reverse("product-list"), HTTP_X_PROFILE="s3cret")
+        dump = resp["X-Profile-Dump"]
+        self.assertIn("ProductViewSet-list", dump)
+        stats = pstats.Stats(os.path.join(self.directory, dump))
+        self.assertTrue(stats.total_calls)
+
+    def test_ignores_other_requests(self):
+        for headers in ({}, {"HTTP_X_PROFILE": "guess"}, {"HTTP_X_PROFILE": "s3crét"}):
+            resp = self.client.get(reverse("product-list"), **headers)
+            self.assertNotIn("X-Profile-Dump", resp)
+        self.assertEqual(os.listdir(self.directory), [])
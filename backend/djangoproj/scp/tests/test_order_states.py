@@ -0,0 +1,102 @@
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from scp.models import (
+    User, Supplier, Consumer, SupplierStaffMembership, ConsumerContact, SupplierConsumerLink,
+    Product, Order, OrderStatusTransition
+)
+from scp.order_states import apply_transition, InvalidTransition, TransitionConflict
+
+
+class OrderStateMachineTests(APITestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner1", password="pass123", role="owner")
+        self.supplier = Supplier.objects.create(owner=self.owner, name="Supplier1")
+        self.sales_user = User.objects.create_user(username="sales1", password="pass123", role="sales")
+        SupplierStaffMembership.objects.create(supplier=self.supplier, user=self.sales_user, role="sales", is_active=True)
+
+        self.consumer_user = User.objects.create_user(username="consumer1", password="pass123", role="consumer_contact")
+        self.consumer = Consumer.objects.create(name="Consumer1")
+        ConsumerContact.objects.create(consumer=self.consumer, user=self.consumer_user, is_primary=True)
+        SupplierConsumerLink.objects.create(supplier=self.supplier, consumer=self.consumer, status="approved")
+
+        self.product = Product.objects.create(supplier=self.supplier, name="Product1", unit="kg", price=100, stock=50)
+        self.order = Order.objects.create(supplier=self.supplier, consumer=self.consumer, placed_by=self.consumer_user)
+        self.order.items.create(product=self.product, quantity=4, unit_price=100, line_total=400)
+
+    def test_accept_then_complete_records_timestamps_and_history(self):
+        self.client.force_authenticate(user=self.sales_user)
+        resp = self.client.post(reverse("order-accept", args=[self.order.id]))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["version"], 1)
+
+        resp = self.client.post(reverse("order-complete", args=[self.order.id]))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.Status.COMPLETED)
+        self.assertEqual(self.order.version, 2)
+        self.assertIsNotNone(self.order.accepted_at)
+        self.assertIsNotNone(self.order.completed_at)
+
+        history = list(OrderStatusTransition.objects.filter(order=self.order).values_list("from_status", "to_status", "version"))
+        self.assertEqual(history, [("pending", "in_progress", 1), ("in_progress", "completed", 2)])
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 46)
+
+    def test_invalid_transition_is_rejected(self):
+        self.client.force_authenticate(user=self.sales_user)
+        resp = self.client.post(reverse("order-complete", args=[self.order.id]))
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(OrderStatusTransition.objects.exists())
+
+    def test_stale_client_version_gets_conflict(self):
+        self.client.force_authenticate(user=self.sales_user)
+        resp = self.client.post(reverse("order-accept", args=[self.order.id]), {"version": 5}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_409_CONFLICT)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.Status.PENDING)
+
+    def test_non_integer_version_is_rejected(self):
+        self.client.force_authenticate(user=self.sales_user)
+        resp = self.client.post(reverse("order-accept", args=[self.order.id]), {"version": "latest"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("version", resp.data)
+
+    def test_status_cannot_be_written_directly(self):
+        self.client.force_authenticate(user=self.sales_user)
+        resp = self.client.patch(reverse("order-detail", args=[self.order.id]), {"status": "completed"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.version), (Order.Status.PENDING, 0))
+        self.assertFalse(OrderStatusTransition.objects.exists())
+
+    def test_concurrent_accept_and_cancel_only_one_wins(self):
+        first = Order.objects.get(pk=self.order.pk)
+        second = Order.objects.get(pk=self.order.pk)
+
+        apply_transition(first, "accept", actor=self.sales_user)
+        with self.assertRaises(TransitionConflict):
+            apply_transition(second, "cancel", actor=self.consumer_user)
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.Status.IN_PROGRESS)
+        self.assertEqual(OrderStatusTransition.objects.filter(order=self.order).count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 46)
+
+    def test_cancel_not_allowed_after_completion(self):
+        apply_transition(self.order, "accept")
+        apply_transition(self.order, "complete")
+        with self.assertRaises(InvalidTransition):
+            apply_transition(self.order, "cancel")
+
+    def test_history_endpoint(self):
+        apply_transition(self.order, "reject", actor=self.sales_user)
+        self.client.force_authenticate(user=self.sales_user)
+        resp = self.client.get(reverse("order-history", args=[self.order.id]))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(resp.data), 1)
+        self.assertEqual(resp.data[0]["to_status"], "rejected")
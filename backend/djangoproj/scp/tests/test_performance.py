@@ -0,0 +1,262 @@
+"""
+Query-count and latency budgets for every API route.
+
+A dataset from scp.perf.build_dataset is requested through every GET route the
+router exposes, plus the main write actions. Query ceilings do not depend on the
+dataset size, so an N+1 query fails as soon as a list has a few rows; run with a
+larger SCP_PERF_SCALE to make that obvious. Latency budgets are set for the
+default size; scale SCP_PERF_LATENCY_FACTOR along with the dataset. Environment:
+
+    SCP_PERF_SCALE            dataset size multiplier (default 1)
+    SCP_PERF_REPEAT           requests per endpoint; latency is the median (default 3)
+    SCP_PERF_LATENCY_FACTOR   multiplies every latency budget, for slow CI machines (default 1)
+    SCP_PERF_REPORT           write a JSON report of every endpoint to this path
+
+A new route without an entry in BUDGETS fails test_every_route_has_a_budget.
+"""
+import json
+import os
+import statistics
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from scp import uploads
+from scp.perf import build_dataset, scaled_sizes
+from scp.urls import router
+
+SCALE = int(os.environ.get("SCP_PERF_SCALE", "1"))
+REPEAT = int(os.environ.get("SCP_PERF_REPEAT", "3"))
+LATENCY_FACTOR = float(os.environ.get("SCP_PERF_LATENCY_FACTOR", "1"))
+REPORT_PATH = os.environ.get("SCP_PERF_REPORT")
+
+# route name: (max queries, latency budget in ms)
+BUDGETS = {
+    "user-list": (2, 100),
+    "user-detail": (2, 50),
+    "user-me": (1, 50),
+    "supplier-list": (3, 100),
+    "supplier-detail": (3, 50),
+    "supplier-kyb-list": (2, 100),
+    "supplier-kyb-detail": (4, 50),
+    "consumer-list": (2, 100),
+    "consumer-detail": (2, 50),
+    "consumer-contact-list": (2, 100),
+    "consumer-contact-detail": (2, 50),
+    "staff-list": (2, 100),
+    "staff-detail": (4, 50),
+    "link-list": (2, 100),
+    "link-detail": (2, 50),
+    "category-list": (2, 100),
+    "category-detail": (4, 50),
+    "product-list": (4, 150),
+    "product-detail": (3, 50),
+    "product-attachment-list": (2, 100),
+    "product-attachment-detail": (2, 50),
+    "order-list": (3, 150),
+    "order-detail": (3, 50),
+    "order-history": (4, 50),
+    "order-item-list": (2, 150),
+    "order-item-detail": (2, 50),
+    "complaint-list": (2, 100),
+    "complaint-detail": (2, 50),
+    "incident-list": (2, 100),
+    "incident-detail": (2, 50),
+    "conversation-list": (7, 150),
+    "conversation-detail": (7, 100),
+    "conversation-read-receipts": (4, 50),
+    "message-list": (2, 150),
+    "message-detail": (2, 50),
+    "message-search": (2, 100),
+    "attachment-list": (2, 100),
+    "attachment-detail": (2, 50),
+    "notification-list": (2, 100),
+    "notification-detail": (2, 50),
+    "auditlog-list": (2, 100),
+    "auditlog-detail": (2, 50),
+    "sync-list": (8, 300),
+    "metrics-list": (1, 50),
+    "upload-detail": (2, 50),
+    # writes
+    "order-create": (25, 200),
+    "order-accept": (13, 100),
+    "product-create": (4, 100),
+    "conversation-send-message": (10, 100),
+    "conversation-mark-read": (5, 50),
+}
+
+# who requests each router basename; the default is a supplier owner
+ACTORS = {
+    "conversation": "contact",
+    "message": "contact",
+    "notification": "contact",
+    "metrics": "admin",
+    "upload": "contact",
+}
+
+EXPECTED_STATUS = {
+    # IsSupplierStaff finds no supplier on an attachment, so staff get 403 on detail
+    "product-attachment-detail": 403,
+    # REQUEST_METRICS_ENABLED is off by default
+    "metrics-list": 404,
+}
+
+# query strings for routes that need parameters
+QUERY_STRINGS = {
+    "message-search": "?q=message",
+}
+
+
+def get_routes():
+    """(route name, basename, needs a pk) for every GET route of the router."""
+    routes = []
+    for prefix, viewset, basename in router.registry:
+        if hasattr(viewset, "list"):
+            routes.append((f"{basename}-list", basename, False))
+        if hasattr(viewset, "retrieve"):
+            routes.append((f"{basename}-detail", basename, True))
+        for action in viewset.get_extra_actions():
+            if "get" in action.mapping:
+                routes.append((f"{basename}-{action.url_name}", basename, action.detail))
+    return routes
+
+
+class EndpointBudgetTests(APITestCase):
+    results = []
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sizes = scaled_sizes(SCALE)
+        cls.data = data = build_dataset(**cls.sizes)
+        cls.actors = {"owner": data.owners[0], "contact": data.contact_users[0], "admin": data.admin}
+        contact_ids = {data.contact_users[0].pk}
+        cls.samples = {
+            "user": data.owners[0],
+            "supplier": data.suppliers[0],
+            "supplier-kyb": data.kyb_documents[0],
+            "consumer": data.consumers[0],
+            "consumer-contact": data.contacts[0],
+            "staff": data.memberships[0],
+            "link": data.links[0],
+            "category": data.categories[0],
+            "product": data.products[0],
+            "product-attachment": data.product_attachments[0],
+            "order": data.orders[0],
+            "order-item": data.items[0],
+            "complaint": data.complaints[0],
+            "incident": data.incidents[0],
+            "conversation": data.conversations[0],
+            "message": data.messages[0],
+            "attachment": data.attachments[0],
+            "notification": next(n for n in data.notifications if n.user_id in contact_ids),
+            "auditlog": data.audit_logs[0],
+            "upload": uploads.start(data.contact_users[0], "spec-sheet.pdf", 1024),
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if REPORT_PATH and cls.results:
+            report = {
+                "database": connection.vendor,
+                "scale": SCALE,
+                "repeat": REPEAT,
+                "latency_factor": LATENCY_FACTOR,
+                "endpoints": sorted(cls.results, key=lambda result: result["name"]),
+            }
+            with open(REPORT_PATH, "w") as fh:
+                json.dump(report, fh, indent=2)
+
+    def measure(self, name, actor, method, path, payload=None, expected=200):
+        """
+        Request `path` REPEAT times; record and check the worst query count and the
+        median latency. `path` and `payload` may be callables taking the run number.
+        """
+        max_queries, budget_ms = BUDGETS[name]
+        self.client.force_authenticate(user=self.actors[actor])
+        timings, queries, status_code = [], 0, None
+        for run in range(REPEAT):
+            url = path(run) if callable(path) else path
+            body = payload(run) if callable(payload) else payload
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                if method == "get":
+                    response = self.client.get(url)
+                else:
+                    response = getattr(self.client, method)(url, body, format="json")
+                timings.append((time.perf_counter() - start) * 1000)
+            queries = max(queries, len(ctx))
+            status_code = response.status_code
+
+        median_ms = statistics.median(timings)
+        result = {
+            "name": name,
+            "method": method.upper(),
+            "path": url,
+            "actor": actor,
+            "status": status_code,
+            "queries": queries,
+            "max_queries": max_queries,
+            "ms_median": round(median_ms, 2),
+            "ms_max": round(max(timings), 2),
+            "budget_ms": budget_ms * LATENCY_FACTOR,
+        }
+        result["ok"] = (
+            status_code == expected and queries <= max_queries and median_ms <= budget_ms * LATENCY_FACTOR
+        )
+        self.results.append(result)
+
+        self.assertEqual(status_code, expected, f"{method.upper()} {url}")
+        self.assertLessEqual(queries, max_queries, f"{name}: {queries} queries, budget {max_queries}")
+        self.assertLessEqual(median_ms, budget_ms * LATENCY_FACTOR, f"{name}: {median_ms:.1f} ms")
+
+    def test_every_route_has_a_budget(self):
+        missing = sorted(name for name, _, _ in get_routes() if name not in BUDGETS)
+        self.assertEqual(missing, [], "add query/latency budgets for new routes")
+
+    def test_read_endpoints(self):
+        for name, basename, detail in get_routes():
+            with self.subTest(name):
+                args = [self.samples[basename].pk] if detail else []
+                self.measure(
+                    name, ACTORS.get(basename, "owner"), "get", reverse(name, args=args) + QUERY_STRINGS.get(name, ""),
+                    expected=EXPECTED_STATUS.get(name, 200),
+                )
+
+    def test_write_endpoints(self):
+        data = self.data
+        supplier, consumer, contact_user = data.suppliers[0], data.consumers[0], data.contact_users[0]
+        products = [p for p in data.products if p.supplier_id == supplier.pk]
+
+        with self.subTest("order-create"):
+            self.measure("order-create", "contact", "post", reverse("order-list"), lambda run: {
+                "supplier": str(supplier.pk),
+                "consumer": str(consumer.pk),
+                "items": [{"product": str(product.pk), "quantity": 1} for product in products[:5]],
+            }, expected=201)
+
+        with self.subTest("order-accept"):
+            # a different pending order per run; accepting twice is a conflict
+            orders = [order for order in data.orders if order.supplier_id == supplier.pk]
+            self.measure("order-accept", "owner", "post", lambda run: reverse("order-accept", args=[orders[run].pk]))
+
+        with self.subTest("product-create"):
+            self.measure("product-create", "owner", "post", reverse("product-list"), lambda run: {
+                "supplier": str(supplier.pk), "name": f"New product {run}", "unit": "kg", "price": "9.99",
+            }, expected=201)
+
+        with self.subTest("conversation-send-message"):
+            conversation = data.conversations[0]
+            self.measure(
+                "conversation-send-message", "contact", "post",
+                reverse("conversation-send-message", args=[conversation.pk]),
+                lambda run: {"text": f"Message {run}"},
+            )
+
+        with self.subTest("conversation-mark-read"):
+            conversation = data.conversations[0]
+            self.measure(
+                "conversation-mark-read", "contact", "post", reverse("conversation-mark-read", args=[conversation.pk]),
+            )
@@ -0,0 +1,123 @@
+"""
+EXPLAIN-based checks that the hot query paths keep using their indexes
+(migration 0015). Runs on SQLite and PostgreSQL; on PostgreSQL sequential
+scans are disabled for the test so the planner's choice does not depend on
+how few rows the test database has.
+"""
+import re
+import uuid
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from scp.models import (
+    User, Supplier, Consumer, ConsumerContact, SupplierStaffMembership, SupplierConsumerLink,
+    Order, Complaint, Conversation, Message,
+)
+
+
+class QueryPlanMixin:
+
+    def setUp(self):
+        super().setUp()
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def explain(self, query):
+        """The plan for a queryset or for captured SQL (parameters already inlined)."""
+        sql, params = (query, ()) if isinstance(query, str) else query.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+            return "\n".join(" ".join(str(col) for col in row) for row in cursor.fetchall())
+
+    def full_scans(self, plan, table):
+        if connection.vendor == "postgresql":
+            return re.findall(rf"Seq Scan on {table}\b", plan)
+        # SQLite: "SCAN table" without an index (a covering index scan is still a full scan)
+        return re.findall(rf"\bSCAN {table}\b", plan)
+
+    def assertUsesIndex(self, queryset, *index_names, sorted=True):
+        plan = self.explain(queryset)
+        self.assertTrue(any(name in plan for name in index_names), f"none of {index_names} used:\n{plan}")
+        self.assertFalse(self.full_scans(plan, queryset.model._meta.db_table), plan)
+        if sorted:
+            # the index already returns rows in the requested order
+            self.assertNotRegex(plan, r"TEMP B-TREE FOR ORDER BY|\bSort\b")
+
+
+class IndexUsageTests(QueryPlanMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="staff1", password="pass123", role="manager")
+        self.supplier_id, self.consumer_id = uuid.uuid4(), uuid.uuid4()
+
+    def test_active_memberships_by_user(self):
+        qs = SupplierStaffMembership.objects.filter(user=self.user, is_active=True).values_list("supplier_id", "role")
+        self.assertUsesIndex(qs, "scp_staff_active_user_idx")
+
+    def test_links_by_consumer_and_status(self):
+        qs = SupplierConsumerLink.objects.filter(consumer_id=self.consumer_id, status=SupplierConsumerLink.Status.PENDING)
+        self.assertUsesIndex(qs, "scp_link_consumer_status_idx")
+
+    def test_approved_links_by_consumer(self):
+        qs = SupplierConsumerLink.objects.filter(
+            consumer_id__in=[self.consumer_id], status=SupplierConsumerLink.Status.APPROVED
+        ).values("supplier_id")
+        self.assertUsesIndex(qs, "scp_link_approved_idx", "scp_link_consumer_status_idx")
+
+    def test_order_lists_are_read_in_index_order(self):
+        self.assertUsesIndex(Order.objects.filter(supplier_id=self.supplier_id), "scp_order_supplier_created_idx")
+        self.assertUsesIndex(Order.objects.filter(consumer_id=self.consumer_id), "scp_order_consumer_created_idx")
+
+    def test_assigned_complaints(self):
+        qs = Complaint.objects.filter(assigned_to=self.user, status=Complaint.Status.ESCALATED)
+        self.assertUsesIndex(qs, "scp_complaint_assignee_idx")
+
+    def test_conversation_history(self):
+        qs = Message.objects.filter(conversation_id=1).order_by("created_at")
+        self.assertUsesIndex(qs, "scp_message_conv_created_idx")
+        self.assertUsesIndex(qs.reverse(), "scp_message_conv_created_idx")
+
+    def test_unread_count_range(self):
+        # SQLite's single-column index carries the rowid, so it serves the id range too
+        qs = Message.objects.filter(conversation_id=1, id__gt=10).exclude(sender=self.user)
+        self.assertUsesIndex(qs, "scp_message_conv_id_idx", "conversation_id=? AND rowid>?", sorted=False)
+
+
+class EndpointQueryPlanTests(QueryPlanMixin, APITestCase):
+    """EXPLAIN every query an endpoint runs; none may scan the tables above in full."""
+
+    tables = ["scp_order", "scp_supplierstaffmembership", "scp_supplierconsumerlink"]
+
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username="owner1", password="pass123", role="owner")
+        self.supplier = Supplier.objects.create(owner=self.owner, name="Supplier1")
+        SupplierStaffMembership.objects.create(supplier=self.supplier, user=self.owner, role="owner")
+        self.contact = User.objects.create_user(username="contact1", password="pass123", role="consumer_contact")
+        self.consumer = Consumer.objects.create(name="Consumer1")
+        ConsumerContact.objects.create(consumer=self.consumer, user=self.contact)
+        SupplierConsumerLink.objects.create(supplier=self.supplier, consumer=self.consumer, status="approved")
+        Order.objects.create(supplier=self.supplier, consumer=self.consumer, placed_by=self.contact)
+
+    def assertNoFullScans(self, user, url):
+        self.client.force_authenticate(user=user)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        for query in ctx.captured_queries:
+            if not query["sql"].startswith("SELECT"):
+                continue
+            plan = self.explain(query["sql"])
+            for table in self.tables:
+                self.assertFalse(self.full_scans(plan, table), f"{query['sql']}\n{plan}")
+
+    def test_order_list(self):
+        self.assertNoFullScans(self.owner, reverse("order-list"))
+        self.assertNoFullScans(self.contact, reverse("order-list"))
+
+    def test_product_list(self):
+        self.assertNoFullScans(self.contact, reverse("product-list"))
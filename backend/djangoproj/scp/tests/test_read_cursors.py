@@ -0,0 +1,78 @@
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from scp.models import ConversationReadCursor, Message, SupplierStaffMembership, User
+from scp.tests.test_async_views import make_conversation
+
+
+class ReadCursorTests(APITestCase):
+
+    def setUp(self):
+        make_conversation(self)
+        self.manager = User.objects.create_user(username="manager1", password="pass123", role="manager")
+        supplier = self.conversation.supplier_staff.get().supplier
+        self.conversation.supplier_staff.add(
+            SupplierStaffMembership.objects.create(supplier=supplier, user=self.manager, role="manager")
+        )
+        self.from_contact = [self.send(self.contact_user, f"question {n}") for n in range(3)]
+        self.from_owner = self.send(self.owner, "answer")
+
+    def send(self, user, text):
+        return Message.objects.create(conversation=self.conversation, sender=user, text=text)
+
+    def unread(self, user):
+        self.client.force_authenticate(user=user)
+        resp = self.client.get(reverse("conversation-detail", args=[self.conversation.pk]))
+        return resp.json()["unread_count"]
+
+    def mark_read(self, user, **data):
+        self.client.force_authenticate(user=user)
+        return self.client.post(reverse("conversation-mark-read", args=[self.conversation.pk]), data, format="json")
+
+    def test_unread_counts_other_participants_messages(self):
+        self.assertEqual(self.unread(self.contact_user), 1)
+        self.assertEqual(self.unread(self.owner), 3)
+        self.assertEqual(self.unread(self.manager), 4)
+
+        self.client.force_authenticate(user=self.manager)
+        resp = self.client.get(reverse("conversation-list"))
+        self.assertEqual([c["unread_count"] for c in resp.json()], [4])
+
+    def test_mark_read_is_one_upsert_per_participant(self):
+        with self.assertNumQueries(1):
+            ConversationReadCursor.mark_read(self.conversation.pk, self.owner.pk)
+        resp = self.mark_read(self.owner)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.json(), {"last_read_message_id": self.from_owner.pk, "unread_count": 0})
+        self.assertEqual(ConversationReadCursor.objects.filter(user=self.owner).count(), 1)
+
+        # the manager has not read anything yet
+        self.assertEqual(self.unread(self.owner), 0)
+        self.assertEqual(self.unread(self.manager), 4)
+
+        self.send(self.contact_user, "one more")
+        self.assertEqual(self.unread(self.owner), 1)
+
+    def test_mark_read_up_to_a_message_never_moves_back(self):
+        resp = self.mark_read(self.manager, message=self.from_contact[1].pk)
+        self.assertEqual(resp.json(), {"last_read_message_id": self.from_contact[1].pk, "unread_count": 2})
+
+        resp = self.mark_read(self.manager, message=self.from_contact[0].pk)
+        self.assertEqual(resp.json()["last_read_message_id"], self.from_contact[1].pk)
+
+        self.assertEqual(self.mark_read(self.manager, message="x").status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_outsider_cannot_mark_read(self):
+        self.assertEqual(self.mark_read(self.outsider).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(ConversationReadCursor.objects.exists())
+
+    def test_read_receipts(self):
+        self.mark_read(self.owner)
+        self.mark_read(self.contact_user, message=self.from_contact[2].pk)
+        self.client.force_authenticate(user=self.contact_user)
+        resp = self.client.get(reverse("conversation-read-receipts", args=[self.conversation.pk]))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(r["username"], r["last_read_message_id"]) for r in resp.json()],
+            [("owner1", self.from_owner.pk), ("contact1", self.from_contact[2].pk)],
+        )
@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from scp import realtime
+from scp.authentication import rotate_token
+from scp.models import Message, Notification
+from scp.tests.test_async_views import make_conversation
+
+
+class BrokerTests(SimpleTestCase):
+
+    async def test_publish_from_another_thread_wakes_subscriber(self):
+        broker = realtime.Broker()
+        with broker.subscribe(["conversation:1"]) as subscription:
+            threading.Timer(0.05, broker.wake, [["conversation:1"]]).start()
+            self.assertTrue(await subscription.wait(2))
+            self.assertFalse(await subscription.wait(0.05))
+        self.assertEqual(dict(broker.subscriptions), {})
+
+    async def test_other_channels_do_not_wake(self):
+        broker = realtime.Broker()
+        with broker.subscribe(["conversation:1"]) as subscription:
+            broker.wake(["conversation:2", "user:1"])
+            self.assertFalse(await subscription.wait(0.05))
+
+
+# the LISTEN connection of scp/realtime.py would outlive the test database
+@override_settings(REALTIME_PG_NOTIFY=False)
+class EventsTests(APITestCase):
+
+    def setUp(self):
+        make_conversation(self)
+        self.url = reverse("events")
+
+    def test_first_call_returns_current_cursors(self):
+        message = Message.objects.create(conversation=self.conversation, sender=self.owner, text="hi")
+        Notification.objects.create(user=self.outsider, title="not mine")
+        self.client.force_authenticate(user=self.contact_user)
+        resp = self.client.get(self.url, {"wait": 5})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.json(), {
+            "messages": [], "notifications": [], "messages_after": message.pk, "notifications_after": 0,
+        })
+
+    def test_returns_new_messages_and_notifications(self):
+        self.client.force_authenticate(user=self.contact_user)
+        cursors = self.client.get(self.url).json()
+        message = Message.objects.create(conversation=self.conversation, sender=self.owner, text="hi")
+        notification = Notification.objects.create(user=self.contact_user, title="Order accepted")
+        Notification.objects.create(user=self.outsider, title="not mine")
+
+        resp = self.client.get(self.url, {
+            "messages_after": cursors["messages_after"], "notifications_after": cursors["notifications_after"],
+        })
+        body = resp.json()
+        self.assertEqual([(m["text"], m["conversation"]) for m in body["messages"]], [("hi", self.conversation.pk)])
+        self.assertEqual([n["title"] for n in body["notifications"]], ["Order accepted"])
+        self.assertEqual((body["messages_after"], body["notifications_after"]), (message.pk, notification.pk))
+
+    def test_missing_cursor_starts_from_now(self):
+        self.client.force_authenticate(user=self.contact_user)
+        notification = Notification.objects.create(user=self.contact_user, title="Order accepted")
+        message = Message.objects.create(conversation=self.conversation, sender=self.owner, text="hi")
+        resp = self.client.get(self.url, {"notifications_after": 0})
+        body = resp.json()
+        # the cursor that was sent is honoured
+        self.assertEqual([n["title"] for n in body["notifications"]], ["Order accepted"])
+        self.assertEqual((body["messages"], body["messages_after"]), ([], message.pk))
+        self.assertEqual(body["notifications_after"], notification.pk)
+
+    def test_outsider_sees_no_messages(self):
+        self.client.force_authenticate(user=self.outsider)
+        Message.objects.create(conversation=self.conversation, sender=self.owner, text="hi")
+        resp = self.client.get(self.url, {"messages_after": 0, "notifications_after": 0})
+        self.assertEqual(resp.json()["messages"], [])
+
+
+# a wakeup has to come from the broker: the fallback re-check would take 30s
+@override_settings(LONG_POLL_INTERVAL=30, REALTIME_PG_NOTIFY=False)
+class WakeupTests(TestCase):
+
+    def setUp(self):
+        make_conversation(self)
+        self.auth = {"Authorization": f"Token {rotate_token(self.contact_user).key}"}
+
+    def commit(self, create, **fields):
+        # TestCase never commits; run the on_commit callbacks (the publish) right away
+        with self.captureOnCommitCallbacks(execute=True):
+            return create(**fields)
+
+    async def later(self, create, **fields):
+        await asyncio.sleep(0.2)
+        return await sync_to_async(self.commit)(create, **fields)
+
+    async def test_send_wakes_conversation_long_poll(self):
+        url = reverse("conversation-messages", args=[self.conversation.pk])
+        start = time.monotonic()
+        resp, _ = await asyncio.gather(
+            self.async_client.get(url, {"after": 0, "wait": 10}, headers=self.auth),
+            self.later(Message.objects.create, conversation=self.conversation, sender=self.owner, text="hi"),
+        )
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual([m["text"] for m in resp.json()["results"]], ["hi"])
+
+    async def test_notification_wakes_events_long_poll(self):
+        poll = {"messages_after": 0, "notifications_after": 0, "wait": 10}
+        start = time.monotonic()
+        resp, _ = await asyncio.gather(
+            self.async_client.get(reverse("events"), poll, headers=self.auth),
+            self.later(Notification.objects.create, user=self.contact_user, title="Order accepted"),
+        )
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual([n["title"] for n in resp.json()["notifications"]], ["Order accepted"])
+
+
+@override_settings(REALTIME_PG_NOTIFY=True)
+class ListenNotifyTests(TransactionTestCase):
+    """Needs PostgreSQL; NOTIFY is only delivered on commit, hence TransactionTestCase."""
+
+    def setUp(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("LISTEN/NOTIFY needs PostgreSQL")
+        self.broker = realtime.Broker()
+        self.addCleanup(self.broker.stop_listener)
+
+    async def test_notify_from_another_process_wakes_subscriber(self):
+        with self.broker.subscribe(["conversation:7"]) as subscription:
+            await asyncio.sleep(0.5)  # let the listener connect
+
+            def notify(payload):
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_notify(%s, %s)", [realtime.get_pg_channel(), payload])
+
+            await sync_to_async(notify)(f"{realtime.ORIGIN}|conversation:7")  # our own: already woken locally
+            self.assertFalse(await subscription.wait(1))
+            await sync_to_async(notify)("otherprocess|conversation:7")
+            self.assertTrue(await subscription.wait(5))
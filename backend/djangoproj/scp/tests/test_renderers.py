@@ -0,0 +1,94 @@
+import gzip
+import io
+import json
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from scp.middleware import CompressionMiddleware
+from scp.models import User, Supplier, SupplierStaffMembership, Product
+from scp.renderers import FastJSONParser, FastJSONRenderer
+
+
+class FastJSONTests(SimpleTestCase):
+
+    def test_matches_drf_output_for_serializer_data(self):
+        data = {"id": str(uuid.uuid4()), "name": "Milk   é", "price": "10.50", "items": [1, None, True]}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_encodes_raw_values_like_drf_fields(self):
+        value = uuid.uuid4()
+        data = {
+            "id": value,
+            "price": Decimal("10.50"),
+            "at": datetime(2026, 1, 2, 3, 4, 5, 6000, tzinfo=dt_timezone.utc),
+            1: "int key",
+        }
+        self.assertEqual(json.loads(FastJSONRenderer().render(data)), {
+            "id": str(value), "price": "10.50", "at": "2026-01-02T03:04:05.006000Z", "1": "int key",
+        })
+
+    def test_indent_falls_back_to_drf(self):
+        body = FastJSONRenderer().render({"a": 1}, "application/json; indent=2")
+        self.assertEqual(body, b'{\n  "a": 1\n}')
+
+    def test_parser(self):
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(b'{"a": [1, 2]}')), {"a": [1, 2]})
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b'{"a": NaN}'))
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class CompressionMiddlewareTests(SimpleTestCase):
+
+    def respond(self, body, accept_encoding, content_type="application/json"):
+        middleware = CompressionMiddleware(lambda request: HttpResponse(body, content_type=content_type))
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING=accept_encoding)
+        return middleware(request)
+
+    def test_gzip_above_threshold(self):
+        body = json.dumps([{"status": "pending", "note": None}] * 50).encode()
+        response = self.respond(body, "gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), body)
+        self.assertEqual(response["Content-Length"], str(len(response.content)))
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+    def test_small_or_unwanted_bodies_are_untouched(self):
+        body = json.dumps([{"status": "pending"}] * 50).encode()
+        self.assertFalse(self.respond(b'{"ok": true}', "gzip").has_header("Content-Encoding"))
+        self.assertFalse(self.respond(body, "identity").has_header("Content-Encoding"))
+        self.assertFalse(self.respond(body, "gzip;q=0").has_header("Content-Encoding"))
+        self.assertFalse(self.respond(body, "gzip", content_type="image/png").has_header("Content-Encoding"))
+
+    def test_negotiation(self):
+        middleware = CompressionMiddleware(None)
+        middleware.encodings = ["br", "gzip"]
+        self.assertEqual(middleware.choose_encoding("gzip, br"), "br")
+        self.assertEqual(middleware.choose_encoding("gzip;q=1.0, br;q=0.5"), "gzip")
+        self.assertEqual(middleware.choose_encoding("*"), "br")
+        self.assertIsNone(middleware.choose_encoding("deflate"))
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class CompressedApiTests(APITestCase):
+
+    def test_product_list_is_compressed(self):
+        owner = User.objects.create_user(username="owner1", password="pass123", role="owner")
+        supplier = Supplier.objects.create(owner=owner, name="Supplier1")
+        SupplierStaffMembership.objects.create(supplier=supplier, user=owner, role="owner")
+        for i in range(10):
+            Product.objects.create(supplier=supplier, name=f"Product{i}", unit="kg", price=100)
+        self.client.force_authenticate(user=owner)
+
+        resp = self.client.get(reverse("product-list"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        self.assertEqual(len(json.loads(gzip.decompress(resp.content))), 10)
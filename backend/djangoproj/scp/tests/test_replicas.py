@@ -0,0 +1,109 @@
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from scp import replicas
+from scp.models import User, Supplier, SupplierStaffMembership, Product
+from scp.replicas import ReplicaRouter
+
+
+@override_settings(REPLICA_DATABASES=["replica_1", "replica_2"])
+class ReplicaRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.token = replicas.begin_request()
+
+    def tearDown(self):
+        replicas.end_request(self.token)
+
+    def test_reads_stay_on_primary_unless_requested(self):
+        self.assertIsNone(self.router.db_for_read(Product))
+        alias = replicas.use_replica()
+        self.assertIn(alias, ["replica_1", "replica_2"])
+        # the same replica for the whole request
+        self.assertEqual({self.router.db_for_read(Product) for _ in range(20)}, {alias})
+
+    def test_write_switches_request_back_to_primary(self):
+        replicas.use_replica()
+        self.assertEqual(self.router.db_for_write(Product), "default")
+        self.assertIsNone(self.router.db_for_read(Product))
+        self.assertIsNone(replicas.use_replica())
+
+    def test_no_tracking_outside_requests(self):
+        replicas.end_request(self.token)
+        self.token = replicas.begin_request()
+        replicas.end_request(self.token)
+        self.assertIsNone(replicas.use_replica())
+        self.assertIsNone(self.router.db_for_read(Product))
+        self.token = replicas.begin_request()
+
+
+class ReplicaStickinessTests(APITestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username="owner1", password="pass123", role="owner")
+        self.supplier = Supplier.objects.create(owner=self.owner, name="Supplier1")
+        SupplierStaffMembership.objects.create(supplier=self.supplier, user=self.owner, role="owner")
+        self.client.force_authenticate(user=self.owner)
+
+    def test_safe_requests_use_replica_until_user_writes(self):
+        with mock.patch("scp.replicas.use_replica") as use_replica:
+            self.client.get(reverse("product-list"))
+            self.assertEqual(use_replica.call_count, 1)
+
+            resp = self.client.post(
+                reverse("product-list"),
+                {"supplier": str(self.supplier.id), "name": "Milk", "unit": "l", "price": "10.00"},
+                format="json",
+            )
+            self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+            self.assertTrue(replicas.is_pinned(self.owner.pk))
+
+            self.client.get(reverse("product-list"))
+            self.assertEqual(use_replica.call_count, 1)
+
+            cache.clear()  # sticky window over
+            self.client.get(reverse("product-list"))
+            self.assertEqual(use_replica.call_count, 2)
+
+    def test_reads_do_not_pin(self):
+        self.client.get(reverse("product-list"))
+        self.assertFalse(replicas.is_pinned(self.owner.pk))
+
+
+@skipUnless(getattr(settings, "REPLICA_DATABASES", None), "set DB_REPLICA_URLS to test against a second database")
+class ReplicaDatabaseTests(APITestCase):
+    """Runs against a real, separate replica database (nothing replicates into it)."""
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username="owner1", password="pass123", role="owner")
+        self.supplier = Supplier.objects.create(owner=self.owner, name="Supplier1")
+        SupplierStaffMembership.objects.create(supplier=self.supplier, user=self.owner, role="owner")
+        Product.objects.create(supplier=self.supplier, name="Milk", unit="l", price=10)
+        self.client.force_authenticate(user=self.owner)
+
+    def test_list_reads_replica_and_own_writes_read_primary(self):
+        # the replica is empty, so a replica read cannot see the product
+        self.assertEqual(self.client.get(reverse("product-list")).data, [])
+
+        resp = self.client.post(
+            reverse("product-list"),
+            {"supplier": str(self.supplier.id), "name": "Salt", "unit": "kg", "price": "2.00"},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        names = sorted(p["name"] for p in self.client.get(reverse("product-list")).data)
+        self.assertEqual(names, ["Milk", "Salt"])
+
+    def test_unrouted_views_read_primary(self):
+        resp = self.client.get(reverse("supplier-detail", args=[self.supplier.id]))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
@@ -0,0 +1,141 @@
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from scp import search
+from scp.models import Conversation, Message
+from scp.tests.test_async_views import make_conversation
+
+
+class HelperTests(SimpleTestCase):
+
+    def test_fts5_query_quotes_words(self):
+        self.assertEqual(search.fts5_query('late "delivery" OR -refund*'), '"late" "delivery" "OR" "refund"')
+        self.assertIsNone(search.fts5_query("?! -"))
+
+    def test_highlight_escapes_message_text(self):
+        headline = f"<b>the {search.START}delivery{search.STOP}</b>"
+        self.assertEqual(search.highlight(headline), "&lt;b&gt;the <mark>delivery</mark>&lt;/b&gt;")
+        self.assertEqual(search.highlight(None), "")
+
+
+class IndexMaintenanceTests(TestCase):
+    """The index follows inserts, edits and deletes without any application code."""
+
+    def setUp(self):
+        make_conversation(self)
+
+    def found(self, text):
+        return list(search.search_messages(Message.objects.all(), text).values_list("pk", flat=True))
+
+    def test_insert_update_delete(self):
+        message = Message.objects.create(conversation=self.conversation, sender=self.owner, text="Pallets arrived")
+        self.assertEqual(self.found("pallet"), [message.pk])
+
+        message.text = "Crates arrived"
+        message.save()
+        self.assertEqual(self.found("pallet"), [])
+        self.assertEqual(self.found("crates"), [message.pk])
+
+        message.delete()
+        self.assertEqual(self.found("crates"), [])
+
+    def test_index_survives_the_migrations(self):
+        # invisible to migration state: a later migration that rebuilds scp_message can drop them
+        with connection.cursor() as cursor:
+            if connection.vendor == "sqlite":
+                cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'scp_message'")
+                expected = {"scp_message_fts_insert", "scp_message_fts_delete", "scp_message_fts_update"}
+            elif connection.vendor == "postgresql":
+                cursor.execute(
+                    "SELECT column_name FROM information_schema.columns "
+                    "WHERE table_name = 'scp_message' AND column_name = 'search_vector'"
+                )
+                expected = {"search_vector"}
+            else:
+                self.skipTest("no search index on this database")
+            self.assertEqual({row[0] for row in cursor.fetchall()}, expected)
+
+
+class MessageSearchTests(APITestCase):
+
+    def setUp(self):
+        make_conversation(self)
+        self.url = reverse("message-search")
+        texts = [
+            "The delivery is late",
+            "Late delivery again, the second late delivery this week",
+            "Invoice attached",
+            "<script>alert('delivery')</script>",
+        ]
+        self.messages = [
+            Message.objects.create(conversation=self.conversation, sender=self.contact_user, text=text) for text in texts
+        ]
+        other = Conversation.objects.create(consumer_contact=self.conversation.consumer_contact)
+        Message.objects.create(conversation=other, sender=self.owner, text="delivery for someone else")
+        # the contact takes part in both; the owner's staff membership is only on the first
+        self.other = other
+
+    def search(self, user, **params):
+        self.client.force_authenticate(user=user)
+        return self.client.get(self.url, params)
+
+    def test_ranked_and_highlighted(self):
+        resp = self.search(self.owner, q="late deliveries")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        results = resp.json()["results"]
+        # both words, and more often, ranks first
+        self.assertEqual([r["id"] for r in results], [self.messages[1].pk, self.messages[0].pk])
+        self.assertGreater(results[0]["rank"], results[1]["rank"])
+        self.assertIn("<mark>delivery</mark>", results[1]["highlight"])
+        self.assertEqual(results[0]["conversation"], self.conversation.pk)
+        self.assertEqual(results[0]["sender_name"], "contact1")
+
+    def test_scoped_to_own_conversations(self):
+        resp = self.search(self.owner, q="delivery")
+        self.assertNotIn(self.other.pk, {r["conversation"] for r in resp.json()["results"]})
+        self.assertEqual(len(self.search(self.contact_user, q="delivery").json()["results"]), 4)
+        self.assertEqual(self.search(self.outsider, q="delivery").json()["results"], [])
+
+    def test_one_conversation(self):
+        resp = self.search(self.contact_user, q="delivery", conversation=self.other.pk)
+        self.assertEqual([r["conversation"] for r in resp.json()["results"]], [self.other.pk])
+        resp = self.search(self.owner, q="delivery", conversation=self.other.pk)
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_highlight_is_escaped(self):
+        resp = self.search(self.owner, q="alert")
+        self.assertEqual(
+            resp.json()["results"][0]["highlight"],
+            "&lt;script&gt;<mark>alert</mark>(&#x27;delivery&#x27;)&lt;/script&gt;",
+        )
+
+    def test_pagination(self):
+        resp = self.search(self.contact_user, q="delivery", limit=3)
+        first = resp.json()
+        self.assertEqual((len(first["results"]), first["next_offset"]), (3, 3))
+        second = self.search(self.contact_user, q="delivery", limit=3, offset=first["next_offset"]).json()
+        self.assertEqual((len(second["results"]), second["next_offset"]), (1, None))
+        ids = [r["id"] for r in first["results"] + second["results"]]
+        self.assertEqual(len(set(ids)), 4)
+
+    def test_query_syntax_is_not_an_error(self):
+        for q in ['"delivery', "delivery OR", "-", "late AND NOT invoice*"]:
+            with self.subTest(q):
+                self.assertEqual(self.search(self.owner, q=q).status_code, status.HTTP_200_OK)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.search(self.owner).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.search(self.owner, q=" ").status_code, status.HTTP_400_BAD_REQUEST)
+        for params in ({"limit": "x"}, {"limit": 0}, {"offset": -1}, {"offset": 100000}, {"conversation": "x"}):
+            with self.subTest(params):
+                resp = self.search(self.owner, q="delivery", **params)
+                self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_uses_the_search_index(self):
+        self.client.force_authenticate(user=self.owner)
+        with self.assertNumQueries(1) as ctx:
+            self.client.get(self.url, {"q": "delivery"})
+        sql = ctx.captured_queries[0]["sql"]
+        self.assertIn("search_vector @@" if connection.vendor == "postgresql" else "scp_message_fts MATCH", sql)
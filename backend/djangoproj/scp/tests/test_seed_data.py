@@ -0,0 +1,43 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import F
+from django.test import TestCase
+from scp.models import Order, OrderItem, Product, SupplierConsumerLink, User
+
+
+class SeedDataCommandTests(TestCase):
+
+    def seed(self, *args):
+        out = StringIO()
+        call_command("seed_data", "--suppliers", "3", "--consumers", "10", "--products", "20", "--orders", "4",
+                     *args, stdout=out)
+        return out.getvalue()
+
+    def test_seeds_linked_catalog_and_orders(self):
+        output = self.seed("--seed", "7")
+        self.assertIn("Log in as seed_owner0", output)
+        self.assertEqual(User.objects.filter(username__startswith="seed_contact").count(), 10)
+        self.assertTrue(User.objects.get(username="seed_contact0").check_password("perf-pass-123"))
+
+        # every order goes to a supplier the consumer is linked with, for that supplier's products
+        links = set(SupplierConsumerLink.objects.values_list("supplier_id", "consumer_id"))
+        self.assertTrue(Order.objects.exists())
+        for supplier_id, consumer_id in Order.objects.values_list("supplier_id", "consumer_id"):
+            self.assertIn((supplier_id, consumer_id), links)
+        self.assertFalse(OrderItem.objects.exclude(product__supplier=F("order__supplier")).exists())
+
+    def test_same_seed_same_data(self):
+        self.seed("--seed", "7", "--prefix", "a")
+        self.seed("--seed", "7", "--prefix", "b")
+        prices = lambda prefix: list(
+            Product.objects.filter(supplier__name__startswith=f"{prefix} ").order_by("supplier__name", "name")
+            .values_list("name", "price")
+        )
+        self.assertEqual(prices("a"), prices("b"))
+
+    def test_refuses_existing_prefix(self):
+        self.seed("--uniform")
+        with self.assertRaises(CommandError):
+            self.seed("--uniform")
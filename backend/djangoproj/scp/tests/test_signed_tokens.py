@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+from django.core import signing
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from scp.authentication import ACCESS_SALT, build_claims, local_cache, user_from_claims
+from scp.models import User, Supplier, SupplierStaffMembership, Product
+from scp.permissions import IsOwnerOrManager, IsSupplierStaff
+
+
+@override_settings(SIGNED_TOKENS_ENABLED=True, THROTTLE_ENABLED=False)
+class SignedAccessTokenTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.owner = User.objects.create_user(username="owner1", password="pass123", role="owner", email="o@example.com")
+        self.supplier = Supplier.objects.create(owner=self.owner, name="Supplier1")
+        SupplierStaffMembership.objects.create(supplier=self.supplier, user=self.owner, role="owner")
+        self.other_supplier = Supplier.objects.create(name="Supplier2")
+        self.product = Product.objects.create(supplier=self.supplier, name="Product1", unit="kg", price=100)
+
+    def login(self):
+        resp = self.client.post(reverse("user-login"), {"username": "owner1", "password": "pass123"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp.data
+
+    def test_login_returns_token_and_signed_pair(self):
+        data = self.login()
+        self.assertIn("token", data)
+        self.assertIn("access", data)
+        self.assertIn("refresh", data)
+
+        claims = signing.loads(data["access"], salt=ACCESS_SALT)
+        self.assertEqual(claims["uid"], str(self.owner.pk))
+        self.assertEqual(claims["role"], "owner")
+        self.assertEqual(claims["sup"], {str(self.supplier.pk): "owner"})
+
+    def test_bearer_token_authenticates(self):
+        data = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {data['access']}")
+        resp = self.client.get(reverse("user-me"))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data["email"], "o@example.com")
+
+    def test_legacy_token_still_works(self):
+        data = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {data['token']}")
+        self.assertEqual(self.client.get(reverse("user-me")).status_code, status.HTTP_200_OK)
+
+    def test_tampered_access_token_is_rejected(self):
+        data = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {data['access']}x")
+        self.assertEqual(self.client.get(reverse("user-me")).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_permissions_answered_from_claims_without_queries(self):
+        user = user_from_claims(build_claims(self.owner))
+        request = SimpleNamespace(user=user, method="POST")
+        with self.assertNumQueries(0):
+            self.assertTrue(IsSupplierStaff().has_object_permission(request, None, self.product))
+            self.assertTrue(IsOwnerOrManager().has_object_permission(request, None, self.supplier))
+            self.assertFalse(IsOwnerOrManager().has_object_permission(request, None, self.other_supplier))
+
+    def test_refresh_issues_new_access_token(self):
+        data = self.login()
+        resp = self.client.post(reverse("user-refresh"), {"refresh": data["refresh"]}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertIn("access", resp.data)
+
+    def test_refresh_token_dies_with_logout(self):
+        data = self.login()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {data['token']}")
+        self.client.post(reverse("user-logout"))
+        self.client.credentials()
+        resp = self.client.post(reverse("user-refresh"), {"refresh": data["refresh"]}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_claims_user_is_read_only(self):
+        user = user_from_claims(build_claims(self.owner))
+        with self.assertRaises(TypeError):
+            user.save()
+
+    @override_settings(SIGNED_TOKENS_ENABLED=False)
+    def test_disabled_mode_ignores_bearer_tokens(self):
+        access = signing.dumps(build_claims(self.owner), salt=ACCESS_SALT, compress=True)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(self.client.get(reverse("user-me")).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertNotIn("access", self.login())
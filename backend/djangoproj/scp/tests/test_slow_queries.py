@@ -0,0 +1,113 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from scp import slow_queries
+from scp.models import User, Supplier, SupplierStaffMembership, Product
+
+
+class FingerprintTests(SimpleTestCase):
+
+    def test_same_shape_same_fingerprint(self):
+        a = 'SELECT "p"."id" FROM "p" WHERE "p"."id" IN (%s, %s, %s) AND "p"."name" = \'Milk\' LIMIT 21'
+        b = 'SELECT  "p"."id" FROM "p"\n WHERE "p"."id" IN (%s) AND "p"."name" = \'Rice\' LIMIT 5'
+        self.assertEqual(slow_queries.fingerprint(a), slow_queries.fingerprint(b))
+        self.assertEqual(slow_queries.normalize(a), 'SELECT "p"."id" FROM "p" WHERE "p"."id" IN (...) AND "p"."name" = ? LIMIT ?')
+
+    def test_different_shape_different_fingerprint(self):
+        self.assertNotEqual(
+            slow_queries.fingerprint('SELECT "id" FROM "p" WHERE "name" = %s'),
+            slow_queries.fingerprint('SELECT "id" FROM "p" WHERE "unit" = %s'),
+        )
+
+    def test_buffer_keeps_most_recently_seen(self):
+        buffer = slow_queries.SlowQueryBuffer(size=2)
+        for fp in ("a", "b", "a", "c"):
+            buffer.add(fp, 0.2, f"SELECT {fp}", (), "default", None, "")
+        self.assertEqual(list(buffer.entries), ["a", "c"])
+        self.assertEqual(buffer.entries["a"]["count"], 2)
+        self.assertAlmostEqual(buffer.entries["a"]["total_ms"], 400)
+
+
+@override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+class SlowQueryLogTests(APITestCase):
+
+    def setUp(self):
+        buffer = mock.patch.object(slow_queries, "buffer", slow_queries.SlowQueryBuffer())
+        self.buffer = buffer.start()
+        self.addCleanup(buffer.stop)
+
+        self.owner = User.objects.create_user(username="owner1", password="pass123", role="owner")
+        self.supplier = Supplier.objects.create(owner=self.owner, name="Supplier1")
+        SupplierStaffMembership.objects.create(supplier=self.supplier, user=self.owner, role="owner")
+        for name in ("Milk", "Salt", "Rice"):
+            Product.objects.create(supplier=self.supplier, name=name, unit="kg", price=10)
+        self.admin = User.objects.create_superuser(username="root", password="pass123", email="root@example.com")
+
+    def product_entries(self):
+        return [entry for entry in self.buffer.snapshot() if 'FROM "scp_product"' in entry["sql"]]
+
+    def test_records_view_action_plan_and_deduplicates(self):
+        self.client.force_authenticate(user=self.owner)
+        self.client.get(reverse("product-list"))
+        self.client.get(reverse("product-list"))
+
+        entries = self.product_entries()  # the page count and the page itself
+        self.assertTrue(entries)
+        for entry in entries:
+            self.assertEqual(entry["count"], 2)
+            self.assertEqual(entry["views"], {"ProductViewSet.list": 2})
+            self.assertTrue(entry["origin"].startswith("scp/"), entry["origin"])
+            self.assertTrue(entry["plan"])
+            self.assertEqual(entry["database"], "default")
+
+    def secret_lookup(self):
+        with connection.execute_wrapper(slow_queries.SlowQueryLog(0)):
+            list(User.objects.filter(password="pbkdf2_sha256$secret-hash"))
+        return [entry for entry in self.buffer.snapshot() if 'FROM "auth_user"' in entry["sql"]][0]
+
+    def test_parameters_are_not_kept(self):
+        entry = self.secret_lookup()
+        self.assertEqual(entry["sql"], entry["normalized"])
+        self.assertEqual(entry["params"], "")
+        self.assertTrue(entry["plan"])
+        self.assertNotIn("secret-hash", str(entry))
+
+    @override_settings(SLOW_QUERY_CAPTURE_PARAMS=True)
+    def test_parameters_kept_on_request(self):
+        self.assertIn("secret-hash", self.secret_lookup()["params"])
+
+    def test_explain_does_not_break_the_transaction(self):
+        self.client.force_authenticate(user=self.owner)
+        self.client.get(reverse("product-list"))
+        self.assertTrue(connection.in_atomic_block)
+        self.assertEqual(Product.objects.count(), 3)
+
+    def test_writes_are_logged_without_plan(self):
+        self.client.force_authenticate(user=self.owner)
+        resp = self.client.patch(reverse("product-detail", args=[Product.objects.first().pk]), {"price": "12.00"})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        updates = [entry for entry in self.buffer.snapshot() if entry["sql"].startswith("UPDATE")]
+        self.assertTrue(updates)
+        self.assertEqual(updates[0]["plan"], "")
+        self.assertIn("ProductViewSet.partial_update", updates[0]["views"])
+
+    def test_admin_page_lists_and_clears(self):
+        self.client.force_authenticate(user=self.owner)
+        self.client.get(reverse("product-list"))
+        self.client.force_authenticate(user=None)
+
+        url = reverse("admin-slow-queries")
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_302_FOUND)  # to the admin login
+
+        self.client.force_login(self.admin)
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertContains(resp, self.product_entries()[0]["fingerprint"])
+        self.assertContains(resp, "ProductViewSet.list")
+
+        self.client.post(url)
+        self.assertEqual(self.buffer.snapshot(), [])
@@ -0,0 +1,115 @@
+from unittest.mock import patch
+
+from django.db import DatabaseError, IntegrityError
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from scp.models import User, Supplier, SupplierStaffMembership, Consumer
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class StaffInviteTests(APITestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner1", password="pass123", role="owner")
+        self.supplier = Supplier.objects.create(owner=self.owner, name="Supplier1")
+        SupplierStaffMembership.objects.create(supplier=self.supplier, user=self.owner, role="owner")
+        self.client.force_authenticate(user=self.owner)
+        self.url = reverse("supplier-invite-staff", args=[self.supplier.id])
+
+    def test_invite_fifty_sales_reps_in_one_request(self):
+        staff = [{"username": f"rep{i}", "email": f"rep{i}@example.com"} for i in range(50)]
+        # supplier, permission, username check, 2 bulk INSERTs (+ SAVEPOINT/RELEASE inside the test transaction)
+        with self.assertNumQueries(7):
+            resp = self.client.post(self.url, {"staff": staff}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(resp.data["created"]), 50)
+        self.assertEqual(
+            SupplierStaffMembership.objects.filter(supplier=self.supplier, role="sales").count(), 50
+        )
+        self.assertFalse(User.objects.get(username="rep0").has_usable_password())
+
+    def test_invited_user_sets_password_with_token(self):
+        resp = self.client.post(self.url, {"staff": [{"username": "mgr", "role": "manager"}]}, format="json")
+        created = resp.data["created"][0]
+
+        self.client.force_authenticate(user=None)
+        resp = self.client.post(reverse("user-set-password"), {
+            "uid": str(created["id"]), "token": created["password_setup_token"], "password": "Str0ngPass!",
+        }, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertTrue(User.objects.get(username="mgr").check_password("Str0ngPass!"))
+
+        # the token is single-use: it is bound to the old (unusable) password hash
+        resp = self.client.post(reverse("user-set-password"), {
+            "uid": str(created["id"]), "token": created["password_setup_token"], "password": "other",
+        }, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invite_with_taken_username_creates_nothing(self):
+        resp = self.client.post(self.url, {"staff": [{"username": "new1"}, {"username": "owner1"}]}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(User.objects.filter(username="new1").exists())
+
+    @override_settings(STAFF_INVITE_MAX=3)
+    def test_invite_size_is_capped(self):
+        staff = [{"username": f"rep{i}"} for i in range(4)]
+        resp = self.client.post(self.url, {"staff": staff}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(User.objects.filter(username="rep0").exists())
+
+    def test_weak_passwords_are_refused(self):
+        resp = self.client.post(self.url, {"staff": [{"username": "rep1", "password": "12345678"}]}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("password", resp.data[0])
+        self.assertFalse(User.objects.filter(username="rep1").exists())
+
+        created = self.client.post(self.url, {"staff": [{"username": "mgr"}]}, format="json").data["created"][0]
+        self.client.force_authenticate(user=None)
+        resp = self.client.post(reverse("user-set-password"), {
+            "uid": str(created["id"]), "token": created["password_setup_token"], "password": "password",
+        }, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("password", resp.data)
+        self.assertFalse(User.objects.get(username="mgr").has_usable_password())
+
+    def test_username_taken_concurrently_is_a_validation_error(self):
+        with patch("scp.views.User.objects.bulk_create", side_effect=IntegrityError("duplicate username")):
+            resp = self.client.post(self.url, {"staff": [{"username": "new1"}]}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("staff", resp.data)
+
+    def test_non_staff_cannot_invite(self):
+        outsider = User.objects.create_user(username="x", password="pass123", role="sales")
+        self.client.force_authenticate(user=outsider)
+        resp = self.client.post(self.url, {"staff": [{"username": "new1"}]}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class AtomicRegistrationTests(APITestCase):
+
+    def test_failure_after_user_insert_leaves_no_orphans(self):
+        payload = {
+            "username": "consumer1",
+            "password": "pass123",
+            "role": "consumer_contact",
+            "consumer_name": "Cafe",
+        }
+        with patch("scp.views.ConsumerContact.objects.create", side_effect=DatabaseError("boom")):
+            with self.assertRaises(DatabaseError):
+                self.client.post(reverse("user-register"), payload, format="json")
+        self.assertFalse(User.objects.filter(username="consumer1").exists())
+        self.assertFalse(Consumer.objects.filter(name="Cafe").exists())
+
+    def test_missing_consumer_name_creates_no_user(self):
+        payload = {"username": "consumer2", "password": "pass123", "role": "consumer_contact"}
+        resp = self.client.post(reverse("user-register"), payload, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(User.objects.filter(username="consumer2").exists())
+
+    def test_invalid_supplier_id_is_a_validation_error(self):
+        payload = {"username": "s1", "password": "pass123", "role": "sales", "supplier_id": "not-a-uuid"}
+        resp = self.client.post(reverse("user-register"), payload, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
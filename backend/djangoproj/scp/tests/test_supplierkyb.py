@@ -69,7 +69,9 @@ class SupplierKYBTests(APITestCase):
         self.assertEqual(doc.supplier, self.supplier)
         self.assertEqual(doc.uploaded_by, self.owner)
         self.assertEqual(doc.note, "Company registration certificate")
-        self.assertTrue(doc.document.name.startswith("kyb"))
+        # stored under its content hash (scp/storage.py)
+        self.assertTrue(doc.document.name.startswith("blobs/"))
+        self.assertTrue(doc.document.name.endswith(".pdf"))
 
     # ---------------------------------------------------------
     # 2) Non-staff cannot upload KYB
@@ -0,0 +1,189 @@
+from datetime import timedelta
+
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from scp.models import (
+    User, Supplier, Consumer, SupplierStaffMembership, ConsumerContact, SupplierConsumerLink,
+    CatalogCategory, Product, Order, Conversation, Message, SyncTombstone
+)
+from scp.order_states import apply_transition
+from scp.sync import purge_tombstones
+
+
+class DeltaSyncTests(APITestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner1", password="pass123", role="owner")
+        self.supplier = Supplier.objects.create(owner=self.owner, name="Supplier1")
+        self.sales_user = User.objects.create_user(username="sales1", password="pass123", role="sales")
+        self.membership = SupplierStaffMembership.objects.create(
+            supplier=self.supplier, user=self.sales_user, role="sales", is_active=True
+        )
+
+        self.consumer_user = User.objects.create_user(username="consumer1", password="pass123", role="consumer_contact")
+        self.consumer = Consumer.objects.create(name="Consumer1")
+        self.contact = ConsumerContact.objects.create(consumer=self.consumer, user=self.consumer_user, is_primary=True)
+        SupplierConsumerLink.objects.create(supplier=self.supplier, consumer=self.consumer, status="approved")
+
+        self.category = CatalogCategory.objects.create(supplier=self.supplier, name="Dairy", slug="dairy")
+        self.product = Product.objects.create(supplier=self.supplier, category=self.category, name="Milk", unit="l", price=10, stock=20)
+        self.order = Order.objects.create(supplier=self.supplier, consumer=self.consumer, placed_by=self.consumer_user)
+        self.order.items.create(product=self.product, quantity=2, unit_price=10, line_total=20)
+        self.conversation = Conversation.objects.create(consumer_contact=self.contact)
+        self.conversation.supplier_staff.add(self.membership)
+
+        # unrelated tenant
+        other_owner = User.objects.create_user(username="owner2", password="pass123", role="owner")
+        self.other_supplier = Supplier.objects.create(owner=other_owner, name="Supplier2")
+        Product.objects.create(supplier=self.other_supplier, name="Secret", unit="kg", price=1)
+
+        self.url = reverse("sync-list")
+
+    def sync(self, since=None):
+        params = {"since": since} if since else {}
+        resp = self.client.get(self.url, params)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK, resp.data)
+        return resp.data
+
+    def test_full_sync_returns_visible_rows_only(self):
+        self.client.force_authenticate(user=self.consumer_user)
+        data = self.sync()
+        self.assertTrue(data["full"])
+        self.assertEqual([p["name"] for p in data["products"]], ["Milk"])
+        self.assertEqual([c["slug"] for c in data["categories"]], ["dairy"])
+        self.assertEqual([str(o["id"]) for o in data["orders"]], [str(self.order.id)])
+        self.assertEqual([c["id"] for c in data["conversations"]], [self.conversation.id])
+
+    def test_delta_contains_only_changes_and_tombstones(self):
+        self.client.force_authenticate(user=self.sales_user)
+        since = timezone.now().isoformat()
+
+        apply_transition(self.order, "accept", actor=self.sales_user)
+        self.conversation.messages.create(sender=self.sales_user, text="hi")
+        Product.objects.create(supplier=self.supplier, name="Butter", unit="kg", price=5)
+        deleted_id = str(self.category.id)
+        self.category.delete()
+
+        data = self.sync(since)
+        self.assertFalse(data["full"])
+        # Milk: stock decremented by accept, and its category was deleted (SET_NULL)
+        self.assertEqual(sorted(p["name"] for p in data["products"]), ["Butter", "Milk"])
+        self.assertEqual([o["status"] for o in data["orders"]], ["in_progress"])
+        self.assertEqual(len(data["conversations"]), 1)
+        self.assertNotIn("messages", data["conversations"][0])
+        self.assertEqual([m["text"] for m in data["messages"]], ["hi"])
+        self.assertEqual(data["messages"][0]["conversation"], self.conversation.id)
+        self.assertEqual(data["categories"], [])
+        self.assertEqual(data["deleted"]["categories"], [deleted_id])
+
+    def test_messages_are_a_source_of_their_own(self):
+        old = self.conversation.messages.create(sender=self.consumer_user, text="old")
+        Message.objects.filter(pk=old.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        since = timezone.now().isoformat()
+        new = self.conversation.messages.create(sender=self.sales_user, text="new")
+
+        self.client.force_authenticate(user=self.consumer_user)
+        data = self.sync(since)
+        self.assertEqual([m["id"] for m in data["messages"]], [new.id])
+
+        old_id = str(old.pk)
+        old.delete()
+        self.assertEqual(self.sync(since)["deleted"]["messages"], [old_id])
+        # not a participant
+        self.client.force_authenticate(user=User.objects.get(username="owner2"))
+        data = self.sync(since)
+        self.assertEqual((data["messages"], data["deleted"]["messages"]), ([], []))
+
+    def test_categories_of_suppliers_without_visible_products(self):
+        self.product.delete()
+        self.client.force_authenticate(user=self.consumer_user)
+        self.assertEqual([c["slug"] for c in self.sync()["categories"]], ["dairy"])
+
+    def test_losing_access_sends_tombstones(self):
+        link = SupplierConsumerLink.objects.get(supplier=self.supplier, consumer=self.consumer)
+        since = timezone.now().isoformat()
+        link.block(by=self.sales_user)
+
+        self.client.force_authenticate(user=self.consumer_user)
+        data = self.sync(since)
+        self.assertEqual(data["deleted"]["products"], [str(self.product.id)])
+        self.assertEqual(data["deleted"]["categories"], [str(self.category.id)])
+        # the supplier's staff still see the catalog
+        self.client.force_authenticate(user=self.sales_user)
+        self.assertEqual(self.sync(since)["deleted"]["products"], [])
+
+        # approved again within the same window: sent again, and no longer as deleted
+        link.approve(approver=self.sales_user)
+        self.client.force_authenticate(user=self.consumer_user)
+        data = self.sync(since)
+        self.assertEqual([p["name"] for p in data["products"]], ["Milk"])
+        self.assertEqual(data["deleted"]["products"], [])
+
+    def test_gaining_access_sends_the_catalog_to_that_consumer_only(self):
+        newcomer_user = User.objects.create_user(username="consumer2", password="pass123", role="consumer_contact")
+        newcomer = Consumer.objects.create(name="Consumer2")
+        ConsumerContact.objects.create(consumer=newcomer, user=newcomer_user, is_primary=True)
+        link = SupplierConsumerLink.objects.create(supplier=self.supplier, consumer=newcomer)
+        since = timezone.now().isoformat()
+        touched = self.product.updated_at
+        link.approve(approver=self.sales_user)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.updated_at, touched)
+        self.client.force_authenticate(user=newcomer_user)
+        data = self.sync(since)
+        self.assertEqual([p["name"] for p in data["products"]], ["Milk"])
+        self.assertEqual([c["slug"] for c in data["categories"]], ["dairy"])
+        for user in (self.consumer_user, self.sales_user):
+            self.client.force_authenticate(user=user)
+            data = self.sync(since)
+            self.assertEqual((data["products"], data["categories"]), ([], []))
+
+    def test_unchanged_delta_is_empty(self):
+        self.client.force_authenticate(user=self.sales_user)
+        since = (timezone.now() + timedelta(seconds=1)).isoformat()
+        data = self.sync(since)
+        for key in ("products", "categories", "orders", "conversations", "messages"):
+            self.assertEqual(data[key], [])
+            self.assertEqual(data["deleted"][key], [])
+
+    def test_tombstones_are_scoped(self):
+        since = timezone.now().isoformat()
+        Product.objects.filter(supplier=self.other_supplier).delete()
+        order_id = str(self.order.id)
+        self.order.delete()
+
+        self.client.force_authenticate(user=self.consumer_user)
+        data = self.sync(since)
+        self.assertEqual(data["deleted"]["products"], [])
+        self.assertEqual(data["deleted"]["orders"], [order_id])
+
+        # another consumer linked to the same supplier does not learn about the order
+        other_user = User.objects.create_user(username="consumer2", password="pass123", role="consumer_contact")
+        other_consumer = Consumer.objects.create(name="Consumer2")
+        ConsumerContact.objects.create(consumer=other_consumer, user=other_user, is_primary=True)
+        SupplierConsumerLink.objects.create(supplier=self.supplier, consumer=other_consumer, status="approved")
+        self.client.force_authenticate(user=other_user)
+        self.assertEqual(self.sync(since)["deleted"]["orders"], [])
+
+    def test_old_or_invalid_watermark(self):
+        self.client.force_authenticate(user=self.sales_user)
+        old = (timezone.now() - timedelta(days=365)).isoformat()
+        self.assertTrue(self.sync(old)["full"])
+
+        resp = self.client.get(self.url, {"since": "yesterday"})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_watermark_round_trips(self):
+        self.client.force_authenticate(user=self.sales_user)
+        watermark = self.sync()["watermark"]
+        self.assertTrue(watermark.endswith("Z"))
+        # everything was written within the watermark lag, so it is sent again
+        self.assertEqual(len(self.sync(watermark)["products"]), 1)
+
+    def test_purge_tombstones(self):
+        self.product.delete()
+        SyncTombstone.objects.update(deleted_at=timezone.now() - timedelta(days=60))
+        self.assertEqual(purge_tombstones(), 1)
@@ -0,0 +1,95 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from scp import throttling
+from scp.models import User
+from scp.throttling import CacheBucketStore, InMemoryBucketStore, parse_rate
+
+TEST_RATES = dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={
+    'auth': '3/min', 'catalog': '2/min', 'order_write': '60/min', 'chat': '120/min',
+})
+
+
+class BucketStoreTests(SimpleTestCase):
+
+    def check_store(self, store):
+        capacity, refill = parse_rate("2/s")
+        self.assertTrue(store.consume("k", capacity, refill, now=100.0)[0])
+        self.assertTrue(store.consume("k", capacity, refill, now=100.0)[0])
+        allowed, _, wait = store.consume("k", capacity, refill, now=100.0)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 0.5)
+        # half a second refills one token
+        self.assertTrue(store.consume("k", capacity, refill, now=100.5)[0])
+        # other keys have their own bucket
+        self.assertTrue(store.consume("other", capacity, refill, now=100.5)[0])
+
+    def test_in_memory_store(self):
+        self.check_store(InMemoryBucketStore())
+
+    def test_in_memory_store_keeps_the_most_recent_buckets(self):
+        store = InMemoryBucketStore(max_buckets=2)
+        capacity, refill = parse_rate("1/min")
+        for key in ("a", "b", "a", "c"):
+            store.consume(key, capacity, refill, now=100.0)
+        self.assertEqual(list(store._buckets), ["a", "c"])
+        # "a" kept its empty bucket
+        self.assertFalse(store.consume("a", capacity, refill, now=100.0)[0])
+
+    def test_cache_store(self):
+        cache.clear()
+        self.check_store(CacheBucketStore())
+
+
+@override_settings(THROTTLE_ENABLED=True, REST_FRAMEWORK=TEST_RATES)
+class TokenBucketThrottleTests(APITestCase):
+
+    def setUp(self):
+        throttling.reset_store()
+        self.user = User.objects.create_user(username="consumer1", password="pass123", role="consumer_contact")
+
+    def tearDown(self):
+        throttling.reset_store()
+
+    def test_catalog_reads_are_limited_per_user_with_headers(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse("product-list")
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first["RateLimit-Limit"], "2")
+        self.assertEqual(first["RateLimit-Remaining"], "1")
+
+        self.client.get(url)
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn("Retry-After", resp)
+        self.assertEqual(resp["RateLimit-Remaining"], "0")
+
+        # another user has a separate bucket
+        other = User.objects.create_user(username="consumer2", password="pass123", role="consumer_contact")
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    def test_scopes_are_independent(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get(reverse("product-list"))
+        self.client.get(reverse("product-list"))
+        # chat has its own bucket
+        self.assertEqual(self.client.get(reverse("conversation-list")).status_code, status.HTTP_200_OK)
+
+    def test_anonymous_auth_calls_limited_by_ip(self):
+        url = reverse("user-login")
+        for _ in range(3):
+            self.client.post(url, {"username": "nobody", "password": "x"}, format="json")
+        resp = self.client.post(url, {"username": "consumer1", "password": "pass123"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_unscoped_endpoints_are_not_throttled(self):
+        self.client.force_authenticate(user=self.user)
+        for _ in range(5):
+            resp = self.client.get(reverse("notification-list"))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertNotIn("RateLimit-Limit", resp)
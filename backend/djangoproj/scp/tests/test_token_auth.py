@@ -0,0 +1,136 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from scp.authentication import CachedTokenAuthentication, local_cache
+from scp.models import User
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class CachedTokenAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = User.objects.create_user(username="owner1", password="pass123", role="owner")
+
+    def login(self):
+        resp = self.client.post(reverse("user-login"), {"username": "owner1", "password": "pass123"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp.data["token"]
+
+    def use(self, key):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {key}")
+        return self.client.get(reverse("user-me"))
+
+    def test_steady_state_requests_do_not_query_token_table(self):
+        key = self.login()
+        self.assertEqual(self.use(key).status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            resp = self.use(key)
+        self.assertEqual(resp.data["username"], "owner1")
+
+    def test_shared_cache_serves_other_processes(self):
+        key = self.login()
+        self.use(key)
+        local_cache.clear()  # as seen from a fresh worker
+        with self.assertNumQueries(0):
+            self.assertEqual(self.use(key).status_code, status.HTTP_200_OK)
+
+    def test_requests_do_not_share_the_cached_user(self):
+        key = self.login()
+        auth = CachedTokenAuthentication()
+        first, _ = auth.authenticate_credentials(key)
+        first.role = "platform_admin"
+        first._cached_memberships = ["leaked"]
+        second, _ = auth.authenticate_credentials(key)
+        self.assertIsNot(second, first)
+        self.assertEqual(second.role, "owner")
+        self.assertFalse(hasattr(second, "_cached_memberships"))
+
+    def test_login_rotates_token(self):
+        first = self.login()
+        second = self.login()
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.use(first).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.use(second).status_code, status.HTTP_200_OK)
+
+    def test_logout_revokes_cached_token(self):
+        key = self.login()
+        self.use(key)
+        resp = self.client.post(reverse("user-logout"))
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.use(key).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(TOKEN_TTL=timedelta(hours=2), TOKEN_REFRESH_INTERVAL=timedelta(hours=1))
+    def test_expired_token_is_rejected_and_deleted(self):
+        key = self.login()
+        Token.objects.filter(key=key).update(created=timezone.now() - timedelta(hours=3))
+        self.assertEqual(self.use(key).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertFalse(Token.objects.filter(key=key).exists())
+
+    @override_settings(TOKEN_TTL=timedelta(hours=2), TOKEN_REFRESH_INTERVAL=timedelta(hours=1))
+    def test_expiry_slides_while_token_is_used(self):
+        key = self.login()
+        old = timezone.now() - timedelta(minutes=90)
+        Token.objects.filter(key=key).update(created=old)
+        self.assertEqual(self.use(key).status_code, status.HTTP_200_OK)
+        self.assertGreater(Token.objects.get(key=key).created, old)
+
+    def test_deactivating_user_invalidates_cache(self):
+        key = self.login()
+        self.use(key)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.use(key).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_bulk_revocation_command(self):
+        other = User.objects.create_user(username="consumer1", password="pass123", role="consumer_contact")
+        Token.objects.create(user=other)
+        key = self.login()
+        self.use(key)
+
+        out = StringIO()
+        call_command("revoke_tokens", "--role", "owner", stdout=out)
+        self.assertIn("Revoked 1 token(s).", out.getvalue())
+        self.assertEqual(self.use(key).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertTrue(Token.objects.filter(user=other).exists())
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class LoginAttemptLimitTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(username="owner1", password="pass123", role="owner")
+
+    def attempt(self, password):
+        return self.client.post(reverse("user-login"), {"username": "owner1", "password": password}, format="json")
+
+    @override_settings(LOGIN_FAILURE_LIMIT=3)
+    def test_repeated_failures_are_refused_without_hashing(self):
+        for _ in range(3):
+            self.assertEqual(self.attempt("wrong").status_code, status.HTTP_401_UNAUTHORIZED)
+
+        with patch("scp.views.authenticate") as authenticate:
+            resp = self.attempt("pass123")
+        self.assertEqual(resp.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn("Retry-After", resp)
+        authenticate.assert_not_called()
+
+    @override_settings(LOGIN_FAILURE_LIMIT=3)
+    def test_successful_login_resets_counter(self):
+        self.attempt("wrong")
+        self.attempt("wrong")
+        self.assertEqual(self.attempt("pass123").status_code, status.HTTP_200_OK)
+        self.attempt("wrong")
+        self.attempt("wrong")
+        self.assertEqual(self.attempt("pass123").status_code, status.HTTP_200_OK)
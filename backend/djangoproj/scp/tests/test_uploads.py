@@ -0,0 +1,238 @@
+import base64
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from contextlib import redirect_stdout
+from io import StringIO
+
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APITestCase
+from scp import uploads
+from scp.middleware import PrintRequestMiddleware
+from scp.serializers import SupplierKYBSerializer
+from scp.models import (
+    Attachment, Message, Product, ProductAttachment, Supplier, SupplierKYBDocument, SupplierStaffMembership,
+    UploadSession, User,
+)
+from scp.tests.test_async_views import make_conversation
+
+CONTENT = b"%PDF-1.7 " + bytes(range(256)) * 40  # 10249 bytes
+
+
+def checksum(data):
+    return "sha256 " + base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+class UploadTestCase(APITestCase):
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.staging_dir = os.path.join(root, "staging")
+        settings_override = override_settings(
+            MEDIA_ROOT=os.path.join(root, "media"), CHUNKED_UPLOAD_DIR=self.staging_dir,
+            CHUNKED_UPLOAD_MAX_CHUNK_SIZE=4096, CHUNKED_UPLOAD_MAX_SIZE=20000,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.owner = User.objects.create_user(username="kyb-owner", password="pass123", role="owner")
+        self.supplier = Supplier.objects.create(owner=self.owner, name="KYB Supplier")
+        SupplierStaffMembership.objects.create(supplier=self.supplier, user=self.owner, role="owner")
+        self.client.force_authenticate(user=self.owner)
+
+    def start(self, data=CONTENT, **fields):
+        payload = {"filename": "certificate.pdf", "size": len(data), **fields}
+        resp = self.client.post(reverse("upload-list"), payload, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED, resp.content)
+        return resp.json()
+
+    def send(self, upload_id, offset, chunk, **headers):
+        headers.setdefault("Upload-Offset", str(offset))
+        return self.client.generic(
+            "PATCH", reverse("upload-detail", args=[upload_id]), chunk,
+            content_type="application/offset+octet-stream", headers=headers,
+        )
+
+    def upload(self, data=CONTENT, **fields):
+        upload = self.start(data, **fields)
+        offset = 0
+        while offset < len(data):
+            chunk = data[offset:offset + upload["chunk_size"]]
+            resp = self.send(upload["id"], offset, chunk, **{"Upload-Checksum": checksum(chunk)})
+            self.assertEqual(resp.status_code, status.HTTP_200_OK, resp.content)
+            offset = resp.json()["offset"]
+        return upload["id"]
+
+
+class ChunkProtocolTests(UploadTestCase):
+
+    def test_chunks_append_in_order(self):
+        upload = self.start(sha256=hashlib.sha256(CONTENT).hexdigest())
+        self.assertEqual((upload["offset"], upload["chunk_size"]), (0, 4096))
+
+        resp = self.send(upload["id"], 0, CONTENT[:4096])
+        self.assertEqual(resp.json()["offset"], 4096)
+        resp = self.client.get(reverse("upload-detail", args=[upload["id"]]))
+        self.assertEqual(resp.json()["offset"], 4096)
+
+        self.send(upload["id"], 4096, CONTENT[4096:8192])
+        self.send(upload["id"], 8192, CONTENT[8192:])
+        session = UploadSession.objects.get(pk=upload["id"])
+        self.assertTrue(session.is_complete)
+        with open(uploads.staging_path(session), "rb") as staged:
+            self.assertEqual(staged.read(), CONTENT)
+
+    def test_wrong_offset_is_a_conflict(self):
+        upload = self.start()
+        self.send(upload["id"], 0, CONTENT[:100])
+        for offset in (0, 200):
+            with self.subTest(offset):
+                resp = self.send(upload["id"], offset, CONTENT[offset:offset + 100])
+                self.assertEqual(resp.status_code, status.HTTP_409_CONFLICT)
+                self.assertEqual(resp.json()["offset"], 100)
+
+    def test_checksum_mismatch_is_rejected(self):
+        upload = self.start()
+        resp = self.send(upload["id"], 0, CONTENT[:100], **{"Upload-Checksum": checksum(b"something else")})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(UploadSession.objects.get(pk=upload["id"]).offset, 0)
+        resp = self.send(upload["id"], 0, CONTENT[:100], **{"Upload-Checksum": "md5 abc="})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_limits(self):
+        resp = self.client.post(reverse("upload-list"), {"filename": "big.pdf", "size": 20001}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        upload = self.start(CONTENT[:5000])
+        self.assertEqual(self.send(upload["id"], 0, CONTENT[:4097]).status_code, 413)
+        self.send(upload["id"], 0, CONTENT[:4096])
+        self.assertEqual(self.send(upload["id"], 4096, CONTENT[:1000]).status_code, 413)
+
+    def test_bad_requests(self):
+        upload = self.start()
+        url = reverse("upload-detail", args=[upload["id"]])
+        resp = self.client.patch(url, {"chunk": "x"}, format="json", headers={"Upload-Offset": "0"})
+        self.assertEqual(resp.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        self.assertEqual(self.send(upload["id"], 0, b"abc", **{"Upload-Offset": "x"}).status_code, 400)
+
+    def test_uploads_are_private(self):
+        upload = self.start()
+        other = User.objects.create_user(username="other", password="pass123", role="owner")
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.send(upload["id"], 0, CONTENT[:100]).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_request_printing_leaves_the_body_unread(self):
+        request = RequestFactory().generic("PATCH", "/", CONTENT, content_type="application/offset+octet-stream")
+        with redirect_stdout(StringIO()) as out:
+            PrintRequestMiddleware(lambda request: HttpResponse())(request)
+        self.assertFalse(request._read_started)
+        self.assertIn("Body: <10249 bytes of application/offset+octet-stream>", out.getvalue())
+
+    def test_filename_loses_its_path(self):
+        upload = self.start(filename="../../etc/passwd")
+        self.assertEqual(upload["filename"], "passwd")
+
+    def test_delete_and_purge(self):
+        upload = self.start()
+        self.send(upload["id"], 0, CONTENT[:100])
+        session = UploadSession.objects.get(pk=upload["id"])
+        path = uploads.staging_path(session)
+        resp = self.client.delete(reverse("upload-detail", args=[upload["id"]]))
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(os.path.exists(path))
+
+        upload = self.start()
+        self.send(upload["id"], 0, CONTENT[:100])
+        UploadSession.objects.filter(pk=upload["id"]).update(expires_at=timezone.now() - timedelta(seconds=1))
+        out = StringIO()
+        call_command("purge_upload_sessions", stdout=out)
+        self.assertIn("Purged 1 upload(s).", out.getvalue())
+        self.assertFalse(os.listdir(self.staging_dir))
+
+
+class CommitTests(UploadTestCase):
+
+    def test_commit_kyb_document(self):
+        upload_id = self.upload(sha256=hashlib.sha256(CONTENT).hexdigest())
+        # the staging file is removed once the transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(
+                reverse("supplier-upload-kyb", args=[self.supplier.id]),
+                {"upload": upload_id, "note": "Registration certificate"}, format="json",
+            )
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED, resp.content)
+        document = SupplierKYBDocument.objects.get(pk=resp.json()["id"])
+        self.assertTrue(document.document.name.endswith(".pdf"))
+        with document.document.open("rb") as stored:
+            self.assertEqual(stored.read(), CONTENT)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.listdir(self.staging_dir))
+
+    def test_commit_product_attachment(self):
+        product = Product.objects.create(supplier=self.supplier, name="Flour", unit="kg", price="1.00")
+        upload_id = self.upload()
+        resp = self.client.post(
+            reverse("product-attachment-list"), {"upload": upload_id, "product": str(product.pk)}, format="json",
+        )
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED, resp.content)
+        self.assertEqual(ProductAttachment.objects.get().file.size, len(CONTENT))
+
+    def test_commit_chat_attachment(self):
+        make_conversation(self)
+        message = Message.objects.create(conversation=self.conversation, sender=self.owner, text="see attached")
+        self.client.force_authenticate(user=self.owner)
+        upload_id = self.upload()
+        resp = self.client.post(reverse("attachment-list"), {"upload": upload_id, "message": message.pk}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED, resp.content)
+        self.assertEqual(Attachment.objects.get().filename, "certificate.pdf")
+
+    def test_incomplete_or_corrupt_upload_is_refused(self):
+        url = reverse("supplier-upload-kyb", args=[self.supplier.id])
+        upload = self.start()
+        self.send(upload["id"], 0, CONTENT[:100])
+        resp = self.client.post(url, {"upload": upload["id"]}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("incomplete", resp.json()["upload"][0])
+
+        upload_id = self.upload(sha256=hashlib.sha256(b"another file").hexdigest())
+        resp = self.client.post(url, {"upload": upload_id}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(SupplierKYBDocument.objects.exists())
+        self.assertTrue(UploadSession.objects.filter(pk=upload_id).exists())
+
+    def test_upload_is_committed_once(self):
+        upload_id = self.upload()
+        request = RequestFactory().post("/")
+        request.user = self.owner
+        serializer = SupplierKYBSerializer(data={"upload": upload_id}, context={"request": request})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        # another request commits it between validation and save
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(reverse("supplier-upload-kyb", args=[self.supplier.id]), {"upload": upload_id},
+                                    format="json")
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED, resp.content)
+        with self.assertRaises(ValidationError):
+            serializer.save(supplier=self.supplier)
+        self.assertEqual(SupplierKYBDocument.objects.count(), 1)
+
+    def test_someone_elses_upload_is_refused(self):
+        upload_id = self.upload()
+        other = User.objects.create_user(username="other", password="pass123", role="owner")
+        supplier = Supplier.objects.create(owner=other, name="Supplier2")
+        SupplierStaffMembership.objects.create(supplier=supplier, user=other, role="owner")
+        self.client.force_authenticate(user=other)
+        resp = self.client.post(reverse("supplier-upload-kyb", args=[supplier.id]), {"upload": upload_id}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_file_or_upload_is_required(self):
+        resp = self.client.post(reverse("supplier-upload-kyb", args=[self.supplier.id]), {"note": "x"}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("document", resp.json())
@@ -0,0 +1,180 @@
+# scp/throttling.py
+"""
+Token-bucket throttling per user (or client IP when anonymous) and per scope.
+
+Views opt in with `throttle_scopes`, mapping an action name, or "read" / "write"
+for safe / unsafe methods, to a scope in REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']:
+
+    throttle_scopes = {'read': 'catalog'}
+    throttle_scopes = {'login': 'auth', 'register': 'auth'}
+
+A rate like "60/min" is a bucket of 60 tokens refilled at 60 tokens per minute,
+so clients may burst up to the full bucket and then continue at the steady rate.
+
+Bucket state lives in a store with an atomic `consume()`. The default is
+in-process memory (per worker, at most THROTTLE_MEMORY_MAX_BUCKETS buckets,
+least recently used dropped first); set THROTTLE_STORE = "cache" to share buckets
+through the Django cache across workers. RateLimitHeadersMiddleware copies the
+outcome into RateLimit-* response headers.
+"""
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """'60/min' -> (capacity, tokens per second)."""
+    num, period = rate.split("/")
+    capacity = int(num)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+class InMemoryBucketStore:
+    """
+    Buckets in an LRU dict guarded by a lock; state is per process. Beyond
+    `max_buckets` the least recently used bucket is dropped, so clients from
+    many IPs cannot grow it without limit; a dropped bucket starts full again.
+    """
+
+    def __init__(self, max_buckets=10000):
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, refill_rate, now=None):
+        """
+        Take one token from bucket `key`.
+        Returns (allowed, tokens_left, seconds_until_next_token).
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            state = self._buckets.get(key)
+            result, self._buckets[key] = _take(state, capacity, refill_rate, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBucketStore:
+    """
+    Buckets in the Django cache, shared by all workers. Each read-modify-write
+    runs under a short per-key lock taken with cache.add(), which is atomic on
+    memcached and Redis. If the lock cannot be taken, the request is allowed.
+    Entries expire once their bucket would be full again, so there is no clear():
+    the cache is shared with everything else.
+    """
+    lock_timeout = 1  # seconds
+    lock_attempts = 20
+
+    def __init__(self, alias="default"):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def consume(self, key, capacity, refill_rate, now=None):
+        now = time.time() if now is None else now
+        cache_key = f"scp:throttle:{key}"
+        lock_key = cache_key + ":lock"
+        token = uuid.uuid4().hex
+
+        for _ in range(self.lock_attempts):
+            if self.cache.add(lock_key, token, self.lock_timeout):
+                break
+            time.sleep(0.005)
+        else:
+            return True, 0, 0
+
+        try:
+            result, state = _take(self.cache.get(cache_key), capacity, refill_rate, now)
+            # keep the entry until the bucket would be full again anyway
+            self.cache.set(cache_key, state, math.ceil(capacity / refill_rate) + 1)
+        finally:
+            if self.cache.get(lock_key) == token:
+                self.cache.delete(lock_key)
+        return result
+
+
+def _take(state, capacity, refill_rate, now):
+    tokens, updated = state if state is not None else (capacity, now)
+    tokens = min(capacity, tokens + (now - updated) * refill_rate)
+    if tokens >= 1:
+        tokens -= 1
+        return (True, tokens, 0 if tokens >= 1 else (1 - tokens) / refill_rate), (tokens, now)
+    return (False, tokens, (1 - tokens) / refill_rate), (tokens, now)
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        if getattr(settings, "THROTTLE_STORE", "memory") == "cache":
+            _store = CacheBucketStore(getattr(settings, "THROTTLE_CACHE_ALIAS", "default"))
+        else:
+            _store = InMemoryBucketStore(getattr(settings, "THROTTLE_MEMORY_MAX_BUCKETS", 10000))
+    return _store
+
+
+def reset_store():
+    """Forget the configured store (tests / settings changes)."""
+    global _store
+    _store = None
+
+
+class TokenBucketThrottle(BaseThrottle):
+
+    def get_scope(self, request, view):
+        scopes = getattr(view, "throttle_scopes", None) or {}
+        action = getattr(view, "action", None)
+        if action in scopes:
+            return scopes[action]
+        return scopes.get("read" if request.method in SAFE_METHODS else "write")
+
+    def get_ident_key(self, request):
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            return f"user:{user.pk}"
+        return f"ip:{self.get_ident(request)}"
+
+    def allow_request(self, request, view):
+        if not getattr(settings, "THROTTLE_ENABLED", True):
+            return True
+        scope = self.get_scope(request, view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope) if scope else None
+        if rate is None:
+            return True
+
+        capacity, refill_rate = parse_rate(rate)
+        allowed, tokens, wait = get_store().consume(
+            f"{scope}:{self.get_ident_key(request)}", capacity, refill_rate
+        )
+        self.wait_seconds = wait
+        # picked up by RateLimitHeadersMiddleware
+        request._request.rate_limit = {
+            "scope": scope,
+            "limit": capacity,
+            "remaining": int(tokens),
+            "reset": math.ceil((capacity - tokens) / refill_rate),
+        }
+        return allowed
+
+    def wait(self):
+        return getattr(self, "wait_seconds", None)
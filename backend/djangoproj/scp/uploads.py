@@ -0,0 +1,201 @@
+# scp/uploads.py
+"""
+Chunked, resumable uploads for KYB documents, chat attachments and product
+attachments.
+
+A multipart upload has to arrive in one request, and Django holds it in
+memory or a temp file before the view runs; a dropped connection starts it
+over. Instead:
+
+  POST   /api/uploads/        {"filename", "size", "sha256"?}  -> {"id", "offset": 0, ...}
+  PATCH  /api/uploads/<id>/   the next chunk as the raw body
+         Content-Type: application/offset+octet-stream
+         Upload-Offset: <bytes already received>
+         Upload-Checksum: sha256 <base64 digest of the chunk>   (optional)
+  GET    /api/uploads/<id>/   how far it got, to resume after a failure
+  DELETE /api/uploads/<id>/   abandon it
+
+then commit by creating the row with the upload in place of the file:
+
+  POST /api/suppliers/<id>/upload_kyb/   {"upload": "<id>", "note": ...}
+  POST /api/attachments/                 {"upload": "<id>", "message": ...}
+  POST /api/product-attachments/         {"upload": "<id>", "product": ...}
+
+Each chunk is streamed from the request to a temp file (never read whole)
+and checked against its checksum and Content-Length; then, under a row lock,
+appended to the session's staging file if Upload-Offset still matches. A
+chunk for the wrong offset gets 409 with the current offset. Commit checks
+the whole file's sha256, when the session has one, and saves it to the
+file field's storage.
+
+Staging files live in CHUNKED_UPLOAD_DIR, which every worker serving
+/api/uploads/ must share. Sessions expire after CHUNKED_UPLOAD_TTL; the
+purge_upload_sessions command deletes them and their staging files.
+"""
+import base64
+import binascii
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import UploadSession
+
+CHUNK_CONTENT_TYPES = ("application/offset+octet-stream", "application/octet-stream")
+BLOCK_SIZE = 64 * 1024
+
+
+def get_max_size():
+    return getattr(settings, "CHUNKED_UPLOAD_MAX_SIZE", 100 * 1024 * 1024)
+
+
+def get_max_chunk_size():
+    return getattr(settings, "CHUNKED_UPLOAD_MAX_CHUNK_SIZE", 8 * 1024 * 1024)
+
+
+def get_ttl():
+    return getattr(settings, "CHUNKED_UPLOAD_TTL", timedelta(hours=24))
+
+
+def get_staging_dir():
+    return getattr(settings, "CHUNKED_UPLOAD_DIR", None) or os.path.join(tempfile.gettempdir(), "scp-uploads")
+
+
+def staging_path(session):
+    return os.path.join(get_staging_dir(), f"{session.pk}.part")
+
+
+class InvalidChunk(ValueError):
+    """The chunk cannot be accepted as sent; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class OffsetConflict(Exception):
+    """The chunk does not start where the upload is; `offset` is where it is."""
+
+    def __init__(self, offset):
+        super().__init__(offset)
+        self.offset = offset
+
+
+def parse_checksum(header):
+    """The digest from an "Upload-Checksum: sha256 <base64>" header; None without one."""
+    if not header:
+        return None
+    algorithm, _, value = header.partition(" ")
+    if algorithm.lower() != "sha256":
+        raise InvalidChunk("Only sha256 checksums are supported.")
+    try:
+        return base64.b64decode(value.strip(), validate=True)
+    except binascii.Error:
+        raise InvalidChunk("The checksum is not valid base64.")
+
+
+def start(user, filename, size, sha256=""):
+    # only the name: a path sent by the client must not pick the directory in storage
+    filename = os.path.basename(filename.replace("\\", "/"))
+    return UploadSession.objects.create(
+        user=user, filename=filename, size=size, sha256=sha256.lower(), expires_at=timezone.now() + get_ttl(),
+    )
+
+
+def receive_chunk(session, offset, stream, length, checksum=None):
+    """
+    Append `length` bytes read from `stream` to the upload, which must be at
+    `offset`. Returns the new offset. Raises InvalidChunk or OffsetConflict.
+    """
+    if length > get_max_chunk_size():
+        raise InvalidChunk(f"Chunks can be at most {get_max_chunk_size()} bytes.", status=413)
+    if offset + length > session.size:
+        raise InvalidChunk("The chunk runs past the declared size.", status=413)
+    if offset != session.offset:
+        raise OffsetConflict(session.offset)
+
+    os.makedirs(get_staging_dir(), exist_ok=True)
+    digest = hashlib.sha256()
+    received = 0
+    # a temp file first: the row lock below is not held while the client sends
+    with tempfile.TemporaryFile(dir=get_staging_dir()) as chunk:
+        while received < length:
+            block = stream.read(min(BLOCK_SIZE, length - received))
+            if not block:
+                break
+            digest.update(block)
+            chunk.write(block)
+            received += len(block)
+        if received != length:
+            raise InvalidChunk(f"Expected {length} bytes, received {received}.")
+        if checksum is not None and digest.digest() != checksum:
+            raise InvalidChunk("The chunk does not match its checksum.")
+
+        chunk.seek(0)
+        with transaction.atomic():
+            locked = UploadSession.objects.select_for_update().get(pk=session.pk)
+            if locked.offset != offset:
+                raise OffsetConflict(locked.offset)
+            path = staging_path(locked)
+            with open(path, "r+b" if os.path.exists(path) else "wb") as staged:
+                # drop whatever an interrupted append left past the offset
+                staged.seek(offset)
+                staged.truncate()
+                shutil.copyfileobj(chunk, staged, BLOCK_SIZE)
+            locked.offset = offset + length
+            locked.save(update_fields=["offset"])
+    session.offset = locked.offset
+    return session.offset
+
+
+def open_completed(session):
+    """
+    The finished upload as a File to assign to a FileField. Raises ValueError
+    if it is incomplete or does not match its sha256.
+    """
+    if not session.is_complete:
+        raise ValueError(f"Upload incomplete: {session.offset} of {session.size} bytes received.")
+    path = staging_path(session)
+    if session.sha256:
+        digest = hashlib.sha256()
+        with open(path, "rb") as staged:
+            for block in iter(lambda: staged.read(BLOCK_SIZE), b""):
+                digest.update(block)
+        if digest.hexdigest() != session.sha256:
+            raise ValueError("The uploaded file does not match its sha256.")
+    if session.size == 0 and not os.path.exists(path):
+        open(path, "wb").close()
+    return File(open(path, "rb"), name=session.filename)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def finish(session):
+    """Remove a committed upload; its staging file goes once the transaction commits."""
+    path = staging_path(session)
+    session.delete()
+    transaction.on_commit(lambda: _remove(path))
+
+
+def abandon(session):
+    _remove(staging_path(session))
+    session.delete()
+
+
+def purge_expired():
+    """Delete expired sessions and their staging files; returns how many."""
+    expired = list(UploadSession.objects.filter(expires_at__lte=timezone.now()))
+    for session in expired:
+        abandon(session)
+    return len(expired)
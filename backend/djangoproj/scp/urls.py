@@ -1,7 +1,7 @@
 # scp/urls.py
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 
@@ -24,8 +24,16 @@ router.register(r'messages', views.MessageViewSet, basename='message')
 router.register(r'attachments', views.AttachmentViewSet, basename='attachment')
 router.register(r'notifications', views.NotificationViewSet, basename='notification')
 router.register(r'auditlogs', views.AuditLogViewSet, basename='auditlog')
+router.register(r'sync', views.SyncViewSet, basename='sync')
+router.register(r'metrics', views.MetricsViewSet, basename='metrics')
+router.register(r'uploads', views.UploadSessionViewSet, basename='upload')
 
 urlpatterns = [
+    # async views (scp/async_views.py); before the router, whose detail routes would match "inbox"
+    path('api/conversations/<int:pk>/messages/', async_views.ConversationMessagesView.as_view(),
+         name='conversation-messages'),
+    path('api/notifications/inbox/', async_views.NotificationInboxView.as_view(), name='notification-inbox'),
+    path('api/events/', async_views.EventsView.as_view(), name='events'),
     path('api/', include(router.urls)),
     # optionally include DRF auth views (login/logout for browsable API)
     path('api-auth/', include('rest_framework.urls', namespace='rest_framework')),
@@ -1,4 +1,5 @@
-from django.db import transaction
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from rest_framework import viewsets, mixins, status
@@ -9,13 +10,16 @@ from rest_framework.permissions import IsAuthenticated, BasePermission, SAFE_MET
 from rest_framework.routers import DefaultRouter
 from django.conf import settings
 from django.contrib.auth import authenticate
+from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.tokens import default_token_generator
 from rest_framework.permissions import AllowAny
+from rest_framework.exceptions import AuthenticationFailed
 
 from .models import (
-    User, Supplier, SupplierKYBDocument, Consumer, ConsumerContact,
+    User, ClaimsUser, Supplier, SupplierKYBDocument, Consumer, ConsumerContact,
     SupplierStaffMembership, SupplierConsumerLink, CatalogCategory, Product,
     ProductAttachment, Order, OrderItem, Complaint, Incident,
-    Conversation, Message, Attachment, Notification, AuditLog
+    Conversation, ConversationReadCursor, Message, Attachment, Notification, AuditLog, UploadSession
 )
 
 from .serializers import (
@@ -24,19 +28,35 @@ from .serializers import (
     IncidentSerializer, ComplaintSerializer, OrderItemSerializer, AttachmentSerializer,
     OrderCreateSerializer, ConversationSerializer, NotificationSerializer, SupplierKYBSerializer,
     CatalogCategorySerializer, ConsumerContactSerializer, ProductAttachmentSerializer, SupplierConsumerLinkSerializer,
-    SupplierStaffMembershipSerializer, SupplierStaffMembership
+    SupplierStaffMembershipSerializer, SupplierStaffMembership, OrderStatusTransitionSerializer,
+    StaffInviteSerializer, SetPasswordSerializer, ConversationReadCursorSerializer, MessageSearchResultSerializer,
+    UploadSessionSerializer, SyncConversationSerializer, SyncMessageSerializer, get_staff_invite_max,
 )
 
 from .permissions import (
-    IsAuthenticated, IsConversationParticipant, IsLinkedConsumerAndSupplierStaff, IsOwnerOrManager, IsPlatformAdminOrSuperUser, IsSupplierStaff
+    IsAuthenticated, IsConversationParticipant, IsLinkedConsumerAndSupplierStaff, IsOwnerOrManager, IsPlatformAdminOrSuperUser, IsSupplierStaff,
+    participant_filter,
 )
+from .authentication import (
+    issue_signed_tokens, login_blocked, record_login_failure, refresh_signed_tokens, reset_login_failures,
+    revoke_tokens, rotate_token, signed_tokens_enabled
+)
+from .conditional import ConditionalGetMixin
+from .fast_serializers import FastListMixin
+from .fieldsets import SparseFieldsetMixin
+from .idempotency import idempotent
+from .order_states import apply_transition, InvalidTransition, TransitionConflict
+from .renderers import FastJSONRenderer, PrometheusTextRenderer
+from .replicas import ReplicaReadMixin
+from . import metrics, search, sync, uploads
 
 # -------------------------------
 # ViewSets
 # -------------------------------
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
+    throttle_scopes = {'login': 'auth', 'register': 'auth', 'refresh': 'auth', 'set_password': 'auth'}
 
     def get_serializer_class(self):
         if self.action in ['list', 'retrieve']:
@@ -47,7 +67,11 @@ class UserViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], url_path='me', permission_classes=[IsAuthenticated])
     def me(self, request):
         """Return the authenticated user's info."""
-        serializer = UserReadSerializer(request.user)
+        user = request.user
+        if isinstance(user, ClaimsUser):
+            # access-token users only carry claims; load the full profile
+            user = User.objects.get(pk=user.pk)
+        serializer = UserReadSerializer(user)
         return Response(serializer.data)
 
     @action(detail=False, methods=['post'], url_path='register', permission_classes=[])
@@ -67,64 +91,57 @@ class UserViewSet(viewsets.ModelViewSet):
 
         role = serializer.validated_data.get("role")
 
-        # --- Role-based validations ---
+        # --- Role-based validations (all of them before anything is written) ---
         if role == "owner":
-            if not request.data.get("supplier_name"):
+            if not data.get("supplier_name"):
                 return Response(
                     {"supplier_name": "This field is required for supplier owners."},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
         if role in ["manager", "sales"]:
-            supplier_id = request.data.get("supplier_id")
+            supplier_id = data.get("supplier_id")
             if not supplier_id:
                 return Response(
                     {"supplier_id": f"This field is required for role '{role}'."},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            # Validate that supplier exists
-            try:
-                supplier = Supplier.objects.get(id=supplier_id)
-            except Supplier.DoesNotExist:
-                return Response(
-                    {"supplier_id": "Supplier not found."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-        # Create user
-        user = serializer.save()
-        user.set_password(data["password"])
-        user.save()
-
-        # --- Handle specific roles ---
-        if role == "owner":
-            supplier = Supplier.objects.create(
-                name=request.data["supplier_name"],
-                description=request.data.get("supplier_description", ""),
-                owner=user
-            )
-            SupplierStaffMembership.objects.create(
-                supplier=supplier,
-                user=user,
-                role="owner"
-            )
+            # the membership's foreign key checks that the supplier exists (see below)
 
-        elif role in ["manager", "sales"]:
-            SupplierStaffMembership.objects.create(
-                supplier=supplier,
-                user=user,
-                role=role
-            )
+        if role == "consumer_contact" and not data.get("consumer_name"):
+            return Response({"consumer_name": "This field is required for consumer registration."},
+                            status=status.HTTP_400_BAD_REQUEST)
 
-        elif role == "consumer_contact":
-            consumer_name = data.get("consumer_name")
-            if not consumer_name:
-                return Response({"consumer_name": "This field is required for consumer registration."},
+        # --- One unit of work: the user and its organisation rows commit together ---
+        try:
+            with transaction.atomic():
+                # Create user (create_user hashes the password)
+                user = serializer.save()
+
+                if role == "owner":
+                    supplier = Supplier.objects.create(
+                        name=data["supplier_name"],
+                        description=data.get("supplier_description", ""),
+                        owner=user
+                    )
+                    SupplierStaffMembership.objects.create(supplier=supplier, user=user, role="owner")
+
+                elif role in ["manager", "sales"]:
+                    SupplierStaffMembership.objects.create(supplier_id=supplier_id, user=user, role=role)
+
+                elif role == "consumer_contact":
+                    consumer = Consumer.objects.create(name=data["consumer_name"])
+                    # Link user as primary contact
+                    ConsumerContact.objects.create(consumer=consumer, user=user, is_primary=True)
+        except DjangoValidationError:
+            # supplier_id is not a UUID
+            return Response({"supplier_id": "Supplier not found."}, status=status.HTTP_400_BAD_REQUEST)
+        except IntegrityError:
+            # the foreign key is checked at commit; a concurrent registration can take the username first
+            if User.objects.filter(username=serializer.validated_data["username"]).exists():
+                return Response({"username": "A user with that username already exists."},
                                 status=status.HTTP_400_BAD_REQUEST)
-
-            consumer = Consumer.objects.create(name=consumer_name)
-            # Link user as primary contact
-            ConsumerContact.objects.create(consumer=consumer, user=user, is_primary=True)
+            return Response({"supplier_id": "Supplier not found."}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response(self.get_serializer(user).data, status=status.HTTP_201_CREATED)
 
@@ -139,17 +156,66 @@ class UserViewSet(viewsets.ModelViewSet):
     def login(self, request):
         username = request.data.get('username')
         password = request.data.get('password')
+        ip = request.META.get('REMOTE_ADDR')
+
+        # refuse before paying for a password hash
+        retry_after = login_blocked(username, ip)
+        if retry_after:
+            response = Response({'error': 'Too many failed login attempts. Try again later.'},
+                                status=status.HTTP_429_TOO_MANY_REQUESTS)
+            response['Retry-After'] = str(retry_after)
+            return response
+
         user = authenticate(username=username, password=password)
-        if user:
-            from rest_framework.authtoken.models import Token
-            token, created = Token.objects.get_or_create(user=user)
-            return Response({'token': token.key})
-        return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
+        if user is None:
+            record_login_failure(username, ip)
+            return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        reset_login_failures(username)
+        token = rotate_token(user)
+        data = {'token': token.key}
+        if signed_tokens_enabled():
+            data.update(issue_signed_tokens(user, token))
+        return Response(data)
+
+    @action(detail=False, methods=['post'], url_path='set_password', permission_classes=[])
+    def set_password(self, request):
+        """Set the first password of an invited user with its password_setup_token."""
+        serializer = SetPasswordSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = User.objects.filter(pk=serializer.validated_data['uid']).first()
+        if user is None or not default_token_generator.check_token(user, serializer.validated_data['token']):
+            return Response({'token': 'Invalid or expired token.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            validate_password(serializer.validated_data['password'], user)
+        except DjangoValidationError as exc:
+            return Response({'password': list(exc.messages)}, status=status.HTTP_400_BAD_REQUEST)
+        user.set_password(serializer.validated_data['password'])
+        user.save(update_fields=['password'])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=['post'], url_path='refresh', permission_classes=[], authentication_classes=[])
+    def refresh(self, request):
+        if not signed_tokens_enabled():
+            return Response({'detail': 'Signed tokens are disabled.'}, status=status.HTTP_404_NOT_FOUND)
+        refresh_token = request.data.get('refresh')
+        if not refresh_token:
+            return Response({'refresh': 'This field is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return Response(refresh_signed_tokens(refresh_token))
+        except AuthenticationFailed as exc:
+            return Response({'detail': exc.detail}, status=status.HTTP_401_UNAUTHORIZED)
+
+    @action(detail=False, methods=['post'], url_path='logout', permission_classes=[IsAuthenticated])
+    def logout(self, request):
+        revoke_tokens([request.user])
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-class SupplierViewSet(viewsets.ModelViewSet):
+class SupplierViewSet(ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Supplier.objects.all()
     serializer_class = SupplierSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scopes = {'read': 'catalog'}
 
     def get_permissions(self):
         """
@@ -181,6 +247,57 @@ class SupplierViewSet(viewsets.ModelViewSet):
             membership.save()
         return Response(SupplierStaffMembershipSerializer(membership).data)
 
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsOwnerOrManager])
+    def invite_staff(self, request, pk=None):
+        """
+        Create many staff accounts + memberships in one request:
+        {"staff": [{"username": ..., "role": "sales", "email": ..., "password": ...}, ...]}
+        Entries without a password get an unusable one and a `password_setup_token`
+        for POST /api/users/set_password/.
+        """
+        supplier = self.get_object()
+        # bounded: every entry with a password is hashed inside this request
+        serializer = StaffInviteSerializer(
+            data=request.data.get('staff'), many=True, allow_empty=False, max_length=get_staff_invite_max()
+        )
+        serializer.is_valid(raise_exception=True)
+        entries = serializer.validated_data
+
+        usernames = [entry['username'] for entry in entries]
+        duplicates = sorted({name for name in usernames if usernames.count(name) > 1})
+        if duplicates:
+            return Response({'staff': f"Duplicate usernames: {', '.join(duplicates)}"}, status=status.HTTP_400_BAD_REQUEST)
+        taken = list(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        if taken:
+            return Response({'staff': f"Usernames already taken: {', '.join(sorted(taken))}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        users = []
+        for entry in entries:
+            user = User(
+                username=entry['username'], email=entry['email'], role=entry['role'],
+                display_name=entry['display_name'], phone=entry['phone'],
+            )
+            user.set_password(entry.get('password'))  # None -> unusable password, no hashing cost
+            users.append(user)
+
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+                memberships = SupplierStaffMembership.objects.bulk_create([
+                    SupplierStaffMembership(supplier=supplier, user=user, role=user.role) for user in users
+                ])
+        except IntegrityError:
+            # a username taken by a concurrent request after the check above
+            return Response({'staff': 'Usernames already taken; nothing was created.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = []
+        for user, membership in zip(users, memberships):
+            item = {'id': user.pk, 'username': user.username, 'role': membership.role}
+            if not user.has_usable_password():
+                item['password_setup_token'] = default_token_generator.make_token(user)
+            results.append(item)
+        return Response({'created': results}, status=status.HTTP_201_CREATED)
+
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsOwnerOrManager])
     def remove_staff(self, request, pk=None):
         supplier = self.get_object()
@@ -194,7 +311,7 @@ class SupplierViewSet(viewsets.ModelViewSet):
     def upload_kyb(self, request, pk=None):
         supplier = self.get_object()
 
-        serializer = SupplierKYBSerializer(data=request.data)
+        serializer = SupplierKYBSerializer(data=request.data, context=self.get_serializer_context())
 
         if serializer.is_valid():
             serializer.save(
@@ -223,12 +340,12 @@ class SupplierViewSet(viewsets.ModelViewSet):
 
         return super().update(request, *args, **kwargs)
 
-class SupplierKYBDocumentViewSet(viewsets.ModelViewSet):
+class SupplierKYBDocumentViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = SupplierKYBDocument.objects.all()
     serializer_class = SupplierKYBSerializer
     permission_classes = [IsAuthenticated, IsSupplierStaff]
 
-class ConsumerViewSet(viewsets.ModelViewSet):
+class ConsumerViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Consumer.objects.all()
     serializer_class = ConsumerSerializer
     permission_classes = [IsAuthenticated]
@@ -241,17 +358,17 @@ class ConsumerViewSet(viewsets.ModelViewSet):
         contact, created = ConsumerContact.objects.get_or_create(consumer=consumer, user=user, defaults={'is_primary': request.data.get('is_primary', False), 'title': request.data.get('title','')})
         return Response(ConsumerContactSerializer(contact).data)
 
-class ConsumerContactViewSet(viewsets.ModelViewSet):
-    queryset = ConsumerContact.objects.all()
+class ConsumerContactViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
+    queryset = ConsumerContact.objects.select_related('user').all()
     serializer_class = ConsumerContactSerializer
     permission_classes = [IsAuthenticated]
 
-class SupplierStaffMembershipViewSet(viewsets.ModelViewSet):
-    queryset = SupplierStaffMembership.objects.all()
+class SupplierStaffMembershipViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
+    queryset = SupplierStaffMembership.objects.select_related('user').all()
     serializer_class = SupplierStaffMembershipSerializer
     permission_classes = [IsAuthenticated, IsSupplierStaff]
 
-class LinkViewSet(viewsets.ModelViewSet):
+class LinkViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = SupplierConsumerLink.objects.all()
     serializer_class = SupplierConsumerLinkSerializer
     permission_classes = [IsAuthenticated]
@@ -288,21 +405,24 @@ class LinkViewSet(viewsets.ModelViewSet):
         link.block(by=request.user, reason=reason)
         return Response(self.get_serializer(link).data)
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = CatalogCategory.objects.all()
     serializer_class = CatalogCategorySerializer
     permission_classes = [IsAuthenticated, IsSupplierStaff]
+    throttle_scopes = {'read': 'catalog'}
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ReplicaReadMixin, ConditionalGetMixin, FastListMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scopes = {'read': 'catalog'}
 
-    def get_queryset(self):
+    def get_supplier_ids(self):
+        """The suppliers whose catalog the user sees, or None for all of them."""
         user = self.request.user
 
         # Platform admin sees everything
         if user.role == "platform_admin":
-            return Product.objects.select_related("supplier").all()
+            return None
 
         # Supplier staff sees only their supplier’s products
         supplier_ids = SupplierStaffMembership.objects.filter(
@@ -311,9 +431,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         ).values_list("supplier_id", flat=True)
 
         if supplier_ids.exists():
-            return Product.objects.select_related("supplier").filter(
-                supplier_id__in=supplier_ids
-            )
+            return supplier_ids
 
         # Consumer: get linked suppliers
         consumer_ids = ConsumerContact.objects.filter(
@@ -322,14 +440,17 @@ class ProductViewSet(viewsets.ModelViewSet):
         ).values_list("consumer_id", flat=True)
 
         # find links for these consumers
-        linked_supplier_ids = SupplierConsumerLink.objects.filter(
+        return SupplierConsumerLink.objects.filter(
             consumer_id__in=consumer_ids,
             status=SupplierConsumerLink.Status.APPROVED,
         ).values_list("supplier_id", flat=True)
 
-        return Product.objects.select_related("supplier").filter(
-            supplier_id__in=linked_supplier_ids
-        )
+    def get_queryset(self):
+        supplier_ids = self.get_supplier_ids()
+        products = Product.objects.select_related("supplier")
+        if supplier_ids is None:
+            return products.all()
+        return products.filter(supplier_id__in=supplier_ids)
 
     def get_permissions(self):
         # Safe methods allowed to all authenticated users (supplier staff or linked consumers)
@@ -346,7 +467,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         product.save()
         return Response(ProductSerializer(product).data)
 
-class ProductAttachmentViewSet(viewsets.ModelViewSet):
+class ProductAttachmentViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = ProductAttachment.objects.all()
     serializer_class = ProductAttachmentSerializer
     permission_classes = [IsAuthenticated, IsSupplierStaff]
@@ -354,9 +475,10 @@ class ProductAttachmentViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(uploaded_by=self.request.user)
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(ReplicaReadMixin, FastListMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scopes = {'write': 'order_write'}
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -385,6 +507,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         # Default: empty queryset
         return Order.objects.none()
 
+    @idempotent
     def create(self, request, *args, **kwargs):
         # ensure consumer is linked to supplier
         serializer = self.get_serializer(data=request.data)
@@ -392,51 +515,52 @@ class OrderViewSet(viewsets.ModelViewSet):
         order = serializer.save(placed_by=request.user)
         return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
 
-    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsSupplierStaff])
-    def accept(self, request, pk=None):
+    def _transition(self, request, name):
         order = self.get_object()
-        if order.status != Order.Status.PENDING:
-            return Response({'detail':'Cannot accept'}, status=status.HTTP_400_BAD_REQUEST)
-        order.status = Order.Status.IN_PROGRESS
-        order.accepted_at = timezone.now()
-        order.save()
-        for item in order.items.all():
-            p = item.product
-            p.stock = p.stock - item.quantity
-            p.save()
+        expected_version = request.data.get('version')
+        if expected_version is not None:
+            try:
+                expected_version = int(expected_version)
+            except (TypeError, ValueError):
+                return Response({'version': 'Must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            apply_transition(order, name, actor=request.user, expected_version=expected_version)
+        except TransitionConflict as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_409_CONFLICT)
+        except InvalidTransition:
+            return Response({'detail': f'Cannot {name}'}, status=status.HTTP_400_BAD_REQUEST)
         return Response(OrderSerializer(order).data)
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsSupplierStaff])
+    @idempotent
+    def accept(self, request, pk=None):
+        return self._transition(request, 'accept')
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsSupplierStaff])
+    @idempotent
     def reject(self, request, pk=None):
-        order = self.get_object()
-        if order.status != Order.Status.PENDING:
-            return Response({'detail':'Cannot reject'}, status=status.HTTP_400_BAD_REQUEST)
-        order.status = Order.Status.REJECTED
-        order.save()
-        return Response(OrderSerializer(order).data)
+        return self._transition(request, 'reject')
     
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsSupplierStaff])
+    @idempotent
     def complete(self, request, pk=None):
-        order = self.get_object()
-        if order.status != Order.Status.IN_PROGRESS:
-            return Response({'detail':'Cannot complete'}, status=status.HTTP_400_BAD_REQUEST)
-        order.status = Order.Status.COMPLETED
-        order.save()
-        return Response(OrderSerializer(order).data)
+        return self._transition(request, 'complete')
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    @idempotent
     def cancel(self, request, pk=None):
+        return self._transition(request, 'cancel')
+
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
         order = self.get_object()
-        if order.status in [Order.Status.COMPLETED, Order.Status.CANCELLED]:
-            return Response({'detail':'Cannot cancel'}, status=status.HTTP_400_BAD_REQUEST)
-        order.status = Order.Status.CANCELLED
-        order.save()
-        return Response(OrderSerializer(order).data)
+        return Response(OrderStatusTransitionSerializer(order.transitions.all(), many=True).data)
 
-class OrderItemViewSet(viewsets.ModelViewSet):
+class OrderItemViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = OrderItem.objects.all()
     serializer_class = OrderItemSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scopes = {'write': 'order_write'}
 
 def pick_staff_for_handling(supplier):
         """
@@ -456,7 +580,7 @@ def pick_staff_for_handling(supplier):
 
         return None  # no available staff
 
-class ComplaintViewSet(viewsets.ModelViewSet):
+class ComplaintViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Complaint.objects.select_related('order').all()
     serializer_class = ComplaintSerializer
     permission_classes = [IsAuthenticated]
@@ -570,28 +694,34 @@ class ComplaintViewSet(viewsets.ModelViewSet):
         return Response(self.get_serializer(complaint).data)
 
 
-class IncidentViewSet(viewsets.ModelViewSet):
+class IncidentViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Incident.objects.all()
     serializer_class = IncidentSerializer
     permission_classes = [IsAuthenticated]
 
-class ConversationViewSet(viewsets.ModelViewSet):
+class ConversationViewSet(ReplicaReadMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Conversation.objects.all()
     serializer_class = ConversationSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scopes = {'read': 'chat', 'write': 'chat'}
 
     def get_queryset(self):
         user = self.request.user
 
         # Supplier staff?
+        conversations = Conversation.objects.select_related(
+            'consumer_contact__consumer', 'consumer_contact__user'
+        ).prefetch_related('supplier_staff', 'messages__sender').annotate(
+            unread_count=ConversationReadCursor.unread_count(user)
+        )
         supplier_staff_qs = SupplierStaffMembership.objects.filter(user=user, is_active=True)
         if supplier_staff_qs.exists():
-            return Conversation.objects.filter(supplier_staff__in=supplier_staff_qs)
+            return conversations.filter(supplier_staff__in=supplier_staff_qs)
 
         # Consumer contact?
         consumer_contact_qs = ConsumerContact.objects.filter(user=user)
         if consumer_contact_qs.exists():
-            return Conversation.objects.filter(consumer_contact__in=consumer_contact_qs)
+            return conversations.filter(consumer_contact__in=consumer_contact_qs)
 
         return Conversation.objects.none()
 
@@ -617,6 +747,36 @@ class ConversationViewSet(viewsets.ModelViewSet):
 
         return Response(serializer.data)
 
+    def get_conversation(self):
+        """get_object() without prefetching the messages."""
+        conversation = get_object_or_404(self.get_queryset().prefetch_related(None), pk=self.kwargs['pk'])
+        self.check_object_permissions(self.request, conversation)
+        return conversation
+
+    @action(detail=True, methods=['post'])
+    def mark_read(self, request, pk=None):
+        """
+        Move the caller's read cursor to the newest message, or to `message`
+        (an id) when given. One upsert however many messages there are.
+        """
+        conversation = self.get_conversation()
+        up_to = request.data.get('message')
+        if up_to is not None:
+            try:
+                up_to = int(up_to)
+            except (TypeError, ValueError):
+                return Response({'message': 'A message id is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        last_read = ConversationReadCursor.mark_read(conversation.pk, request.user.pk, up_to)
+        unread = Message.objects.filter(conversation=conversation, id__gt=last_read).exclude(sender=request.user.pk)
+        return Response({'last_read_message_id': last_read, 'unread_count': unread.count()})
+
+    @action(detail=True, methods=['get'])
+    def read_receipts(self, request, pk=None):
+        """How far each participant has read."""
+        conversation = self.get_conversation()
+        cursors = conversation.read_cursors.select_related('user').order_by('-last_read_message_id')
+        return Response(ConversationReadCursorSerializer(cursors, many=True).data)
+
     @action(detail=False, methods=['post'])
     def create_for_complaint(self, request):
         """
@@ -655,27 +815,154 @@ class ConversationViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(conversation)
         return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
-class MessageViewSet(viewsets.ModelViewSet):
-    queryset = Message.objects.select_related('conversation').all()
+class MessageViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
+    queryset = Message.objects.select_related('conversation', 'sender').all()
     serializer_class = MessageSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scopes = {'read': 'chat', 'write': 'chat'}
 
     def perform_create(self, serializer):
         serializer.save(sender=self.request.user)
 
-class AttachmentViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Full-text search in the caller's conversations, best match first
+        (see scp/search.py). ?q=  ?conversation=<id>  ?limit=  ?offset=
+        """
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            return Response({'q': 'A search term is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get('limit', search.DEFAULT_LIMIT)), search.MAX_LIMIT)
+            offset = int(request.query_params.get('offset', 0))
+            conversation = request.query_params.get('conversation')
+            conversation = int(conversation) if conversation else None
+        except ValueError:
+            return Response({'detail': 'limit, offset and conversation must be whole numbers.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1 or not 0 <= offset <= search.get_max_offset():
+            return Response({'detail': f'limit must be positive and offset at most {search.get_max_offset()}.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        conversations = Conversation.objects.filter(participant_filter(request.user))
+        if conversation is None:
+            messages = Message.objects.filter(conversation__in=conversations.values('pk'))
+        elif conversations.filter(pk=conversation).exists():
+            # an equality on conversation_id lets the search index narrow to the one conversation
+            messages = Message.objects.filter(conversation_id=conversation)
+        else:
+            return Response({'detail': 'Conversation not found.'}, status=status.HTTP_404_NOT_FOUND)
+        messages = messages.select_related('sender')
+        # one extra row tells whether there is a next page
+        page = list(search.search_messages(messages, text)[offset:offset + limit + 1])
+        return Response({
+            'results': MessageSearchResultSerializer(page[:limit], many=True).data,
+            'next_offset': offset + limit if len(page) > limit else None,
+        })
+
+class AttachmentViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Attachment.objects.all()
     serializer_class = AttachmentSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scopes = {'read': 'chat', 'write': 'chat'}
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
 
-class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
+class AuditLogViewSet(ReplicaReadMixin, SparseFieldsetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = AuditLog.objects.all()
     serializer_class = AuditLogSerializer
     permission_classes = [IsAuthenticated]
 
+
+class SyncViewSet(viewsets.ViewSet):
+    """Delta sync for offline clients; see scp/sync.py."""
+    permission_classes = [IsAuthenticated]
+    throttle_scopes = {'read': 'catalog'}
+
+    def _view(self, viewset_class):
+        # same visibility rules as the regular list endpoints
+        return viewset_class(request=self.request, action='list', format_kwarg=None, kwargs={})
+
+    def list(self, request):
+        try:
+            since = sync.parse_watermark(request.query_params.get('since'))
+        except ValueError:
+            return Response({'since': 'Invalid watermark.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # categories of every supplier whose catalog the user sees, not only those with products
+        supplier_ids = self._view(ProductViewSet).get_supplier_ids()
+        products, categories = Product.objects.all(), CatalogCategory.objects.all()
+        if supplier_ids is not None:
+            products = products.filter(supplier_id__in=supplier_ids)
+            categories = categories.filter(supplier_id__in=supplier_ids)
+        # messages are a source of their own: a new message must not re-send the whole thread
+        conversations = self._view(ConversationViewSet).get_queryset().distinct()
+        messages = Message.objects.filter(conversation__in=conversations.values('pk')).select_related('sender')
+        sources = {
+            sync.PRODUCTS: (products, ProductSerializer),
+            sync.CATEGORIES: (categories, CatalogCategorySerializer),
+            sync.ORDERS: (self._view(OrderViewSet).get_queryset(), OrderSerializer),
+            sync.CONVERSATIONS: (
+                conversations.prefetch_related(None).prefetch_related('supplier_staff'), SyncConversationSerializer,
+            ),
+            sync.MESSAGES: (messages, SyncMessageSerializer),
+        }
+        granted = sync.granted_supplier_ids(request.user, since) if since is not None else None
+        payload = sync.changes_since(
+            since, sources, sync.visible_tombstones(request.user), context={'request': request}, granted=granted
+        )
+        return Response(payload)
+
+
+class MetricsViewSet(viewsets.ViewSet):
+    """Per-request metrics of this process in Prometheus text format; see scp/metrics.py."""
+    permission_classes = [IsAuthenticated, IsPlatformAdminOrSuperUser]
+    renderer_classes = [PrometheusTextRenderer, FastJSONRenderer]
+
+    def list(self, request):
+        if not metrics.metrics_enabled():
+            return Response({'detail': 'Request metrics are disabled.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+
+class UploadSessionViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin,
+                           viewsets.GenericViewSet):
+    """Chunked, resumable uploads, committed by the create endpoints; see scp/uploads.py."""
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(user=self.request.user, expires_at__gt=timezone.now())
+
+    def partial_update(self, request, pk=None):
+        """Append the raw body at Upload-Offset. request.data is never touched, so nothing buffers it."""
+        session = self.get_object()
+        if request.content_type.split(';')[0].strip() not in uploads.CHUNK_CONTENT_TYPES:
+            return Response({'detail': f'Send chunks as {uploads.CHUNK_CONTENT_TYPES[0]}.'},
+                            status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+            if offset < 0 or length < 0:
+                raise ValueError
+        except (KeyError, ValueError):
+            return Response({'detail': 'Upload-Offset and Content-Length headers are required.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            checksum = uploads.parse_checksum(request.headers.get('Upload-Checksum'))
+            uploads.receive_chunk(session, offset, request.stream, length, checksum)
+        except uploads.OffsetConflict as exc:
+            return Response({'detail': 'Upload-Offset is not where the upload is.', 'offset': exc.offset},
+                            status=status.HTTP_409_CONFLICT)
+        except uploads.InvalidChunk as exc:
+            return Response({'detail': str(exc)}, status=exc.status)
+        return Response(self.get_serializer(session).data)
+
+    def perform_destroy(self, instance):
+        uploads.abandon(instance)
+
 # end of file